@@ -0,0 +1,185 @@
+# analytics.py
+"""
+Variación baseline vs. real/plan, por tarea y agregada, sin pasadas por fila.
+
+- Slip: inicio/fin real (o el planificado si todavía no hay real) menos el baseline, en días.
+- Valor ganado tipo EVM usando la duración del baseline como presupuesto (no hay costos):
+  PV = % planificado a la fecha de corte × duración baseline, EV = progreso × duración baseline,
+  SV = EV - PV (días de trabajo) y SPI = EV / PV.
+- Los agregados se guardan como sumas (EV, PV, tareas, atrasadas, suma de slip), así se pueden
+  re-agrupar por cualquier dimensión y el SPI de un grupo es ΣEV / ΣPV.
+- Tendencia: un parquet por día con el agregado más fino (proyecto × fase × workstream).
+- Con un workcal.WorkCalendar, duración del baseline y fracción planificada van en días hábiles
+  (el calendario de cada tarea sale de su workstream); el slip sigue en días corridos.
+"""
+from __future__ import annotations
+import os
+from datetime import date
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", ".analytics")
+ROLLUP_DIMS = ["project_name", "phase", "workstream"]
+# columnas aditivas del agregado (lo que se guarda en cada snapshot)
+_SUMS = ["tasks", "with_baseline", "late", "bac_days", "pv_days", "ev_days", "slip_sum", "slip_n"]
+
+
+def _days(s: pd.Series) -> np.ndarray:
+    """Días desde epoch como float (NaN si no hay fecha)."""
+    v = s.to_numpy("datetime64[D]")
+    out = v.astype(np.int64).astype(float)
+    out[np.isnat(v)] = np.nan
+    return out
+
+
+def task_metrics(df: pd.DataFrame, asof: Optional[Any] = None, calendar: Optional[Any] = None) -> pd.DataFrame:
+    """
+    Métricas por tarea, alineadas con df: start_slip_days, slip_days, bac_days, pv_days,
+    ev_days, sv_days, spi, late. Sin baseline completo, las de valor ganado quedan en NaN.
+    """
+    today = float(np.datetime64(pd.Timestamp(asof or date.today()).date(), "D").astype(np.int64))
+    bs, be = _days(df["baseline_start"]), _days(df["baseline_end"])
+    fs = np.where(np.isnan(_days(df["actual_start"])), _days(df["start"]), _days(df["actual_start"]))
+    fe = np.where(np.isnan(_days(df["actual_end"])), _days(df["end"]), _days(df["actual_end"]))
+
+    span = be - bs
+    has_base = ~np.isnan(span) & (span >= 0)
+    elapsed = today - bs
+    if calendar is not None:
+        at = np.flatnonzero(has_base)
+        codes = calendar.codes(df["workstream"] if "workstream" in df else None, len(df))[at]
+        b0, b1 = bs[at].astype(np.int64), be[at].astype(np.int64)
+        span[at] = calendar.count_days(b0, b1, codes)
+        elapsed[at] = calendar.count_days(b0, np.full(len(at), int(today)), codes)
+    bac = np.where(has_base, np.maximum(span, 1), np.nan)
+    # fracción planificada a la fecha de corte (tarea de 0 días: 0 antes de su fecha, 1 desde ese día)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        planned = np.where(span > 0, np.clip(elapsed / span, 0, 1), (today >= be).astype(float))
+        planned = np.where(has_base, planned, np.nan)
+        pv = planned * bac
+        ev = df["progress"].to_numpy(dtype=float) / 100 * bac
+        spi = np.where(pv > 0, ev / pv, np.nan)
+    slip = fe - be
+    return pd.DataFrame({
+        "start_slip_days": fs - bs,
+        "slip_days": slip,
+        "bac_days": bac,
+        "pv_days": pv,
+        "ev_days": ev,
+        "sv_days": ev - pv,
+        "spi": spi,
+        "late": slip > 0,
+    }, index=df.index)
+
+
+def _group_sums(df: pd.DataFrame, metrics: pd.DataFrame, by: Sequence[str]) -> pd.DataFrame:
+    slip = metrics["slip_days"]
+    parts = pd.DataFrame({
+        **{c: df[c].astype(object).fillna("(sin dato)") for c in by},
+        "tasks": 1,
+        "with_baseline": metrics["bac_days"].notna().astype(int),
+        "late": metrics["late"].astype(int),
+        "bac_days": metrics["bac_days"].fillna(0),
+        "pv_days": metrics["pv_days"].fillna(0),
+        "ev_days": metrics["ev_days"].fillna(0),
+        "slip_sum": slip.fillna(0),
+        "slip_n": slip.notna().astype(int),
+        "slip_max": slip,
+    }, index=df.index)
+    agg = {c: "sum" for c in _SUMS}
+    agg["slip_max"] = "max"
+    return parts.groupby(list(by), sort=True, observed=True).agg(agg).reset_index()
+
+
+def finish(sums: pd.DataFrame) -> pd.DataFrame:
+    """Agrega las derivadas (SPI, SV, slip medio) a un frame de sumas."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums.assign(
+            sv_days=sums["ev_days"] - sums["pv_days"],
+            spi=np.where(sums["pv_days"] > 0, sums["ev_days"] / sums["pv_days"], np.nan).round(3),
+            slip_avg=np.where(sums["slip_n"] > 0, sums["slip_sum"] / sums["slip_n"], np.nan).round(1),
+        )
+
+
+def rollup(df: pd.DataFrame, by: Sequence[str] = ("project_name",),
+           metrics: Optional[pd.DataFrame] = None, asof: Optional[Any] = None,
+           calendar: Optional[Any] = None) -> pd.DataFrame:
+    """Variación agregada por `by` (subconjunto de ROLLUP_DIMS): tareas, atrasadas, EV/PV/SV, SPI y slip."""
+    if metrics is None:
+        metrics = task_metrics(df, asof, calendar)
+    return finish(_group_sums(df, metrics, list(by)))
+
+
+def regroup(sums: pd.DataFrame, by: Sequence[str]) -> pd.DataFrame:
+    """Re-agrupa un agregado (p.ej. el de un snapshot) a dimensiones más gruesas."""
+    agg = {c: "sum" for c in _SUMS}
+    agg["slip_max"] = "max"
+    return finish(sums.groupby(list(by), sort=True, observed=True).agg(agg).reset_index())
+
+
+def total(sums: pd.DataFrame) -> pd.Series:
+    """Una sola fila con el total de un agregado (SPI del portfolio = ΣEV / ΣPV)."""
+    return regroup(sums.assign(total="Total"), ["total"]).iloc[0] if len(sums) else pd.Series(dtype=float)
+
+
+# ----------------- Snapshots diarios -----------------
+def _snapshot_path(day: date, base: str) -> str:
+    return os.path.join(base, f"rollup-{day.isoformat()}.parquet")
+
+
+def write_snapshot(df: pd.DataFrame, day: Optional[date] = None, base: str = ANALYTICS_DIR,
+                   overwrite: bool = False, calendar: Optional[Any] = None) -> Optional[str]:
+    """
+    Guarda el agregado fino del día (una fila por proyecto × fase × workstream, tipos compactos).
+    Un archivo por día; si ya existe no se reescribe salvo overwrite. Retorna la ruta escrita o None.
+    """
+    day = day or date.today()
+    path = _snapshot_path(day, base)
+    if os.path.exists(path) and not overwrite:
+        return None
+    os.makedirs(base, exist_ok=True)
+    sums = _group_sums(df, task_metrics(df, day, calendar), ROLLUP_DIMS)
+    compact = sums.astype({
+        **{c: "category" for c in ROLLUP_DIMS},
+        "tasks": "int32", "with_baseline": "int32", "late": "int32", "slip_n": "int32",
+        "bac_days": "float32", "pv_days": "float32", "ev_days": "float32",
+        "slip_sum": "float32", "slip_max": "float32",
+    })
+    tmp = path + ".tmp"
+    compact.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, path)  # atómico: un lector nunca ve el archivo a medias
+    return path
+
+
+def snapshot_days(base: str = ANALYTICS_DIR) -> List[date]:
+    if not os.path.isdir(base):
+        return []
+    out = []
+    for name in os.listdir(base):
+        if name.startswith("rollup-") and name.endswith(".parquet"):
+            try:
+                out.append(date.fromisoformat(name[len("rollup-"):-len(".parquet")]))
+            except ValueError:
+                continue
+    return sorted(out)
+
+
+def trend(by: Sequence[str] = (), base: str = ANALYTICS_DIR, since: Optional[date] = None,
+          projects: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """SPI, SV y slip por día (y por `by`) a partir de los snapshots guardados; `projects` recorta por proyecto."""
+    days = [d for d in snapshot_days(base) if since is None or d >= since]
+    empty = pd.DataFrame(columns=["day", *by, *_SUMS, "slip_max", "sv_days", "spi", "slip_avg"])
+    if not days:
+        return empty
+    cols = list(dict.fromkeys([*by, *(["project_name"] if projects else []), *_SUMS, "slip_max"]))
+    frames = [pd.read_parquet(_snapshot_path(d, base), columns=cols).assign(day=pd.Timestamp(d)) for d in days]
+    allrows = pd.concat(frames, ignore_index=True)
+    if projects:
+        allrows = allrows[allrows["project_name"].astype(object).isin(list(projects))]
+        if allrows.empty:
+            return empty
+    for c in by:  # las categorías cambian entre días: se comparan como texto
+        allrows[c] = allrows[c].astype(object)
+    return regroup(allrows, ["day", *by])
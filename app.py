@@ -6,124 +6,257 @@ import notify
 st.set_page_config(page_title="Gantt Proyectos (Supabase)", layout="wide", page_icon="📊")
 
 # ---------- Estado inicial ----------
-if "df" not in st.session_state:
-    st.session_state["df"] = main.fetch_tasks()
+def reload_tasks():
+    """Sync incremental contra Supabase (solo trae lo que cambió desde la última carga)."""
+    st.session_state["df"], st.session_state["sync"] = main.sync_tasks(
+        st.session_state.get("df"), st.session_state.get("sync")
+    )
 
 st.title("🚀 Gantt de Proyectos (Diamante)")
 st.caption("Edición nativa con `st.data_editor`. Guardá con 💾 y recargá desde Supabase cuando quieras.")
 
 # ---------- Editor ----------
 st.subheader("✏️ Editor de tareas")
-
-df_edit = st.session_state["df"].copy()
-df_edit.insert(0, "BORRAR", False)
-
-config = {
-    "id": st.column_config.NumberColumn("ID", help="Autogenerado", disabled=True),
-    "project_name": st.column_config.TextColumn("Proyecto"),
-    "task": st.column_config.TextColumn("Tarea"),
-    "details": st.column_config.TextColumn("Detalles"),
-    "owner": st.column_config.TextColumn("Owner"),
-    "collaborators": st.column_config.TextColumn("Colaboradores (coma-separados)"),
-    "start": st.column_config.DateColumn("Inicio", format="YYYY-MM-DD"),
-    "end": st.column_config.DateColumn("Fin", format="YYYY-MM-DD"),
-    "progress": st.column_config.NumberColumn("Progreso (%)", min_value=0, max_value=100, step=1),
-    "status": st.column_config.SelectboxColumn("Estado", options=main.ENUM_STATUS),
-    "priority": st.column_config.SelectboxColumn("Prioridad", options=main.ENUM_PRIORITY),
-    "rag": st.column_config.SelectboxColumn("RAG", options=[""] + main.ENUM_RAG),
-    "milestone": st.column_config.CheckboxColumn("Milestone"),
-    "baseline_start": st.column_config.DateColumn("Baseline inicio", format="YYYY-MM-DD"),
-    "baseline_end": st.column_config.DateColumn("Baseline fin", format="YYYY-MM-DD"),
-    "actual_start": st.column_config.DateColumn("Real inicio", format="YYYY-MM-DD"),
-    "actual_end": st.column_config.DateColumn("Real fin", format="YYYY-MM-DD"),
-    "phase": st.column_config.TextColumn("Fase"),
-    "workstream": st.column_config.TextColumn("Workstream"),
-    "tags": st.column_config.TextColumn("Tags (coma-separados)"),
-    "external_link": st.column_config.LinkColumn("Link externo"),
-}
-
-edited = st.data_editor(
-    df_edit,
-    column_config=config,
-    use_container_width=True,
-    num_rows="dynamic",
-    hide_index=True,
-)
-
-# ---------- Acciones ----------
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    if st.button("💾 Guardar (upsert)"):
-        to_save = edited.drop(columns=["BORRAR"], errors="ignore")
-        to_save = main.ensure_schema(to_save)
-
-        ok = main.upsert_tasks(to_save)
-        if ok:
-            st.success("Cambios guardados en Supabase.")
-            st.session_state["df"] = main.fetch_tasks()
-        else:
-            st.warning("No se guardó. Revisá el bloque de error mostrado arriba.")
-
-with col2:
-    if st.button("🗑️ Borrar marcadas"):
-        ids = edited.loc[edited["BORRAR"] == True, "id"].dropna().astype(int).tolist()
-        if ids:
-            ok_del = main.delete_tasks(ids)
-            if ok_del:
-                st.success(f"Eliminadas {len(ids)} fila(s).")
-                st.session_state["df"] = main.fetch_tasks()
+# La tabla completa solo se baja al abrir el editor; la vista trae solo el recorte filtrado.
+editor_open = st.toggle("Abrir editor (carga la tabla completa)", value="df" in st.session_state)
+if editor_open and "df" not in st.session_state:
+    reload_tasks()
+
+if editor_open:
+    df_edit = main.editable_copy(st.session_state["df"])  # el snapshot es compartido entre sesiones: se edita una copia
+    df_edit.insert(0, "BORRAR", False)
+
+    config = {
+        "id": st.column_config.NumberColumn("ID", help="Autogenerado", disabled=True),
+        "project_name": st.column_config.TextColumn("Proyecto"),
+        "task": st.column_config.TextColumn("Tarea"),
+        "details": st.column_config.TextColumn("Detalles"),
+        "owner": st.column_config.TextColumn("Owner"),
+        "collaborators": st.column_config.TextColumn("Colaboradores (coma-separados)"),
+        "start": st.column_config.DateColumn("Inicio", format="YYYY-MM-DD"),
+        "end": st.column_config.DateColumn("Fin", format="YYYY-MM-DD"),
+        "progress": st.column_config.NumberColumn("Progreso (%)", min_value=0, max_value=100, step=1),
+        "status": st.column_config.SelectboxColumn("Estado", options=main.ENUM_STATUS),
+        "priority": st.column_config.SelectboxColumn("Prioridad", options=main.ENUM_PRIORITY),
+        "rag": st.column_config.SelectboxColumn("RAG", options=[""] + main.ENUM_RAG),
+        "milestone": st.column_config.CheckboxColumn("Milestone"),
+        "predecessors": st.column_config.TextColumn("Predecesoras (IDs coma-separados)"),
+        "baseline_start": st.column_config.DateColumn("Baseline inicio", format="YYYY-MM-DD"),
+        "baseline_end": st.column_config.DateColumn("Baseline fin", format="YYYY-MM-DD"),
+        "actual_start": st.column_config.DateColumn("Real inicio", format="YYYY-MM-DD"),
+        "actual_end": st.column_config.DateColumn("Real fin", format="YYYY-MM-DD"),
+        "phase": st.column_config.TextColumn("Fase"),
+        "workstream": st.column_config.TextColumn("Workstream"),
+        "tags": st.column_config.TextColumn("Tags (coma-separados)"),
+        "external_link": st.column_config.LinkColumn("Link externo"),
+    }
+
+    edited = st.data_editor(
+        df_edit,
+        column_config=config,
+        use_container_width=True,
+        num_rows="dynamic",
+        hide_index=True,
+    )
+
+    # ---------- Acciones ----------
+    shift_successors = st.checkbox("Correr sucesoras al guardar", value=True,
+                                   help="Si cambiás fechas o predecesoras, las tareas que dependen de esa fila "
+                                        "se corren hacia adelante (nunca se adelantan)")
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        if st.button("💾 Guardar (upsert)"):
+            to_save = edited.drop(columns=["BORRAR"], errors="ignore")
+            to_save = main.ensure_schema(to_save)
+            if shift_successors:
+                res = main.reschedule_edits(st.session_state["df"], to_save)
+                to_save = res["df"]
+                if res["moved"]:
+                    st.info(f"Se corrieron {len(res['moved'])} tarea(s) sucesora(s): {res['moved'][:30]}")
+
+            # solo se envía lo que cambió respecto del snapshot cargado
+            ok = main.upsert_tasks(to_save, base=st.session_state["df"],
+                                   versions=st.session_state["sync"].get("versions"))
+            if ok:
+                st.success("Cambios guardados.")
+                notify.refresh_recipient_views()
+                reload_tasks()
             else:
-                st.warning("No se pudo borrar (ver error arriba).")
-        else:
-            st.warning("No hay filas con ID marcadas para borrar.")
-
-with col3:
-    if st.button("🔄 Recargar desde Supabase"):
-        st.session_state["df"] = main.fetch_tasks()
-        st.info("Datos recargados.")
+                st.warning("No se guardó. Revisá el bloque de error mostrado arriba.")
+
+    with col2:
+        if st.button("🗑️ Borrar marcadas"):
+            ids = edited.loc[edited["BORRAR"] == True, "id"].dropna().astype(int).tolist()
+            if ids:
+                ok_del = main.delete_tasks(ids, versions=st.session_state["sync"].get("versions"))
+                if ok_del:
+                    st.success(f"Eliminadas {len(ids)} fila(s).")
+                    notify.refresh_recipient_views()
+                    reload_tasks()
+                else:
+                    st.warning("No se pudo borrar (ver error arriba).")
+            else:
+                st.warning("No hay filas con ID marcadas para borrar.")
+
+    with col3:
+        if st.button("🔄 Recargar desde Supabase"):
+            reload_tasks()
+            st.info("Datos recargados.")
+
+    if st.session_state["sync"].get("offline"):
+        st.caption("📴 Sin conexión: datos del mirror local. Lo que guardes queda en cola y se envía al reconectar.")
+
+# ---------- Cambios pendientes (offline o en conflicto) ----------
+pending = main.offline_changes()
+if len(pending):
+    n_conflict = int((pending["status"] == "conflict").sum())
+    with st.expander(f"📴 Cambios pendientes ({len(pending)} sin guardar en Supabase, {n_conflict} en conflicto)",
+                     expanded=bool(n_conflict)):
+        st.dataframe(pending, use_container_width=True, hide_index=True)
+        chosen = st.multiselect("Tareas", pending["row_id"].tolist(),
+                                format_func=lambda i: f"{i} · {pending.set_index('row_id').at[i, 'task']}")
+        c1, c2, c3 = st.columns(3)
+        if c1.button("📤 Reenviar ahora"):
+            main.report_replay(main.replay_offline())
+            if "df" in st.session_state:
+                reload_tasks()
+        if c2.button("Mantener mis cambios", disabled=not chosen,
+                     help="Pisa la versión del server con lo editado offline (o reintenta las rechazadas)"):
+            st.info(f"{main.resolve_offline(chosen, keep='local')} cambio(s) reencolados.")
+        if c3.button("Descartar mis cambios", disabled=not chosen):
+            st.info(f"{main.resolve_offline(chosen, keep='server')} cambio(s) descartados.")
+            if "df" in st.session_state:
+                reload_tasks()
 
 st.divider()
 
 # ---------- Filtros de vista ----------
 st.sidebar.title("🔎 Filtros")
-df_view = st.session_state["df"].copy()
+df_all = st.session_state.get("df")  # None hasta que se abre el editor
 
-projects = st.sidebar.multiselect("Proyecto", sorted(df_view["project_name"].dropna().unique().tolist()))
+project_list = main.project_options(df_all) if df_all is not None else main.fetch_project_names()
+projects = st.sidebar.multiselect("Proyecto", project_list)
 statuses = st.sidebar.multiselect("Estado", main.ENUM_STATUS)
 priorities = st.sidebar.multiselect("Prioridad", main.ENUM_PRIORITY)
 rag_filter = st.sidebar.multiselect("RAG", main.ENUM_RAG)
 owner = st.sidebar.text_input("Owner contiene…")
 date_range = st.sidebar.date_input("Rango de fechas", value=None)
 
-if projects:   df_view = df_view[df_view["project_name"].isin(projects)]
-if statuses:   df_view = df_view[df_view["status"].isin(statuses)]
-if priorities: df_view = df_view[df_view["priority"].isin(priorities)]
-if rag_filter: df_view = df_view[df_view["rag"].isin(rag_filter)]
-if owner:      df_view = df_view[df_view["owner"].str.contains(owner, case=False, na=False)]
-
 start_after = pd.to_datetime(date_range[0]) if isinstance(date_range, tuple) and date_range[0] else None
 end_before  = pd.to_datetime(date_range[1]) if isinstance(date_range, tuple) and date_range[1] else None
-if start_after is not None:
-    df_view = df_view[(df_view["end"].isna()) | (df_view["end"] >= start_after)]
-if end_before is not None:
-    df_view = df_view[(df_view["start"].isna()) | (df_view["start"] <= end_before)]
+filters = {
+    "projects": projects, "statuses": statuses, "priorities": priorities, "rags": rag_filter,
+    "owner": owner, "start_after": start_after, "end_before": end_before,
+}
+refresh_view = df_all is None and st.sidebar.button("🔄 Recargar vista")
 
 # ---------- Gantt ----------
 st.subheader("📈 Gantt")
 color_by = st.selectbox("Color por", ["progress","status","priority","project_name","rag"], index=0)
 group_by_project = st.checkbox("Agrupar por proyecto (eje Y)", value=True)
-fig = main.make_gantt(df_view, color_by=color_by, group_by_project=group_by_project)
-st.plotly_chart(fig, use_container_width=True)
+detail = st.selectbox("Nivel de detalle", main.GANTT_DETAIL, index=0,
+                      help="auto: resumen por proyecto/fase cuando hay muchas tareas")
+dependencies = st.checkbox("Ruta crítica y dependencias", value=False,
+                           help="Resalta en rojo las tareas sin holgura y dibuja flechas predecesora → sucesora")
+# memoizado por versión de datos + filtros + opciones: otros widgets no lo recalculan
+if df_all is not None:
+    df_view, fig = main.gantt_view(df_all, filters, color_by=color_by,
+                                   group_by_project=group_by_project, detail=detail,
+                                   dependencies=dependencies)
+else:
+    # sin tabla completa en memoria: los filtros se resuelven en Supabase
+    df_slice = main.fetch_tasks(filters, refresh=refresh_view)
+    df_view, fig = main.gantt_view(df_slice, {}, color_by=color_by,
+                                   group_by_project=group_by_project, detail=detail,
+                                   dependencies=dependencies)
+if dependencies:
+    sched = main.schedule_tasks(df_all if df_all is not None else df_slice)
+    if sched["cycles"]:
+        st.error(f"Dependencias circulares entre las tareas {sched['cycles']}: quedan sin fechas calculadas "
+                 f"(junto con {len(sched['blocked'])} tarea(s) que dependen de ellas).")
+    if sched["missing"] and df_all is not None:
+        # con la vista recortada, una predecesora fuera del filtro no es un error
+        st.warning(f"Predecesoras inexistentes (tarea, predecesora): {sched['missing'][:50]}")
+# notificaciones/mapeo/export trabajan sobre la tabla completa si está cargada, si no sobre la vista
+df_scope = df_all if df_all is not None else df_view
+# vistas memoizadas (carga, variación): snapshot + filtros, como el Gantt; df_view hereda el token del snapshot
+df_source, view_filters = (df_all, filters) if df_all is not None else (df_slice, {})
+tab_gantt, tab_load = st.tabs(["Gantt", "👥 Carga por persona"])
+with tab_gantt:
+    st.plotly_chart(fig, use_container_width=True, key="gantt_chart")
+with tab_load:
+    capacity = st.number_input("Capacidad (tareas simultáneas por persona)", min_value=0.5, max_value=20.0,
+                               value=main.workload.WORKLOAD_CAPACITY, step=0.5)
+    load = main.workload_view(df_source, view_filters, capacity)
+    st.plotly_chart(main.make_workload_heatmap(load["weekly"], load["tasks"], capacity), use_container_width=True,
+                    key="workload_chart")
+    if load["overload"].empty:
+        st.success("Nadie supera la capacidad en el período.")
+    else:
+        st.warning(f"{len(load['overload'])} persona(s) por encima de la capacidad en alguna semana.")
+        st.dataframe(load["overload"], use_container_width=True, hide_index=True)
+    if load["skipped"]:
+        st.caption(f"{load['skipped']} asignación(es) sin fechas válidas no cuentan.")
 
 # ---------- Tabla simple ----------
 st.subheader("📋 Tabla (vista filtrada)")
 st.dataframe(df_view, use_container_width=True)
 
+# ---------- Variación vs baseline ----------
+st.subheader("📉 Variación vs baseline")
+if df_all is not None:
+    main.snapshot_analytics(df_all)  # tendencia: un snapshot por día de la tabla completa
+by = st.multiselect("Agrupar por", main.analytics.ROLLUP_DIMS, default=["project_name"])
+var = main.variance_view(df_source, view_filters, tuple(by) or ("project_name",))
+tot = var["total"]
+if len(tot):
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("SPI", "—" if pd.isna(tot["spi"]) else f"{tot['spi']:.2f}",
+              help="Valor ganado / planificado, con la duración del baseline como presupuesto")
+    m2.metric("SV (días hábiles)", f"{tot['sv_days']:.0f}",
+              help="EV - PV según el calendario laboral (secrets [workcal])")
+    m3.metric("Atrasadas", f"{int(tot['late'])} / {int(tot['with_baseline'])}")
+    m4.metric("Slip medio (días)", "—" if pd.isna(tot["slip_avg"]) else f"{tot['slip_avg']:.1f}")
+    st.dataframe(var["rollup"].drop(columns=["slip_sum", "slip_n"]), use_container_width=True, hide_index=True)
+trend = main.analytics_trend(tuple(by[:1]), tuple(filters["projects"] or ()))
+if len(trend) > 1:
+    st.plotly_chart(main.make_spi_trend(trend, by[0] if by else None), use_container_width=True, key="spi_trend")
+    if statuses or priorities or rag_filter or owner or start_after is not None or end_before is not None:
+        st.caption("La tendencia sale de snapshots diarios por proyecto × fase × workstream: "
+                   "de los filtros solo aplica el de proyecto.")
+
 # ---------- Export ----------
 st.subheader("📤 Exportar")
-csv_bytes = st.session_state["df"].to_csv(index=False).encode("utf-8")
-st.download_button("⬇️ CSV (todo)", data=csv_bytes, file_name="gantt_tasks.csv", mime="text/csv")
+csv_bytes = df_scope.to_csv(index=False).encode("utf-8")
+st.download_button("⬇️ CSV (todo)" if df_all is not None else "⬇️ CSV (vista filtrada)",
+                   data=csv_bytes, file_name="gantt_tasks.csv", mime="text/csv")
+
+# ---------- Import ----------
+st.subheader("📥 Importar")
+upload = st.file_uploader("CSV o Parquet (mismas columnas que el export)", type=["csv", "parquet"])
+if upload is not None and st.button("📥 Importar a Supabase"):
+    kind = "parquet" if upload.name.lower().endswith(".parquet") else "csv"
+    bar = st.progress(0.0, text="Importando…")
+    stats = main.import_tasks(
+        upload, kind=kind,
+        on_progress=lambda frac, s: bar.progress(frac, text=f"Leídas {s['read']} · insertadas {s['inserted']}"),
+    )
+    bar.progress(1.0, text="Listo")
+    if stats["inserted"]:
+        notify.refresh_recipient_views()
+    st.success(f"Insertadas {stats['inserted']} de {stats['read']} fila(s). Descartadas sin proyecto/tarea: {stats['skipped']}.")
+    if stats["links_dropped"]:
+        st.warning(f"{stats['links_dropped']} predecesor(es) apuntaban a ids que no entraron con el archivo: se descartaron.")
+    if stats["unlinked"]:
+        st.warning(f"{stats['unlinked']} tarea(s) se importaron sin sus predecesores (ver rechazos).")
+    if stats["failed"]:
+        st.error(f"Rechazadas por Supabase: {stats['failed_count']} (se muestran las primeras {len(stats['failed'])}).")
+        st.dataframe(pd.DataFrame([
+            {"project_name": row.get("project_name"), "task": row.get("task"), **err} for row, err in stats["failed"]
+        ]), use_container_width=True, hide_index=True)
+    if df_all is not None:
+        reload_tasks()
 
 st.caption("UI simple y robusta: st.data_editor + Supabase. Si querés, luego reactivamos AgGrid.")
 
@@ -133,15 +266,13 @@ st.subheader("📣 Espacio de notificación")
 st.caption("Seleccioná las filas a notificar. Se enviará un correo al Owner y a los colaboradores, resolviendo emails desde la tabla `users` por nombre.")
 
 # Tabla de selección (no modifica la DB)
-df_notify = st.session_state["df"].copy()
-df_notify.insert(0, "ENVIAR", False)
-
 cols_min = [
-    "ENVIAR", "id", "project_name", "task", "owner", "collaborators",
+    "id", "project_name", "task", "owner", "collaborators",
     "start", "end", "status", "priority", "progress"
 ]
-present_cols = [c for c in cols_min if c in df_notify.columns]
-df_notify = df_notify[present_cols]
+present_cols = [c for c in cols_min if c in df_scope.columns]
+df_notify = df_scope[present_cols].copy()
+df_notify.insert(0, "ENVIAR", False)
 
 notify_cfg = {
     "ENVIAR": st.column_config.CheckboxColumn("Enviar"),
@@ -176,116 +307,96 @@ if st.button("✉️ Construir y (si aplica) enviar"):
     if selected.empty:
         st.warning("No marcaste ninguna fila.")
     else:
-        # Preview del HTML
-        html = notify.build_digest_html(selected)
-        st.markdown("**Vista previa del correo:**", help="Esto es exactamente lo que recibirán los destinatarios.")
-        st.markdown(html, unsafe_allow_html=True)
-
-        # Resolver destinatarios
-        recipients, unresolved = notify.resolve_recipients(selected)
+        # Resolver destinatarios: cada uno recibe solo sus tareas
+        built = notify.build_personal_digests(main.ensure_schema(selected))
+        recipients, unresolved = list(built["digests"]), built["unresolved"]
         st.write(f"**Destinatarios resueltos ({len(recipients)}):**", recipients)
+        if not built["matches"].empty:
+            with st.expander(f"Nombres resueltos por aproximación ({len(built['matches'])})"):
+                st.dataframe(built["matches"], use_container_width=True, hide_index=True)
+        if built["ambiguous"]:
+            st.warning("Nombres ambiguos (más de un usuario posible, no se envía): "
+                       + "; ".join(f"{a['name']} → " + ", ".join(c["full_name"] for c in a["candidates"])
+                                   for a in built["ambiguous"]))
         if unresolved:
             st.warning(f"Nombres sin email en `users` ({len(unresolved)}): {unresolved}")
 
-        # Envío real (si hay SMTP y no es solo preview)
+        # Preview del HTML
+        st.markdown("**Vista previa del correo:**", help="Esto es exactamente lo que recibirán los destinatarios.")
+        if recipients:
+            for who in recipients[:10]:
+                d = built["digests"][who]
+                with st.expander(f"{who} · {d['count']} tarea(s)", expanded=who == recipients[0]):
+                    st.markdown(d["html"], unsafe_allow_html=True)
+            if len(recipients) > 10:
+                st.caption(f"… y {len(recipients) - 10} destinatario(s) más.")
+        else:
+            st.markdown(notify.build_digest_html(selected), unsafe_allow_html=True)
+
+        # Envío real (si hay SMTP y no es solo preview): se encola y lo manda el worker
         if not preview_only and notify.email_enabled() and recipients:
-            res = notify.send_digest_for_rows(selected)
-            st.success(f"Enviados: {res['sent']} / Destinatarios: {len(res['recipients'])}")
-            if res["failed"]:
-                st.error(f"Fallidos: {res['failed']}")
+            res = notify.enqueue_digest_for_rows(selected, built)
+            if res["batch_id"]:
+                st.session_state["outbox_batch"] = res["batch_id"]
+            st.success(f"Encolados: {res['queued']} / Destinatarios: {len(res['recipients'])}")
+            if res["duplicates"]:
+                st.info(f"Ya estaban en la cola (no se duplican): {res['duplicates']}")
         else:
             st.info("Solo previsualización (o SMTP no configurado). No se enviaron correos.")
 
 
+@st.fragment(run_every=2)
+def outbox_status():
+    worker = notify.outbox_worker()
+    box = worker.box
+    batch = st.session_state.get("outbox_batch")
+    counts = box.status_counts(batch)
+    st.caption("Último envío" if batch else "Todos los envíos")
+    c = st.columns(5)
+    for col, (label, key) in zip(c, [("En cola", "queued"), ("Enviando", "sending"), ("Enviados", "sent"),
+                                     ("Fallidos", "failed"), ("Inciertos", "uncertain")]):
+        col.metric(label, counts[key])
+    if worker.last_error:
+        st.warning(f"Último error del worker: {worker.last_error}")
+
+    stuck = box.jobs(statuses=["failed", "uncertain"], limit=100)
+    if stuck:
+        st.caption("'Incierto': el envío se cortó y no sabemos si salió. Reencolar puede duplicar ese correo.")
+        st.dataframe(pd.DataFrame(stuck), use_container_width=True, hide_index=True)
+        ids = st.multiselect("Reencolar jobs", [j["id"] for j in stuck], key="outbox_requeue")
+        if st.button("↩️ Reencolar seleccionados", disabled=not ids):
+            n = box.requeue(ids)
+            worker.wake()
+            st.success(f"Reencolados: {n}")
+
+
+if notify.email_enabled():
+    with st.expander("📤 Estado de la cola de envíos", expanded="outbox_batch" in st.session_state):
+        outbox_status()
+
+
 # ========== Mapeo de destinatarios por tarea ==========
 st.divider()
 st.subheader("📬 Mapeo de destinatarios por tarea")
 
-# Intentamos leer las vistas SQL si existen; si no, calculamos el mapeo en Python.
-sb = main.get_sb()
-
-def _safe_query(table_name: str):
-    if sb is None:
-        return pd.DataFrame()
-    try:
-        res = sb.table(table_name).select("*").order("project_name").order("task_id").execute()
-        return pd.DataFrame(res.data or [])
-    except Exception:
-        return pd.DataFrame()
+# Vistas SQL si existen (lectura cacheada); si no, el resumen precalculado en la app.
+views = notify.fetch_recipient_views()
+df_sum = views["summary"]
 
-df_sum = _safe_query("tasks_recipients_summary")
-
-if not df_sum.empty:
+if df_sum is not None and not df_sum.empty:
     st.dataframe(df_sum, use_container_width=True)
     with st.expander("Ver detalle por destinatario (expandido)", expanded=False):
-        df_exp = _safe_query("tasks_recipients_expanded")
+        df_exp = views["expanded"] if views["expanded"] is not None else pd.DataFrame()
         st.dataframe(df_exp, use_container_width=True)
         st.caption("resolved = true => email resuelto en users. Si es false, añadí el nombre a la tabla users.")
 else:
-    # --------- Fallback: resolver en la app sin vistas SQL ---------
+    # --------- Fallback: resumen local, se recalcula solo si cambian tareas o usuarios ---------
     st.info("Mostrando mapeo calculado en la app (si querés vistas SQL, ejecutá los scripts propuestos).")
-
-    # 1) Cargar usuarios activos
-    users_df = pd.DataFrame()
-    if sb is not None:
-        try:
-            ures = sb.table("users").select("full_name,email,is_active").execute()
-            users_df = pd.DataFrame(ures.data or [])
-            if not users_df.empty and "is_active" in users_df.columns:
-                users_df = users_df[users_df["is_active"].fillna(True)]
-        except Exception:
-            users_df = pd.DataFrame()
-
-    # 2) Normalizar nombre -> email
-    def _norm_name(s):
-        if s is None:
-            return None
-        s = str(s).strip()
-        if not s:
-            return None
-        return " ".join(s.split()).lower()
-
-    name_to_email = {}
-    if not users_df.empty:
-        for _, u in users_df.iterrows():
-            nn = _norm_name(u.get("full_name"))
-            if nn:
-                name_to_email[nn] = u.get("email")
-
-    # 3) Helpers
-    def _split_csv(s):
-        if s is None:
-            return []
-        s = str(s).strip()
-        if not s:
-            return []
-        return [p.strip() for p in s.split(",") if p.strip()]
-
-    # 4) Construir mapeo usando el DF actual (tareas cargadas en la app)
-    rows = []
-    for _, r in st.session_state["df"].iterrows():
-        owner_email = name_to_email.get(_norm_name(r.get("owner")))
-        collabs = _split_csv(r.get("collaborators"))
-        collab_emails = sorted({
-            name_to_email.get(_norm_name(x))
-            for x in collabs
-            if name_to_email.get(_norm_name(x))
-        })
-        unresolved = sorted({
-            x for x in collabs
-            if _norm_name(x) not in name_to_email
-        })
-        rows.append({
-            "task_id": r.get("id"),
-            "project_name": r.get("project_name"),
-            "task": r.get("task"),
-            "owner_email": owner_email,
-            "collaborator_emails": ", ".join(collab_emails) if collab_emails else None,
-            "collaborator_unresolved_names": ", ".join(unresolved) if unresolved else None
-        })
-
-    map_df = pd.DataFrame(rows)
-    st.dataframe(map_df, use_container_width=True)
+    rec = notify.recipient_summary(df_scope)
+    st.dataframe(rec["summary"], use_container_width=True)
+    with st.expander("Ver detalle por destinatario (expandido)", expanded=False):
+        st.dataframe(rec["expanded"], use_container_width=True)
+        st.caption("resolved = true => email resuelto en users. Si es false, añadí el nombre a la tabla users.")
 
 
 st.divider()
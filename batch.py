@@ -0,0 +1,115 @@
+# batch.py
+"""
+Escritura por lotes contra PostgREST: chunks de tamaño configurable, concurrencia
+acotada y reintentos con backoff exponencial ante errores transitorios.
+Un chunk que falla por un error permanente se parte en mitades hasta aislar
+las filas culpables, así el resultado se puede reportar fila por fila.
+"""
+from __future__ import annotations
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence
+
+import httpx
+
+try:
+    from postgrest.exceptions import APIError  # type: ignore
+except Exception:  # pragma: no cover
+    class APIError(Exception):
+        pass
+
+CHUNK_SIZE = 500          # filas por request de insert/upsert
+DELETE_CHUNK_SIZE = 200   # ids por filtro in_ (la URL tiene límite)
+MAX_WORKERS = 4
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5        # segundos; se duplica en cada intento
+BACKOFF_MAX = 8.0
+
+# Vale la pena reintentar: serialización/deadlock/timeout de Postgres, PostgREST
+# sin conexión a la DB y respuestas HTTP sin cuerpo JSON (408/429/5xx).
+TRANSIENT_CODES = {
+    "40001", "40P01", "57014", "53300",
+    "PGRST000", "PGRST001", "PGRST002", "PGRST003",
+    "408", "429", "500", "502", "503", "504",
+}
+
+
+def is_transient(exc: BaseException, idempotent: bool = True) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        if idempotent:
+            return True
+        # un INSERT que hizo timeout leyendo la respuesta pudo haberse aplicado:
+        # solo reintentamos si el request seguro no llegó al server
+        return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    if isinstance(exc, APIError):
+        return str(getattr(exc, "code", "") or "") in TRANSIENT_CODES
+    return False
+
+
+def error_info(exc: BaseException) -> Dict[str, Any]:
+    return {
+        "code": getattr(exc, "code", None),
+        "message": getattr(exc, "message", None) or str(exc),
+        "details": getattr(exc, "details", None),
+        "hint": getattr(exc, "hint", None),
+    }
+
+
+def chunked(items: Sequence[Any], size: int) -> List[List[Any]]:
+    size = max(1, int(size))
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def _send_with_retry(send: Callable[[List[Any]], Any], chunk: List[Any], retries: int,
+                     sleep: Callable[[float], None], idempotent: bool) -> Dict[str, Any]:
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            send(chunk)
+            return {"ok": True, "attempts": attempt, "error": None}
+        except Exception as e:
+            transient = is_transient(e, idempotent)
+            if attempt > retries or not transient:
+                return {"ok": False, "attempts": attempt, "error": error_info(e), "transient": transient}
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            sleep(delay * (0.5 + random.random() / 2))  # jitter para no sincronizar reintentos
+
+
+def _write_chunk(send: Callable[[List[Any]], Any], chunk: List[Any], retries: int,
+                 sleep: Callable[[float], None], isolate: bool, idempotent: bool) -> List[Dict[str, Any]]:
+    res = _send_with_retry(send, chunk, retries, sleep, idempotent)
+    if res["ok"] or not isolate or len(chunk) == 1 or res.get("transient"):
+        return [dict(res, items=chunk)]
+    # error permanente (constraint, tipo inválido...): partimos para aislar las filas malas
+    mid = len(chunk) // 2
+    return (_write_chunk(send, chunk[:mid], retries, sleep, isolate, idempotent)
+            + _write_chunk(send, chunk[mid:], retries, sleep, isolate, idempotent))
+
+
+def write_chunks(send: Callable[[List[Any]], Any], items: Sequence[Any],
+                 chunk_size: int = CHUNK_SIZE, max_workers: int = MAX_WORKERS,
+                 retries: int = MAX_RETRIES, isolate: bool = True, idempotent: bool = True,
+                 sleep: Callable[[float], None] = time.sleep) -> Dict[str, Any]:
+    """
+    Ejecuta `send(chunk)` para cada chunk de `items` (en paralelo, con reintentos).
+    Con idempotent=False (inserts) no se reintentan errores que no garantizan que el request no se aplicó.
+    Retorna {'ok': bool, 'written': int, 'chunks': [{'items', 'ok', 'attempts', 'error'}],
+             'failed': [(item, error)]}.
+    """
+    chunks = chunked(items, chunk_size)
+    if not chunks:
+        return {"ok": True, "written": 0, "chunks": [], "failed": []}
+    workers = max(1, min(max_workers, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_write_chunk, send, c, retries, sleep, isolate, idempotent) for c in chunks]
+        results = [r for f in futures for r in f.result()]
+
+    failed = [(item, r["error"]) for r in results if not r["ok"] for item in r["items"]]
+    return {
+        "ok": not failed,
+        "written": sum(len(r["items"]) for r in results if r["ok"]),
+        "chunks": results,
+        "failed": failed,
+    }
@@ -0,0 +1,239 @@
+# local_mirror.py
+"""
+Mirror local de la tabla tasks, para arrancar sin esperar a la red y seguir trabajando offline.
+
+- Snapshot: un parquet con el frame del front + la versión (updated_at) de cada fila; el
+  watermark del sync va en la metadata del archivo. Se reescribe atómico (tmp + rename) tras
+  cada sync que trae cambios y leerlo es una lectura columnar, sin parseo por fila.
+- Pendientes: SQLite con UNA fila por tarea tocada offline. Ediciones sucesivas de la misma
+  tarea se fusionan (update sobre update suma columnas, update sobre un insert local edita
+  el insert, delete de un insert local lo descarta). Cada fila guarda la versión del server
+  sobre la que se editó (base_version) para detectar conflictos al reenviar.
+  Las tareas creadas offline llevan ids temporales negativos hasta que se insertan.
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+MIRROR_DIR = os.getenv("MIRROR_DIR", ".mirror")
+SNAPSHOT_FILE = "tasks.parquet"
+PENDING_FILE = "pending.sqlite3"
+VERSION_COL = "_version"
+
+STATUSES = ["queued", "conflict", "failed"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_tasks (
+    row_id       INTEGER PRIMARY KEY,   -- id de la tarea (negativo: creada offline)
+    kind         TEXT NOT NULL,         -- insert | update | delete
+    payload      TEXT NOT NULL,         -- JSON en formato PostgREST (parcial en updates)
+    base_version TEXT,                  -- updated_at del server cuando se editó
+    status       TEXT NOT NULL DEFAULT 'queued',
+    error        TEXT,
+    server_row   TEXT,                  -- fila del server al detectar el conflicto
+    queued_at    TEXT NOT NULL,
+    updated_at   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mirror_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class LocalMirror:
+    """Snapshot parquet + cola de cambios offline en SQLite. Thread-safe (una conexión protegida por lock)."""
+
+    def __init__(self, base: str = MIRROR_DIR):
+        os.makedirs(base, exist_ok=True)
+        self.snapshot_path = os.path.join(base, SNAPSHOT_FILE)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._next_save: Optional[Tuple[pd.DataFrame, Dict[str, Any]]] = None
+        self._saver: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(os.path.join(base, PENDING_FILE), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    # ---------- snapshot ----------
+    def load(self) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        """(frame, {'watermark', 'versions', 'saved_at'}) del último snapshot, o None si no hay."""
+        if not os.path.exists(self.snapshot_path):
+            return None
+        import pyarrow.parquet as pq  # viene con streamlit
+        table = pq.read_table(self.snapshot_path)
+        meta = json.loads((table.schema.metadata or {}).get(b"mirror", b"{}"))
+        df = table.to_pandas()
+        versions = pd.Series(df[VERSION_COL].to_numpy(dtype=object),
+                             index=pd.Index(df["id"].to_numpy(dtype="int64"), name="id"), dtype=object)
+        return df.drop(columns=[VERSION_COL]), {"watermark": meta.get("watermark"), "versions": versions,
+                                                "saved_at": meta.get("saved_at")}
+
+    def save(self, df: pd.DataFrame, state: Dict[str, Any]) -> None:
+        """Escribe el snapshot (filas con id del server) y su estado de sync, atómico."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        df = df[df["id"].notna() & (df["id"] > 0)]
+        versions = state.get("versions")
+        version = (versions.reindex(df["id"].to_numpy(dtype="int64")).to_numpy(dtype=object)
+                   if versions is not None else None)
+        table = pa.Table.from_pandas(df.assign(**{VERSION_COL: version}), preserve_index=False)
+        meta = {"watermark": state.get("watermark"), "saved_at": _now()}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b"mirror": json.dumps(meta).encode()})
+        tmp = self.snapshot_path + ".tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, self.snapshot_path)  # un lector nunca ve el archivo a medias
+
+    def save_async(self, df: pd.DataFrame, state: Dict[str, Any]) -> None:
+        """save() en un hilo: si llegan varios snapshots mientras escribe, solo se guarda el último."""
+        with self._save_lock:
+            self._next_save = (df, state)
+            if self._saver is not None and self._saver.is_alive():
+                return
+            self._saver = threading.Thread(target=self._save_loop, name="mirror-save", daemon=True)
+            self._saver.start()
+
+    def _save_loop(self) -> None:
+        while True:
+            with self._save_lock:
+                job, self._next_save = self._next_save, None
+                if job is None:
+                    return
+            try:
+                self.save(*job)
+            except Exception:  # disco lleno / sin permisos: el mirror es best-effort
+                pass
+
+    # ---------- cambios offline ----------
+    def _exec(self, sql: str, params: Any = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _bump(self) -> None:
+        self._conn.execute("INSERT INTO mirror_meta (key, value) VALUES ('revision', '1') "
+                           "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def revision(self) -> int:
+        """Contador que cambia con cada modificación de los pendientes (para claves de cache)."""
+        row = self._exec("SELECT value FROM mirror_meta WHERE key='revision'").fetchone()
+        return int(row["value"]) if row else 0
+
+    def queue(self, changes: Dict[str, Any], versions: Optional[pd.Series] = None) -> Dict[str, int]:
+        """
+        Encola {'insert': [payload], 'update': [payload parcial con 'id'], 'delete': [ids]}
+        (lo que arma main.diff_tasks) fusionando con lo ya pendiente de cada tarea.
+        `versions` (id -> updated_at del snapshot) fija la base_version de las tareas que se tocan por primera vez.
+        Retorna cuántas tareas quedaron pendientes por tipo.
+        """
+        def base(row_id: int) -> Optional[str]:
+            if versions is None or row_id not in versions.index:
+                return None
+            v = versions.loc[row_id]
+            return None if pd.isna(v) else str(v)
+
+        now = _now()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute("SELECT row_id, kind, payload FROM pending_tasks").fetchall()
+                pending = {r["row_id"]: (r["kind"], json.loads(r["payload"])) for r in cur}
+                temp = min([0, *pending]) - 1
+
+                def put(row_id: int, kind: str, payload: Dict[str, Any]) -> None:
+                    self._conn.execute(
+                        "INSERT INTO pending_tasks (row_id, kind, payload, base_version, queued_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (row_id) DO UPDATE SET kind=excluded.kind, "
+                        "payload=excluded.payload, status='queued', error=NULL, updated_at=excluded.updated_at",
+                        (row_id, kind, json.dumps(payload), base(row_id), now, now))
+
+                for item in changes.get("insert", []):
+                    put(temp, "insert", {k: v for k, v in item.items() if k != "id"})
+                    temp -= 1
+                for item in changes.get("update", []):
+                    row_id = int(item["id"])
+                    delta = {k: v for k, v in item.items() if k != "id"}
+                    kind, prev = pending.get(row_id, ("insert" if row_id < 0 else "update", {}))
+                    if kind == "delete":
+                        continue
+                    put(row_id, kind, {**prev, **delta})
+                for row_id in map(int, changes.get("delete", [])):
+                    if pending.get(row_id, ("",))[0] == "insert" or row_id < 0:
+                        self._conn.execute("DELETE FROM pending_tasks WHERE row_id=?", (row_id,))
+                    else:
+                        put(row_id, "delete", {})
+                self._bump()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.counts()
+
+    def pending(self, statuses: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Tareas pendientes en orden de encolado, con payload/server_row ya decodificados."""
+        sql = "SELECT * FROM pending_tasks"
+        params: List[Any] = []
+        if statuses:
+            sql += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        rows = self._exec(sql + " ORDER BY queued_at, row_id DESC", params).fetchall()
+        out = []
+        for r in rows:
+            d = dict(r)
+            d["payload"] = json.loads(d["payload"])
+            d["server_row"] = json.loads(d["server_row"]) if d["server_row"] else None
+            out.append(d)
+        return out
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._exec("SELECT status, COUNT(*) AS n FROM pending_tasks GROUP BY status").fetchall()
+        counts = {s: 0 for s in STATUSES}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+    def has_pending(self) -> bool:
+        return self._exec("SELECT 1 FROM pending_tasks LIMIT 1").fetchone() is not None
+
+    def _many(self, sql: str, params: List[Tuple[Any, ...]]) -> None:
+        if not params:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(sql, params)
+                self._bump()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def done(self, row_ids: List[int]) -> None:
+        """Quita las tareas que ya quedaron escritas en el server (o que se descartan)."""
+        self._many("DELETE FROM pending_tasks WHERE row_id=?", [(int(i),) for i in row_ids])
+
+    def mark(self, row_ids: List[int], status: str, error: Optional[str] = None,
+             server_rows: Optional[Dict[int, Optional[Dict[str, Any]]]] = None) -> None:
+        """Cambia el estado (conflict/failed/queued) y guarda error y fila del server si vienen."""
+        now = _now()
+        self._many(
+            "UPDATE pending_tasks SET status=?, error=?, server_row=?, updated_at=? WHERE row_id=?",
+            [(status, error, json.dumps((server_rows or {}).get(int(i))) if server_rows else None, now, int(i))
+             for i in row_ids])
+
+    def rebase(self, versions: Dict[int, Optional[str]]) -> None:
+        """Acepta la versión actual del server como base (forzar los cambios locales) y reencola."""
+        now = _now()
+        self._many(
+            "UPDATE pending_tasks SET base_version=?, status='queued', error=NULL, server_row=NULL, "
+            "updated_at=? WHERE row_id=?",
+            [(v, now, int(i)) for i, v in versions.items()])
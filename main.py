@@ -1,14 +1,29 @@
 # main.py
 from __future__ import annotations
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, date
-from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
 
 import pandas as pd
+import httpx
 import numpy as np
 import streamlit as st
 from supabase import create_client, Client
 import plotly.express as px
+import plotly.graph_objects as go
+
+import analytics
+import batch
+import scheduling
+import workload
+from workcal import WorkCalendar
+from local_mirror import LocalMirror
+from task_index import TaskFilterIndex
 
 # Tu DB tiene collaborators/tags como ARRAY => usamos listas Python
 DB_ARRAY_COLS = True
@@ -21,15 +36,26 @@ ENUM_RAG = ["Verde", "Amarillo", "Rojo"]
 FRONT_COLS = [
     "id", "project_name", "task", "details", "owner",
     "collaborators", "start", "end", "progress",
-    "status", "priority", "rag", "milestone",
+    "status", "priority", "rag", "milestone", "predecessors",
     "baseline_start", "baseline_end", "actual_start", "actual_end",
     "phase", "workstream", "tags", "external_link"
 ]
 
+# Lectura paginada: tamaño de página (<= max-rows de PostgREST) y requests en paralelo
+FETCH_PAGE_SIZE = int(os.getenv("FETCH_PAGE_SIZE", "1000"))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+
+DATE_COLS = ["start", "end", "baseline_start", "baseline_end", "actual_start", "actual_end"]
+
 # ----------------- Supabase -----------------
 SUPABASE_URL = st.secrets.get("SUPABASE_URL") or os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = st.secrets.get("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_ANON_KEY")
 
+# Cache compartido de snapshots (ver TaskCache)
+TASKS_CACHE_TTL = float(st.secrets.get("TASKS_CACHE_TTL") or os.getenv("TASKS_CACHE_TTL") or 300)
+TASKS_CACHE_MAX_ENTRIES = 16
+FULL_TABLE: tuple = ()  # clave de consulta de la tabla completa
+
 @st.cache_resource
 def get_sb() -> Optional[Client]:
     try:
@@ -134,38 +160,91 @@ def _to_bool(v: Any) -> bool:
     return bool(v)
 
 # ----------------- Schema & transforms -----------------
+TEXT_COLS = ["project_name", "task", "details", "owner", "collaborators", "tags", "external_link", "predecessors"]
+# Categóricas: las de ENUM_* con categorías fijas; phase/workstream con las que aparezcan
+CATEGORY_COLS: Dict[str, Optional[List[str]]] = {
+    "status": ENUM_STATUS, "priority": ENUM_PRIORITY, "rag": ENUM_RAG,
+    "phase": None, "workstream": None,
+}
+
+def _is_enum_cat(s: pd.Series, categories: List[str]) -> bool:
+    return isinstance(s.dtype, pd.CategoricalDtype) and list(s.cat.categories) == categories
+
+def _schema_ok(df: pd.DataFrame) -> bool:
+    """True si el frame ya cumple el esquema (solo chequeos de dtype y rangos, sin copiar)."""
+    if list(df.columns) != FRONT_COLS:
+        return False
+    dt = df.dtypes
+    if dt["id"] != "Int64" or dt["progress"] != "int64" or dt["milestone"] != "bool":
+        return False
+    if any(dt[c] != object for c in TEXT_COLS):
+        return False
+    if any(dt[c].kind != "M" for c in DATE_COLS):
+        return False
+    for c, cats in CATEGORY_COLS.items():
+        if not isinstance(dt[c], pd.CategoricalDtype):
+            return False
+        if cats is not None and not _is_enum_cat(df[c], cats):
+            return False
+    if len(df) and (df["progress"].min() < 0 or df["progress"].max() > 100):
+        return False
+    return not (df["status"].isna().any() or df["priority"].isna().any())
+
+def _enum_col(s: pd.Series, categories: List[str], default: Optional[str]) -> pd.Series:
+    """Categórica con categorías fijas; valores fuera de la lista -> default (o nulo)."""
+    if not _is_enum_cat(s, categories):
+        s = pd.Series(pd.Categorical(s.astype(object), categories=categories), index=s.index)
+    return s.fillna(default) if default is not None else s
+
 def ensure_schema(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    for c in FRONT_COLS:
-        if c not in df.columns:
-            df[c] = pd.NA
+    """
+    Normaliza columnas y tipos. status/priority/rag/phase/workstream quedan como Categorical.
+    Si el frame ya cumple el esquema se devuelve el mismo objeto (sin copiar): no mutarlo in-place.
+    """
+    if _schema_ok(df):
+        return df
 
-    df["id"] = pd.to_numeric(df["id"], errors="coerce").astype("Int64")
+    def col(c: str) -> pd.Series:
+        return df[c] if c in df.columns else pd.Series(pd.NA, index=df.index, dtype=object)
 
-    text_like = [
-        "project_name", "task", "details", "owner",
-        "status", "priority", "rag", "phase",
-        "workstream", "tags", "external_link", "collaborators"
-    ]
-    for c in text_like:
-        df[c] = df[c].astype("object")
-        df[c] = df[c].where(~pd.isna(df[c]), None)
+    out: Dict[str, pd.Series] = {}
+    out["id"] = pd.to_numeric(col("id"), errors="coerce").astype("Int64")
 
-    for c in ["start", "end", "baseline_start", "baseline_end", "actual_start", "actual_end"]:
-        df[c] = pd.to_datetime(df[c], errors="coerce")
+    for c in TEXT_COLS:
+        s = col(c).astype("object")
+        out[c] = s.where(s.notna(), None)
 
-    df["progress"] = pd.to_numeric(df["progress"], errors="coerce").fillna(0).astype(int).clip(0, 100)
-    df["milestone"] = df["milestone"].apply(lambda v: False if v is None or (isinstance(v, float) and pd.isna(v)) else bool(v))
+    for c in DATE_COLS:
+        s = col(c)
+        if s.dtype.kind == "M":
+            out[c] = s
+        elif s.isna().all():  # columna ausente o vacía: no hace falta parsear
+            out[c] = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        else:
+            out[c] = pd.to_datetime(s, errors="coerce")
 
-    mask_status_bad = df["status"].isna() | ~df["status"].isin(ENUM_STATUS)
-    df.loc[mask_status_bad, "status"] = "No iniciado"
+    out["progress"] = pd.to_numeric(col("progress"), errors="coerce").fillna(0).astype(int).clip(0, 100)
+    m = col("milestone")
+    if m.dtype != bool:
+        m = m.astype(object)
+        m = m.where(m.notna(), False).astype(bool)
+    out["milestone"] = m
 
-    mask_prio_bad = df["priority"].isna() | ~df["priority"].isin(ENUM_PRIORITY)
-    df.loc[mask_prio_bad, "priority"] = "Media"
+    out["status"] = _enum_col(col("status"), ENUM_STATUS, "No iniciado")
+    out["priority"] = _enum_col(col("priority"), ENUM_PRIORITY, "Media")
+    out["rag"] = _enum_col(col("rag"), ENUM_RAG, None)
+    for c in ("phase", "workstream"):
+        s = col(c)
+        out[c] = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype(object).astype("category")
 
-    df.loc[~df["rag"].isin(ENUM_RAG) & ~df["rag"].isna(), "rag"] = None
+    return pd.DataFrame({c: out[c] for c in FRONT_COLS}, index=df.index)
 
-    return df[FRONT_COLS]
+def editable_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copia para st.data_editor: las categóricas vuelven a texto, porque el editor
+    escribe valores que pueden no estar entre las categorías (p.ej. "" en RAG o una fase nueva).
+    """
+    return df.assign(**{c: _none_na(df[c]) for c in CATEGORY_COLS if c in df.columns})
 
 def df_from_supabase(rows: List[Dict[str, Any]]) -> pd.DataFrame:
     if not rows:
@@ -174,6 +253,8 @@ def df_from_supabase(rows: List[Dict[str, Any]]) -> pd.DataFrame:
     # Para la UI mostramos CSV; la DB guarda arrays reales
     if "collaborators" in df.columns:
         df["collaborators"] = df["collaborators"].apply(_to_csv_from_list)
+    if "predecessors" in df.columns:
+        df["predecessors"] = df["predecessors"].apply(_to_csv_from_list)
     if "tags" in df.columns:
         if isinstance(df["tags"], pd.Series):
             df["tags"] = df["tags"].apply(_to_csv_from_list)
@@ -182,95 +263,760 @@ def df_from_supabase(rows: List[Dict[str, Any]]) -> pd.DataFrame:
     return ensure_schema(df)
 
 
+# ----------------- Serialización columnar -----------------
+def _none_na(s: pd.Series) -> pd.Series:
+    """Columna object con None en lugar de NaN/NaT/<NA> (JSON-safe)."""
+    s = s.astype(object)
+    return s.where(s.notna(), None)
+
+def _col_or(s: pd.Series, default: Any) -> pd.Series:
+    """Equivalente vectorizado de `(v or default)` para columnas de texto."""
+    s = _none_na(s)
+    return s.where(s.notna() & (s != ""), default)
+
+def _col_dates(s: pd.Series) -> pd.Series:
+    """'YYYY-MM-DD' o None para una columna datetime64 (lo que hace _date_to_str(_coerce_date(x)))."""
+    return _none_na(s.dt.strftime("%Y-%m-%d"))
+
+def _col_csv_lists(s: pd.Series) -> List[Optional[List[str]]]:
+    """_to_list_from_csv por columna: un único split + explode sobre las celdas de texto."""
+    s = _none_na(s).reset_index(drop=True)
+    is_str = s.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    # .str solo sobre celdas de texto: una columna de listas/números no lo admite
+    stripped = s[is_str].astype(str).str.strip()
+    ok = (stripped != "") & ~stripped.str.lower().isin(["nan", "none", "<na>"])
+
+    parts = stripped[ok].str.split(",").explode().str.strip()
+    parts = parts[parts != ""]
+    # explode conserva el orden: cortamos el array plano donde cambia la fila
+    rows = parts.index.to_numpy()
+    cuts = np.flatnonzero(np.diff(rows)) + 1
+    firsts = rows[np.concatenate(([0], cuts))] if len(rows) else rows
+    chunks = np.split(parts.to_numpy(dtype=object), cuts)
+
+    out: List[Optional[List[str]]] = [None] * len(s)
+    for i in ok.index[ok.to_numpy()]:
+        out[i] = []
+    for i, chunk in zip(firsts, chunks):
+        out[i] = chunk.tolist()
+    # listas ya armadas, números, etc.: mismo resultado que el helper por celda
+    for i in np.flatnonzero(~is_str & s.notna().to_numpy()):
+        out[i] = _to_list_from_csv(s.iat[i])
+    return out
+
+def _id_token(x: Any) -> Optional[int]:
+    """'12' o '12.0' (un id que pasó por float) -> 12; cualquier otra cosa -> None."""
+    whole, _, frac = str(x).partition(".")
+    return int(whole) if whole.isdigit() and frac.strip("0") == "" else None
+
+def _col_id_lists(s: pd.Series) -> List[List[int]]:
+    """
+    CSV de ids -> lista de enteros (bigint[] en la DB); lo que no es un id se descarta.
+    Celdas numéricas (read_csv lee como float una columna con un solo id por fila) cuentan como un id.
+    """
+    s = _none_na(s)
+    numeric = s.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+    if numeric.any():
+        s = s.copy()
+        s[numeric] = s[numeric].map(str)
+    return [[i for i in map(_id_token, lst) if i is not None] if lst else [] for lst in _col_csv_lists(s)]
+
 def payload_for_upsert(df: pd.DataFrame) -> list[dict]:
+    """
+    Serializa el frame a la lista de dicts JSON-safe que espera PostgREST.
+    Todo se resuelve por columna; la única pasada por fila es el armado final de los dicts.
+    'id' va al final y solo cuando tiene valor.
+    """
     df = ensure_schema(df)
-    out = []
-    for _, r in df.iterrows():
-        item = {
-            # OJO: NO incluimos 'id' acá; lo agregamos solo si tiene valor
-            "project_name": (r["project_name"] or "").strip(),
-            "task": (r["task"] or "").strip(),
-            "details": (r["details"] or None),
-            "owner": (r["owner"] or None),
-            "collaborators": _to_list_from_csv(r["collaborators"]),
-            "start_date": _date_to_str(_coerce_date(r["start"])),
-            "end_date": _date_to_str(_coerce_date(r["end"])),
-            "progress": _to_int(r["progress"]) or 0,
-            "status": (r["status"] or "No iniciado"),
-            "priority": (r["priority"] or "Media"),
-            "rag": (r["rag"] if r["rag"] in ENUM_RAG else None),
-            "milestone": _to_bool(r["milestone"]),
-            "baseline_start": _date_to_str(_coerce_date(r["baseline_start"])),
-            "baseline_end": _date_to_str(_coerce_date(r["baseline_end"])),
-            "actual_start": _date_to_str(_coerce_date(r["actual_start"])),
-            "actual_end": _date_to_str(_coerce_date(r["actual_end"])),
-            "phase": (r["phase"] or None),
-            "workstream": (r["workstream"] or None),
-            "tags": _to_list_from_csv(r["tags"]),
-            "external_link": (r["external_link"] or None),
-        }
-        id_val = _to_int(r["id"])
-        if id_val is not None:
-            item["id"] = id_val  # solo cuando existe
-        out.append(item)
+    if df.empty:
+        return []
+    cols = {
+        "project_name": _col_or(df["project_name"], "").str.strip(),
+        "task": _col_or(df["task"], "").str.strip(),
+        "details": _col_or(df["details"], None),
+        "owner": _col_or(df["owner"], None),
+        "collaborators": _col_csv_lists(df["collaborators"]),
+        "start_date": _col_dates(df["start"]),
+        "end_date": _col_dates(df["end"]),
+        "progress": df["progress"].astype(int),
+        "status": _col_or(df["status"], "No iniciado"),
+        "priority": _col_or(df["priority"], "Media"),
+        "rag": _none_na(df["rag"]).where(df["rag"].isin(ENUM_RAG), None),
+        "milestone": df["milestone"].astype(bool),
+        "predecessors": _col_id_lists(df["predecessors"]),
+        "baseline_start": _col_dates(df["baseline_start"]),
+        "baseline_end": _col_dates(df["baseline_end"]),
+        "actual_start": _col_dates(df["actual_start"]),
+        "actual_end": _col_dates(df["actual_end"]),
+        "phase": _col_or(df["phase"], None),
+        "workstream": _col_or(df["workstream"], None),
+        "tags": _col_csv_lists(df["tags"]),
+        "external_link": _col_or(df["external_link"], None),
+    }
+    keys = list(cols)
+    values = [v if isinstance(v, list) else v.tolist() for v in cols.values()]
+    out = [dict(zip(keys, row)) for row in zip(*values)]
+
+    ids = df["id"]
+    for i, id_val in zip(np.flatnonzero(ids.notna().to_numpy()), ids.dropna().tolist()):
+        out[i]["id"] = int(id_val)  # solo cuando existe
     return out
 
 
-def upsert_tasks(df: pd.DataFrame) -> bool:
+# ----------------- Change tracking -----------------
+# Columnas que el INSERT de un upsert parcial necesita aunque no hayan cambiado
+# (Postgres valida NOT NULL antes de resolver el ON CONFLICT).
+UPSERT_REQUIRED = ("project_name", "task")
+
+def _row_hashes(df: pd.DataFrame) -> pd.Series:
+    """Hash por fila (todas las columnas menos 'id'), indexado por id. Filas sin id quedan fuera."""
+    with_id = df[df["id"].notna()]
+    cols = [c for c in FRONT_COLS if c != "id"]
+    data = with_id[cols].astype({c: "datetime64[ns]" for c in DATE_COLS})  # misma unidad en ambos lados
+    h = pd.util.hash_pandas_object(data, index=False)
+    h.index = pd.Index(with_id["id"].astype("int64").to_numpy(), name="id")
+    return h[~h.index.duplicated(keep="last")]
+
+def diff_tasks(before: pd.DataFrame, after: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Compara el snapshot cargado (before) con el frame editado (after).
+    Retorna {'insert': [payload], 'update': [payload parcial con 'id'], 'delete': [ids]}.
+    Los updates solo llevan las columnas que cambiaron (+ UPSERT_REQUIRED).
+    """
+    before = ensure_schema(before)
+    after = ensure_schema(after)
+
+    h_before = _row_hashes(before)
+    h_after = _row_hashes(after)
+
+    deleted = h_before.index.difference(h_after.index)
+    common = h_after.index.intersection(h_before.index)
+    changed = common[h_after.loc[common].to_numpy() != h_before.loc[common].to_numpy()]
+    # ids que no estaban en el snapshot: se mandan completos
+    unknown = h_after.index.difference(h_before.index)
+
+    to_insert = payload_for_upsert(after[after["id"].isna()])
+    for item in to_insert:
+        item.pop("id", None)
+
+    new_payload = payload_for_upsert(after[after["id"].isin(changed.union(unknown))])
+    old_payload = {p["id"]: p for p in payload_for_upsert(before[before["id"].isin(changed)])}
+
+    to_update = []
+    for item in new_payload:
+        old = old_payload.get(item["id"])
+        if old is None:
+            to_update.append(item)
+            continue
+        delta = {k: v for k, v in item.items() if k != "id" and old.get(k) != v}
+        if not delta:
+            continue  # cambió algo que el payload normaliza (p.ej. espacios)
+        for k in UPSERT_REQUIRED:
+            delta.setdefault(k, item[k])
+        delta["id"] = item["id"]
+        to_update.append(delta)
+
+    return {
+        "insert": to_insert,
+        "update": to_update,
+        "delete": [int(i) for i in deleted],
+    }
+
+def _group_by_columns(items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    # PostgREST arma el bulk con la unión de claves: cada request debe tener claves homogéneas
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for item in items:
+        groups.setdefault(tuple(sorted(item)), []).append(item)
+    return list(groups.values())
+
+
+def upsert_tasks(df: pd.DataFrame, base: Optional[pd.DataFrame] = None,
+                 versions: Optional[pd.Series] = None) -> bool:
+    """
+    Persiste el frame editado. Con `base` (snapshot cargado) solo se envían
+    las filas nuevas, las columnas modificadas y los ids eliminados;
+    sin `base` se hace el upsert completo de todas las filas.
+    Sin conexión, o con cambios offline todavía en cola (para respetar el orden), los cambios
+    van al mirror local; `versions` (id -> updated_at del snapshot) permite detectar conflictos al reenviarlos.
+    """
     sb = get_sb()
-    if sb is None:
+    if sb is None and base is None:
         st.warning("Sin conexión a Supabase: cambios NO persistidos (demo).")
         return False
 
-    payload = payload_for_upsert(df)
-    if not payload:
+    if base is not None:
+        changes = diff_tasks(base, df)
+        to_insert, to_upsert, to_delete = changes["insert"], changes["update"], changes["delete"]
+    else:
+        payload = payload_for_upsert(df)
+        # Particionamos: nuevas (sin 'id') -> INSERT; existentes (con 'id') -> UPSERT
+        to_insert, to_upsert, to_delete = [], [], []
+        for item in payload:
+            if "id" in item and item["id"] is not None:
+                to_upsert.append(item)
+            else:
+                item.pop("id", None)  # asegurar que NO vaya 'id': null
+                to_insert.append(item)
+
+    if not (to_insert or to_upsert or to_delete):
         return True
+    if _offline_mode(sb):
+        return _save_offline({"insert": to_insert, "update": to_upsert, "delete": to_delete}, versions, base)
+    online = _split_local({"update": to_upsert, "delete": to_delete})
+    to_upsert, to_delete = online["update"], online["delete"]
+    if not (to_insert or to_upsert or to_delete):
+        return True
+    _drop_missing_columns(sb, to_insert + to_upsert)
 
-    # Particionamos: nuevas (sin 'id') -> INSERT; existentes (con 'id') -> UPSERT
-    to_insert, to_upsert = [], []
-    for item in payload:
-        if "id" in item and item["id"] is not None:
-            to_upsert.append(item)
-        else:
-            item.pop("id", None)  # asegurar que NO vaya 'id': null
-            to_insert.append(item)
+    # filas con versión conocida: update/delete condicional (concurrencia optimista)
+    guarded, to_upsert, to_delete = _guarded(to_upsert, to_delete, versions)
+    saved = save_if_unchanged(sb, guarded) if guarded else None
+    if guarded and saved is None:  # la DB no tiene la función: upsert/delete como antes
+        to_upsert += [dict(c["patch"], id=c["id"]) for c in guarded if c["op"] == "update"]
+        to_delete += [c["id"] for c in guarded if c["op"] == "delete"]
 
-    try:
-        if to_insert:
-            sb.table(TABLE).insert(to_insert).execute()
-        if to_upsert:
-            sb.table(TABLE).upsert(to_upsert, on_conflict="id").execute()
+    results = [("save", saved["result"])] if saved else []
+    if to_insert:
+        results.append(("insert", batch.write_chunks(
+            lambda rows: sb.table(TABLE).insert(rows).execute(), to_insert, idempotent=False)))
+    for group in _group_by_columns(to_upsert):
+        results.append(("upsert", batch.write_chunks(
+            lambda rows: sb.table(TABLE).upsert(rows, on_conflict="id").execute(), group)))
+    if to_delete:
+        results.append(("delete", batch.write_chunks(
+            lambda ids: sb.table(TABLE).delete().in_("id", ids).execute(), to_delete,
+            chunk_size=batch.DELETE_CHUNK_SIZE)))
+    # aun con error parcial algo pudo escribirse: el snapshot compartido ya no vale
+    invalidate_caches()
+    if saved:
+        _hold_conflicts(saved["conflicts"], guarded, versions, base)
+    return _report_write_results(_spill_offline(results, versions, base), "guardar")
+
+def _report_write_results(results: List[Tuple[str, Dict[str, Any]]], action: str) -> bool:
+    """Muestra las filas rechazadas (una por fila, con su error). True si todo se escribió."""
+    failed = []
+    for op, res in results:
+        for item, err in res["failed"]:
+            row = {"op": op}
+            if isinstance(item, dict):
+                row.update({"id": item.get("id"), "project_name": item.get("project_name"), "task": item.get("task")})
+            else:
+                row["id"] = item
+            row.update({"code": err.get("code"), "message": err.get("message"), "details": err.get("details")})
+            failed.append(row)
+    if not failed:
         return True
-    except Exception as e:
-        st.error("❌ Error de Supabase al guardar")
+    written = sum(res["written"] for _, res in results)
+    st.error(f"❌ Supabase rechazó {len(failed)} fila(s) al {action} ({written} escritas OK).")
+    st.dataframe(pd.DataFrame(failed), use_container_width=True, hide_index=True)
+    return False
+
+# ----------------- Concurrencia optimista -----------------
+# Cada update/delete viaja con la versión (updated_at) sobre la que se editó y la DB solo lo
+# aplica si la fila sigue en esa versión; las que no, vuelven con la fila actual del server
+# en la misma respuesta. Usa updated_at y el trigger de "Sync incremental". En Supabase SQL:
+#   create or replace function tasks_save_if_unchanged(changes jsonb) returns jsonb
+#   language plpgsql as $$
+#   declare applied bigint[]; removed bigint[];
+#   begin
+#     with req as (
+#       select (c->>'id')::bigint as id, (c->>'expected')::timestamptz as expected,
+#              c->>'op' as op, coalesce(c->'patch', '{}'::jsonb) as patch
+#       from jsonb_array_elements(changes) c
+#     ), upd as (
+#       update tasks t set (project_name, task, details, owner, collaborators, start_date, end_date,
+#                           progress, status, priority, rag, milestone, predecessors, baseline_start,
+#                           baseline_end, actual_start, actual_end, phase, workstream, tags, external_link)
+#         = (select r.project_name, r.task, r.details, r.owner, r.collaborators, r.start_date, r.end_date,
+#                   r.progress, r.status, r.priority, r.rag, r.milestone, r.predecessors, r.baseline_start,
+#                   r.baseline_end, r.actual_start, r.actual_end, r.phase, r.workstream, r.tags, r.external_link
+#            from jsonb_populate_record(t, req.patch) r)
+#       from req
+#       where req.op = 'update' and t.id = req.id and t.updated_at = req.expected
+#       returning t.id
+#     ), del as (
+#       delete from tasks t using req
+#       where req.op = 'delete' and t.id = req.id and t.updated_at = req.expected
+#       returning t.id
+#     )
+#     select (select coalesce(array_agg(id), '{}') from upd), (select coalesce(array_agg(id), '{}') from del)
+#       into applied, removed;
+#     return jsonb_build_object(
+#       'applied', to_jsonb(applied || removed),
+#       'conflicts', coalesce((select jsonb_agg(to_jsonb(t)) from tasks t
+#                              where t.id in (select (c->>'id')::bigint from jsonb_array_elements(changes) c)
+#                                and t.id <> all(applied || removed)), '[]'::jsonb));
+#   end $$;
+# El where del update se reevalúa sobre la versión que dejó una escritura concurrente, así que
+# entre dos guardados simultáneos de la misma fila uno solo gana. Sin la función se guarda como antes.
+SAVE_RPC = "tasks_save_if_unchanged"
+_save_rpc = {"available": None}  # se prueba una vez por proceso
+
+def _save_rpc_available(sb: Client) -> bool:
+    if _save_rpc["available"] is None:
         try:
-            from postgrest.exceptions import APIError  # type: ignore
-            if isinstance(e, APIError):
-                st.code({
-                    "code": getattr(e, "code", None),
-                    "message": getattr(e, "message", None),
-                    "details": getattr(e, "details", None),
-                    "hint": getattr(e, "hint", None),
-                    "sample_insert": to_insert[:1],
-                    "sample_upsert": to_upsert[:1],
-                })
-        except Exception:
-            st.write(e)
-        return False
+            sb.rpc(SAVE_RPC, {"changes": []}).execute()
+            _save_rpc["available"] = True
+        except APIError as e:  # PGRST202 / 42883: la función no existe
+            if str(getattr(e, "code", "")) not in ("PGRST202", "42883"):
+                raise
+            _save_rpc["available"] = False
+            st.caption(f"Sin la función {SAVE_RPC} en la DB: se guarda sin control de concurrencia.")
+    return bool(_save_rpc["available"])
+
+def _guarded(updates: List[Dict[str, Any]], deletes: List[int],
+             versions: Optional[pd.Series]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[int]]:
+    """
+    (cambios condicionales, updates sin versión conocida, deletes sin versión conocida).
+    Cambio condicional: {'op': 'update'|'delete', 'id', 'expected': updated_at, 'patch': columnas}.
+    """
+    if versions is None:
+        return [], updates, deletes
+
+    def known(i: int) -> Optional[str]:
+        v = versions.get(i) if i in versions.index else None
+        return None if v is None or pd.isna(v) else str(v)
+
+    guarded, blind_upd, blind_del = [], [], []
+    for u in updates:
+        v = known(u["id"])
+        if v is None:
+            blind_upd.append(u)
+        else:
+            guarded.append({"op": "update", "id": u["id"], "expected": v,
+                            "patch": {k: x for k, x in u.items() if k != "id"}})
+    for i in deletes:
+        v = known(i)
+        if v is None:
+            blind_del.append(i)
+        else:
+            guarded.append({"op": "delete", "id": i, "expected": v})
+    return guarded, blind_upd, blind_del
+
+def _matches(row: Dict[str, Any], patch: Dict[str, Any]) -> bool:
+    """La fila del server ya tiene los valores del patch (p.ej. un reintento de algo que sí se aplicó)."""
+    def norm(v: Any) -> Any:
+        return [str(x) for x in v] if isinstance(v, list) else (None if v is None else str(v))
+    return all(norm(row.get(k)) == norm(v) for k, v in patch.items())
+
+def save_if_unchanged(sb: Client, changes: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Manda los cambios condicionales (ver _guarded) por la RPC, en chunks. Retorna None si la
+    función no está instalada; si no {'applied': [ids], 'conflicts': {id: fila actual del server,
+    None si ya no existe}, 'gone': [ids a borrar que ya no existían], 'result': resumen de write_chunks}.
+    """
+    try:
+        if not _save_rpc_available(sb):
+            return None
+    except (httpx.TransportError, APIError) as e:
+        # sin red (o server saturado): falla transitoria, va a la cola; auth/permisos: rechazo por fila
+        transient = batch.is_transient(e)
+        if isinstance(e, httpx.TransportError):
+            _lost_connection()
+        err = batch.error_info(e)
+        return {"applied": [], "conflicts": {}, "gone": [], "result": {
+            "ok": False, "written": 0, "failed": [(c, err) for c in changes],
+            "chunks": [{"items": changes, "ok": False, "attempts": 1, "error": err, "transient": transient}]}}
+    replies: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def send(chunk: List[Dict[str, Any]]) -> None:
+        data = sb.rpc(SAVE_RPC, {"changes": chunk}).execute().data or {}
+        with lock:
+            replies.append(data)
+
+    # no idempotente: un reintento de algo que se aplicó volvería como conflicto contra sí mismo
+    res = batch.write_chunks(send, changes, idempotent=False)
+    applied = {int(i) for r in replies for i in r.get("applied") or []}
+    server = {int(row["id"]): row for r in replies for row in r.get("conflicts") or []}
+    sent = {int(c["id"]): c for ch in res["chunks"] if ch["ok"] for c in ch["items"]}
+    conflicts: Dict[int, Optional[Dict[str, Any]]] = {}
+    gone = []
+    for i, c in sent.items():
+        if i in applied:
+            continue
+        row = server.get(i)
+        if row is None and c["op"] == "delete":
+            gone.append(i)
+        elif row is not None and c["op"] == "update" and _matches(row, c["patch"]):
+            applied.add(i)
+        else:
+            conflicts[i] = row
+    return {"applied": sorted(applied), "conflicts": conflicts, "gone": gone, "result": res}
 
-      
+def _hold_conflicts(conflicts: Dict[int, Optional[Dict[str, Any]]], changes: List[Dict[str, Any]],
+                    versions: Optional[pd.Series], base: Optional[pd.DataFrame] = None) -> None:
+    """Los cambios rechazados quedan en el mirror como 'conflict' (panel de cambios pendientes) con la fila del server."""
+    if not conflicts:
+        return
+    mine = [c for c in changes if c["id"] in conflicts]
+    mirror = local_mirror()
+    if mirror is None:
+        st.error(f"{len(conflicts)} fila(s) cambiaron en Supabase desde que las cargaste y no se guardaron: "
+                 f"{sorted(conflicts)[:30]}. Recargá y volvé a editarlas.")
+        return
+    updates = _edited_only([dict(c["patch"], id=c["id"]) for c in mine if c["op"] == "update"], base)
+    mirror.queue({"update": updates, "delete": [c["id"] for c in mine if c["op"] == "delete"]}, versions)
+    mirror.mark(list(conflicts), "conflict", "la tarea cambió en Supabase desde que se cargó", server_rows=conflicts)
+    st.warning(f"⚠️ {len(conflicts)} fila(s) cambiaron en Supabase desde que las cargaste y no se pisaron. "
+               "Elegí qué versión queda en 'Cambios pendientes'.")
 
 # ----------------- CRUD -----------------
-def fetch_tasks() -> pd.DataFrame:
+def _demo_tasks() -> pd.DataFrame:
+    demo = pd.DataFrame([
+        {"id": 1, "project_name": "Demo", "task": "Tarea 1", "status": "No iniciado", "priority": "Media", "progress": 0},
+        {"id": 2, "project_name": "Demo", "task": "Tarea 2", "status": "En Progreso", "priority": "Alta", "progress": 50},
+    ])
+    return ensure_schema(demo)
+
+def fetch_tasks(filters: Optional[Dict[str, Any]] = None, refresh: bool = False) -> pd.DataFrame:
+    """
+    Tareas desde Supabase (snapshot compartido, no mutar in-place). Con `filters`
+    (los de la barra lateral, ver filter_tasks) se trae solo ese recorte, resuelto en PostgREST.
+    Sin red se filtra el mirror local (con los cambios offline encima); sin mirror, datos demo.
+    """
     sb = get_sb()
     if sb is None:
-        demo = pd.DataFrame([
-            {"id": 1, "project_name": "Demo", "task": "Tarea 1", "status": "No iniciado", "priority": "Media", "progress": 0},
-            {"id": 2, "project_name": "Demo", "task": "Tarea 2", "status": "En Progreso", "priority": "Alta", "progress": 50},
-        ])
-        return ensure_schema(demo)
-    res = sb.table(TABLE).select("*").order("project_name").order("start_date").execute()
-    return df_from_supabase(res.data or [])
+        return _offline_slice(filters)
+    key = query_key(filters)
+    if refresh:
+        task_cache().invalidate(key)
+    try:
+        return task_cache().get(key, lambda: fetch_snapshot(sb, where=lambda q: apply_filters(q, filters)))[0]
+    except httpx.TransportError:
+        _lost_connection()
+        st.warning("Sin conexión con Supabase: se muestran los datos del mirror local.")
+        return _offline_slice(filters)
+
+def _offline_slice(filters: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Recorte del mirror con su propio token: las caches de vista lo tratan como un snapshot aparte."""
+    df = offline_tasks()
+    key = query_key(filters)
+    if key == FULL_TABLE:
+        return df
+    view = filter_tasks(df, filters or {}).copy()
+    view.attrs["snapshot"] = f"{data_fingerprint(df)}|{key}"
+    return view
+
+def query_key(filters: Optional[Dict[str, Any]]) -> tuple:
+    active = {k: v for k, v in (filters or {}).items() if v is not None and v != "" and v != []}
+    return FULL_TABLE if not active else ("view",) + _freeze(active)
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def apply_filters(q: Any, filters: Optional[Dict[str, Any]]) -> Any:
+    """
+    Traduce los filtros de filter_tasks a predicados PostgREST sobre un select:
+    in_ para listas, ilike para owner y solapamiento de rango de fechas (con nulos incluidos).
+    """
+    f = filters or {}
+    for key, col in (("projects", "project_name"), ("statuses", "status"),
+                     ("priorities", "priority"), ("rags", "rag")):
+        if f.get(key):
+            q = q.in_(col, list(f[key]))
+    if f.get("owner"):
+        q = q.ilike("owner", f"*{_like_escape(str(f['owner']))}*")
+
+    # (end >= desde OR end null) AND (start <= hasta OR start null), en un solo or=(...)
+    ends = starts = None
+    if f.get("start_after") is not None:
+        ends = [f"end_date.gte.{pd.Timestamp(f['start_after']).date().isoformat()}", "end_date.is.null"]
+    if f.get("end_before") is not None:
+        starts = [f"start_date.lte.{pd.Timestamp(f['end_before']).date().isoformat()}", "start_date.is.null"]
+    if ends and starts:
+        q = q.or_(",".join(f"and({a},{b})" for a in ends for b in starts))
+    elif ends or starts:
+        q = q.or_(",".join(ends or starts))
+    return q
+
+@st.cache_data(show_spinner=False, ttl=TASKS_CACHE_TTL)
+def fetch_project_names() -> List[str]:
+    """Proyectos existentes (para el filtro) sin bajar la tabla completa."""
+    sb = get_sb()
+    try:
+        if sb is not None:
+            pages, _ = _fetch_pages(sb, "id,project_name", lambda rows: {r.get("project_name") for r in rows})
+            return sorted(set().union(*pages) - {None, ""}) if pages else []
+    except httpx.TransportError:
+        pass
+    return project_options(offline_tasks())
+
+def invalidate_caches() -> None:
+    """Tras escribir: recortes y lista de proyectos dejan de valer; la tabla completa se pone al día (ver TaskCache.after_write)."""
+    task_cache().after_write()
+    fetch_project_names.clear()
+
+Where = Callable[[Any], Any]
+
+def _fetch_segment(sb: Client, after_id: int, last_id: int, columns: str, page_size: int,
+                   convert: Callable[[List[Dict[str, Any]]], Any], where: Where) -> List[Any]:
+    """Keyset sobre id dentro de (after_id, last_id]; cada página pasa por `convert` apenas llega."""
+    out = []
+    while True:
+        res = (where(sb.table(TABLE).select(columns))
+               .gt("id", after_id).lte("id", last_id)
+               .order("id").limit(page_size).execute())
+        rows = res.data or []
+        if not rows:
+            break
+        out.append(convert(rows))
+        after_id = rows[-1]["id"]
+        # no cortamos por len(rows) < page_size: el max-rows del server puede ser menor
+        if after_id >= last_id:
+            break
+    return out
+
+def _fetch_pages(sb: Client, columns: str = "*",
+                 convert: Callable[[List[Dict[str, Any]]], Any] = lambda rows: rows,
+                 where: Optional[Where] = None, page_size: int = FETCH_PAGE_SIZE,
+                 max_workers: int = FETCH_WORKERS) -> Tuple[List[Any], int]:
+    """
+    Reparte el rango de ids (que cumplen `where`) en segmentos y los baja en paralelo.
+    Retorna (páginas convertidas en orden de id, total que reporta el server).
+    """
+    where = where or (lambda q: q)
+    head = where(sb.table(TABLE).select("id", count="exact")).order("id").limit(1).execute()
+    if not head.data:
+        return [], head.count or 0
+    total = head.count or 0
+    first_id = head.data[0]["id"]
+    last_id = where(sb.table(TABLE).select("id")).order("id", desc=True).limit(1).execute().data[0]["id"]
+
+    n_seg = max(1, min(max_workers, -(-total // page_size)))
+    bounds = np.unique(np.linspace(first_id - 1, last_id, n_seg + 1).astype("int64"))
+    with ThreadPoolExecutor(max_workers=n_seg) as pool:
+        futures = [
+            pool.submit(_fetch_segment, sb, int(a), int(b), columns, page_size, convert, where)
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        pages = [page for f in futures for page in f.result()]
+    return pages, total
+
+def _concat_tasks(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    if not frames:
+        return df_from_supabase([])
+    df = pd.concat(frames, ignore_index=True)
+    # mismo orden que el select original (project_name, start_date); id desempata
+    df = df.sort_values(["project_name", "start", "id"], na_position="last", kind="stable")
+    df = ensure_schema(df.reset_index(drop=True))
+    df.attrs["snapshot"] = uuid.uuid4().hex  # versión de datos para las caches de vista
+    return df
+
+def fetch_tasks_paged(sb: Client, page_size: int = FETCH_PAGE_SIZE,
+                      max_workers: int = FETCH_WORKERS) -> pd.DataFrame:
+    """
+    Descarga la tabla completa por páginas (keyset sobre id) en paralelo.
+    Cada página se convierte con df_from_supabase y se concatena una sola vez al final.
+    Avisa si el server reporta más filas de las recibidas.
+    """
+    frames, total = _fetch_pages(sb, "*", df_from_supabase, page_size=page_size, max_workers=max_workers)
+    df = _concat_tasks(frames)
+    if total and len(df) < total:
+        st.warning(f"Supabase reporta {total} tareas pero se recibieron {len(df)}.")
+    return df
+
+# ----------------- Sync incremental -----------------
+# Requiere en la DB:
+#   alter table tasks add column if not exists updated_at timestamptz not null default now();
+#   create or replace function tasks_touch() returns trigger language plpgsql as
+#     $$ begin new.updated_at := now(); return new; end $$;
+#   create trigger tasks_touch before insert or update on tasks
+#     for each row execute function tasks_touch();
+#   create index if not exists tasks_updated_at_idx on tasks (updated_at);
+# Sin esa columna sync_tasks degrada a recarga completa.
+
+def _page_with_versions(rows: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, pd.Series]:
+    versions = pd.Series([r.get("updated_at") for r in rows],
+                         index=pd.Index([r["id"] for r in rows], name="id"), dtype=object)
+    return df_from_supabase(rows), versions
+
+def _max_updated_at(versions: pd.Series, floor: Optional[str] = None) -> Optional[str]:
+    ts = pd.to_datetime(versions.dropna(), utc=True, errors="coerce").dropna()
+    if ts.empty or (floor is not None and pd.Timestamp(floor) >= ts.max()):
+        return floor
+    return ts.max().isoformat()
+
+def fetch_snapshot(sb: Client, where: Optional[Where] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Carga completa + estado de sync: {'watermark': max(updated_at) visto, 'versions': Series id -> updated_at}.
+    Si la tabla no tiene updated_at, watermark queda en None (la próxima sync vuelve a ser completa).
+    """
+    pages, total = _fetch_pages(sb, "*", _page_with_versions, where=where)
+    df = _concat_tasks([p[0] for p in pages])
+    if total and len(df) < total:
+        st.warning(f"Supabase reporta {total} tareas pero se recibieron {len(df)}.")
+    versions = pd.concat([p[1] for p in pages]) if pages else pd.Series(dtype=object)
+    return df, {"watermark": _max_updated_at(versions), "versions": versions}
+
+def sync_tasks(df: Optional[pd.DataFrame] = None,
+               state: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Sincroniza el frame cacheado con la DB. Con estado previo trae solo las filas con
+    updated_at >= watermark, detecta borrados (listado de ids solo si el count no cierra)
+    y mergea por id. Sin estado (o sin updated_at en la tabla) hace la carga completa.
+    Al arrancar, el mirror local reemplaza la carga completa (solo se sincroniza la diferencia);
+    sin red se sirve el mirror. Los cambios offline pendientes se reenvían antes de sincronizar
+    y se muestran encima del snapshot (state['server'] guarda el snapshot del server sin ellos).
+    Retorna (df, nuevo_estado).
+    """
+    if state and "server" in state:
+        df = state["server"]
+    if get_sb() is not None and local_mirror() is not None and local_mirror().counts()["queued"]:
+        report_replay(replay_offline())
+    server, new_state = _sync_server(df, state)
+    return with_pending(server), dict(new_state, server=server)
+
+def _sync_server(df: Optional[pd.DataFrame],
+                 state: Optional[Dict[str, Any]]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    # banderas de la corrida anterior (origen mirror/offline, snapshot sin pendientes) no se arrastran
+    state = {k: v for k, v in (state or {}).items() if k not in ("server", "offline", "mirror", "stale")}
+    sb = get_sb()
+    if sb is None:
+        return _offline_snapshot(df, state)
+    try:
+        catch_up = False
+        if df is None or not state:
+            df, state = task_cache().get(FULL_TABLE, lambda: _mirror_snapshot() or _remember(*fetch_snapshot(sb)))
+            # del mirror o marcado stale por una escritura: se pone al día con un sync incremental
+            catch_up = bool(state.get("mirror") or state.get("stale"))
+            if not catch_up:
+                return df, state
+            state = {k: v for k, v in state.items() if k not in ("mirror", "stale")}
+        if state.get("watermark") is None:
+            return _remember(*fetch_snapshot(sb))
+
+        wm = state["watermark"]
+        try:
+            # gte: filas con el mismo timestamp que el watermark no se pierden (se re-traen, son pocas)
+            pages, _ = _fetch_pages(sb, "*", _page_with_versions, where=lambda q: q.gte("updated_at", wm))
+            count = sb.table(TABLE).select("id", count="exact").limit(1).execute().count or 0
+        except APIError:
+            return _remember(*fetch_snapshot(sb))
+
+        old_versions: pd.Series = state["versions"]
+        changed_versions = pd.concat([p[1] for p in pages]) if pages else pd.Series(dtype=object)
+        # las filas justo en el watermark vuelven siempre: descartamos las que ya teníamos
+        changed_versions = changed_versions[changed_versions.ne(old_versions.reindex(changed_versions.index))]
+        changed_frames = [p[0][p[0]["id"].isin(changed_versions.index)] for p in pages]
+        known = old_versions.index.union(changed_versions.index)
+
+        deleted = pd.Index([], dtype="int64")
+        if count < len(known):
+            # alguien borró: listamos solo ids para saber cuáles
+            id_pages, _ = _fetch_pages(sb, "id", lambda rows: [r["id"] for r in rows])
+            server_ids = pd.Index([i for page in id_pages for i in page], dtype="int64")
+            deleted = known.difference(server_ids)
+    except httpx.TransportError:
+        _lost_connection()
+        st.warning("Sin conexión con Supabase: se muestran los datos del mirror local.")
+        return _offline_snapshot(df, state)
+    _connection["lost_at"] = None
+
+    if changed_versions.empty and deleted.empty:
+        if catch_up:  # el mirror (o el snapshot stale) estaba al día: pasa a ser el snapshot compartido
+            task_cache().put(FULL_TABLE, df, state)
+        return df, state
+
+    drop = deleted.union(changed_versions.index)
+    kept = df[~df["id"].isin(drop)]
+    merged = _concat_tasks([kept] + changed_frames)
+    merged = merged[~merged["id"].isin(deleted)].reset_index(drop=True)
+
+    versions = pd.concat([old_versions.drop(drop, errors="ignore"), changed_versions.drop(deleted, errors="ignore")])
+    new_state = {"watermark": _max_updated_at(changed_versions, floor=wm), "versions": versions}
+    # lo que esta sesión ya trajo le ahorra la lectura completa a la próxima
+    task_cache().offer(FULL_TABLE, merged, new_state)
+    return _remember(merged, new_state)
+
+# ----------------- Cache compartido -----------------
+class TaskCache:
+    """
+    Snapshots (df, estado de sync) compartidos por todas las sesiones del proceso,
+    por clave de consulta, con TTL y expulsión LRU. Los frames se comparten
+    read-only: quien edita trabaja sobre una copia.
+    """
+
+    def __init__(self, ttl: float = TASKS_CACHE_TTL, max_entries: int = TASKS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[float, pd.DataFrame, Dict[str, Any]]]" = OrderedDict()
+        self._loading: Dict[tuple, threading.Lock] = {}
+
+    def _fresh(self, key: tuple) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        hit = self._entries.get(key)
+        if hit is None or time.monotonic() - hit[0] > self.ttl:
+            return None
+        self._entries.move_to_end(key)
+        return hit[1], hit[2]
+
+    def get(self, key: tuple, loader: Callable[[], Tuple[pd.DataFrame, Dict[str, Any]]]
+            ) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        with self._lock:
+            hit = self._fresh(key)
+            if hit is not None:
+                return hit
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        # una sola lectura por clave aunque entren muchas sesiones a la vez
+        with key_lock:
+            with self._lock:
+                hit = self._fresh(key)
+            if hit is not None:
+                return hit
+            try:
+                df, state = loader()
+                self.put(key, df, state)
+                return df, state
+            finally:
+                with self._lock:  # quien llegue después encuentra la entrada: el lock ya no hace falta
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+
+    def put(self, key: tuple, df: pd.DataFrame, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), df, state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def offer(self, key: tuple, df: pd.DataFrame, state: Dict[str, Any]) -> None:
+        """Guarda el snapshot solo si no hay uno vigente (y no marcado stale) con watermark igual o más nuevo."""
+        with self._lock:
+            hit = self._fresh(key)
+        if hit is not None and not hit[1].get("stale"):
+            wm_new, wm_old = state.get("watermark"), hit[1].get("watermark")
+            if wm_new is None or (wm_old is not None and pd.Timestamp(wm_old) >= pd.Timestamp(wm_new)):
+                return
+        self.put(key, df, state)
+
+    def invalidate(self, key: Optional[tuple] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def after_write(self) -> None:
+        """
+        Tras una escritura: los recortes filtrados se descartan (no tienen sync incremental) y
+        FULL_TABLE queda marcado 'stale': el próximo que lo pida lo pone al día desde su
+        watermark en lugar de volver a bajar la tabla.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k != FULL_TABLE]:
+                del self._entries[key]
+            hit = self._entries.get(FULL_TABLE)
+            if hit is not None:
+                if hit[2].get("watermark") is None:  # sin watermark no hay cómo ponerlo al día
+                    del self._entries[FULL_TABLE]
+                else:
+                    self._entries[FULL_TABLE] = (hit[0], hit[1], dict(hit[2], stale=True))
+
+@st.cache_resource
+def task_cache() -> TaskCache:
+    return TaskCache()
+
 
 try:
     from postgrest.exceptions import APIError  # type: ignore
@@ -279,36 +1025,850 @@ except Exception:  # pragma: no cover
         pass
 
 
-def delete_tasks(ids: List[int]) -> bool:
+def delete_tasks(ids: List[int], versions: Optional[pd.Series] = None) -> bool:
     if not ids:
         return True
     sb = get_sb()
-    if sb is None:
-        st.warning("Sin conexión a Supabase: borrado NO persistido (demo).")
+    if _offline_mode(sb):
+        return _save_offline({"delete": ids}, versions)
+    ids = _split_local({"delete": list(ids)})["delete"]
+    if not ids:
+        return True
+    guarded, _, ids = _guarded([], ids, versions)
+    saved = save_if_unchanged(sb, guarded) if guarded else None
+    if guarded and saved is None:
+        ids += [c["id"] for c in guarded]
+    results = [("save", saved["result"])] if saved else []
+    if ids:
+        results.append(("delete", batch.write_chunks(
+            lambda chunk: sb.table(TABLE).delete().in_("id", chunk).execute(), ids,
+            chunk_size=batch.DELETE_CHUNK_SIZE)))
+    invalidate_caches()
+    if saved:
+        _hold_conflicts(saved["conflicts"], guarded, versions)
+    return _report_write_results(_spill_offline(results, versions), "borrar")
+
+# ----------------- Mirror local (offline) -----------------
+# Snapshot parquet + cola SQLite en MIRROR_DIR (ver local_mirror). Sin red la app lee el
+# mirror y encola lo que se guarda; al volver la conexión, replay_offline lo reenvía
+# verificando contra updated_at que nadie haya tocado esas tareas en el server mientras tanto.
+
+OFFLINE_RECHECK_SEC = 30  # tras un corte, las escrituras van directo a la cola durante este lapso
+_connection = {"lost_at": None}
+
+def _lost_connection() -> None:
+    _connection["lost_at"] = time.monotonic()
+
+def _recently_offline() -> bool:
+    lost = _connection["lost_at"]
+    return lost is not None and time.monotonic() - lost < OFFLINE_RECHECK_SEC
+
+@st.cache_resource
+def local_mirror() -> Optional[LocalMirror]:
+    try:
+        return LocalMirror()
+    except Exception:  # disco de solo lectura: la app funciona igual, sin mirror
+        return None
+
+def _mirror_snapshot() -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """Último snapshot del mirror como (df, estado de sync con 'mirror': True), o None."""
+    mirror = local_mirror()
+    try:
+        hit = mirror.load() if mirror is not None else None
+    except Exception:  # archivo de otra versión o truncado: se ignora y se baja de nuevo
+        return None
+    if hit is None:
+        return None
+    df, state = hit
+    df = ensure_schema(df)
+    df.attrs["snapshot"] = f"mirror:{state.get('saved_at')}:{state.get('watermark')}"
+    return df, dict(state, mirror=True)
+
+def _remember(df: pd.DataFrame, state: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Guarda el snapshot completo en el mirror (en segundo plano) y lo devuelve tal cual."""
+    mirror = local_mirror()
+    if mirror is not None and state.get("versions") is not None:
+        mirror.save_async(df, state)
+    return df, state
+
+def _offline_snapshot(df: Optional[pd.DataFrame], state: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    if df is None or not state:
+        df, state = _mirror_snapshot() or (_demo_tasks(), {})
+    return df, dict(state, offline=True)
+
+def offline_tasks() -> pd.DataFrame:
+    """Tabla completa del mirror con los cambios pendientes encima (datos demo si no hay mirror)."""
+    df, _ = task_cache().get(("mirror",), lambda: _mirror_snapshot() or (_demo_tasks(), {}))
+    return with_pending(df)
+
+def with_pending(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` (snapshot del server) con los cambios offline pendientes aplicados: updates sobre
+    las filas, tareas nuevas con su id temporal negativo y sin las borradas.
+    """
+    mirror = local_mirror()
+    items = mirror.pending() if mirror is not None else []
+    if not items:
+        return df
+    updates = {i["row_id"]: i["payload"] for i in items if i["kind"] == "update"}
+    gone = [i["row_id"] for i in items if i["kind"] != "insert"]
+    ids = df["id"]
+    rows = [dict(p, **updates[p["id"]]) for p in payload_for_upsert(df[ids.isin(list(updates))])]
+    rows += [dict(i["payload"], id=i["row_id"]) for i in items if i["kind"] == "insert"]
+    out = _concat_tasks([df[~ids.isin(gone)], df_from_supabase(rows)])
+    out.attrs["snapshot"] = f"{data_fingerprint(df)}+pending:{mirror.revision()}"
+    return out
+
+def _edited_only(updates: List[Dict[str, Any]], base: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+    """
+    Saca de los updates las UPSERT_REQUIRED que no cambiaron respecto de `base`: al reenviar se
+    completan con el valor del server, así forzar un conflicto no pisa columnas que nadie editó.
+    """
+    ids = [u["id"] for u in updates if u["id"] > 0]
+    if base is None or not ids:
+        return updates
+    old = {p["id"]: p for p in payload_for_upsert(base[base["id"].isin(ids)])}
+    return [{k: v for k, v in u.items()
+             if k not in UPSERT_REQUIRED or u["id"] not in old or old[u["id"]].get(k) != v}
+            for u in updates]
+
+def queue_offline(changes: Dict[str, Any], versions: Optional[pd.Series] = None,
+                  base: Optional[pd.DataFrame] = None) -> bool:
+    """Encola cambios (formato diff_tasks) en el mirror. False si no hay mirror donde guardarlos."""
+    mirror = local_mirror()
+    if mirror is None:
+        st.warning("Sin conexión a Supabase: cambios NO persistidos (demo).")
         return False
+    changes = dict(changes, update=_edited_only(changes.get("update", []), base))
+    counts = mirror.queue(changes, versions)
+    invalidate_caches()
+    st.info(f"📴 Cambios guardados localmente: {sum(counts.values())} tarea(s) pendientes de enviar a Supabase.")
+    return True
+
+def _offline_mode(sb: Optional[Client]) -> bool:
+    """
+    Escrituras a la cola: sin cliente, con un corte reciente o con cambios todavía en cola (para
+    respetar el orden). Los que esperan resolución (conflict/failed) no frenan el resto.
+    """
+    mirror = local_mirror()
+    return sb is None or _recently_offline() or (mirror is not None and mirror.counts()["queued"] > 0)
+
+def _split_local(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Saca de `changes` los updates/deletes de tareas que solo existen en el mirror (id temporal
+    negativo, p.ej. un insert rechazado) y los encola ahí: no tienen fila en Supabase.
+    """
+    local = {"update": [u for u in changes.get("update", []) if u["id"] < 0],
+             "delete": [i for i in changes.get("delete", []) if i < 0]}
+    if not (local["update"] or local["delete"]):
+        return changes
+    queue_offline(local)
+    return dict(changes, update=[u for u in changes.get("update", []) if u["id"] >= 0],
+                delete=[i for i in changes.get("delete", []) if i >= 0])
+
+def _save_offline(changes: Dict[str, Any], versions: Optional[pd.Series],
+                  base: Optional[pd.DataFrame] = None) -> bool:
+    ok = queue_offline(changes, versions, base)
+    if ok and get_sb() is not None and not _recently_offline():
+        report_replay(replay_offline())
+    return ok
+
+def _spill_offline(results: List[Tuple[str, Dict[str, Any]]], versions: Optional[pd.Series],
+                   base: Optional[pd.DataFrame] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Lo que no se pudo escribir por un error transitorio (red caída, server saturado) después de
+    los reintentos va a la cola offline en vez de reportarse como rechazado.
+    """
+    mirror = local_mirror()
+    if mirror is None:
+        return results
+    spill: Dict[str, List[Any]] = {"insert": [], "update": [], "delete": []}
+    kept = []
+    for op, res in results:
+        lost = [item for c in res["chunks"] if not c["ok"] and c.get("transient") for item in c["items"]]
+        if not lost:
+            kept.append((op, res))
+            continue
+        if op == "save":  # cambios condicionales: vuelven a updates/deletes con su versión base
+            spill["update"] += [dict(c["patch"], id=c["id"]) for c in lost if c["op"] == "update"]
+            spill["delete"] += [c["id"] for c in lost if c["op"] == "delete"]
+        else:
+            spill["update" if op == "upsert" else op].extend(lost)
+        lost_ids = {id(item) for item in lost}
+        res = dict(res, failed=[(item, err) for item, err in res["failed"] if id(item) not in lost_ids])
+        kept.append((op, res))
+    if any(spill.values()):
+        queue_offline(spill, versions, base)
+    return kept
+
+def _server_rows(sb: Client, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Filas actuales del server para `ids` (por chunks de in_, en paralelo)."""
+    chunks = batch.chunked(ids, batch.DELETE_CHUNK_SIZE)
+    if not chunks:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(chunks)))) as pool:
+        pages = pool.map(lambda c: sb.table(TABLE).select("*").in_("id", c).execute().data or [], chunks)
+        return {r["id"]: r for page in pages for r in page}
+
+def _same_version(a: Any, b: Any) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return pd.Timestamp(a) == pd.Timestamp(b)
+
+def replay_offline() -> Dict[str, int]:
+    """
+    Reenvía los cambios offline en cola, en lote. Updates/deletes con versión van por la RPC
+    condicional (save_if_unchanged): si la tarea cambió en el server (o ya no existe) queda como
+    'conflict' con la fila del server, sin pisarla. Sin la función, se verifica antes con una
+    lectura de las versiones y se escribe con upsert (queda una ventana entre ambas).
+    Sin base_version (tabla sin updated_at) gana el último que escribe.
+    Retorna {'sent', 'conflicts', 'failed', 'queued'}.
+    """
+    out = {"sent": 0, "conflicts": 0, "failed": 0, "queued": 0}
+    sb, mirror = get_sb(), local_mirror()
+    items = mirror.pending(["queued"]) if sb is not None and mirror is not None else []
+    if not items:
+        return out
+    _drop_missing_columns(sb, [it["payload"] for it in items])
+    changes = [{"op": it["kind"], "id": it["row_id"], "expected": it["base_version"], "patch": it["payload"]}
+               for it in items if it["kind"] != "insert" and it["base_version"] is not None]
+    saved = save_if_unchanged(sb, changes) if changes else None
+    rest = [it for it in items if it["kind"] != "insert" and (saved is None or it["base_version"] is None)]
     try:
-        sb.table(TABLE).delete().in_("id", ids).execute()
-        return True
-    except APIError as e:
-        st.error("❌ Error de Supabase al borrar")
-        st.code({
-            "code": getattr(e, "code", None),
-            "message": getattr(e, "message", None),
-            "details": getattr(e, "details", None),
-            "hint": getattr(e, "hint", None),
+        server = _server_rows(sb, [it["row_id"] for it in rest])
+    except httpx.TransportError:
+        _lost_connection()
+        out["queued"] += len(rest)
+        server, rest = {}, []
+
+    conflicts: Dict[int, Optional[Dict[str, Any]]] = dict(saved["conflicts"]) if saved else {}
+    owner: Dict[int, int] = {}  # id(payload) -> row_id
+    inserts, updates, deletes = [], [], []
+    sent = list(saved["applied"]) + list(saved["gone"]) if saved else []
+    for it in [i for i in items if i["kind"] == "insert"] + rest:
+        row_id, row = it["row_id"], server.get(it["row_id"])
+        if it["kind"] == "insert":
+            payload = dict(it["payload"])
+            inserts.append(payload)
+        elif row is None:
+            if it["kind"] == "delete":
+                sent.append(row_id)  # ya la borró otro: no queda nada que hacer
+            else:
+                conflicts[row_id] = None
+            continue
+        elif it["base_version"] is not None and not _same_version(row.get("updated_at"), it["base_version"]):
+            conflicts[row_id] = row
+            continue
+        elif it["kind"] == "update":
+            payload = {**{k: row.get(k) for k in UPSERT_REQUIRED}, **it["payload"], "id": row_id}
+            updates.append(payload)
+        else:
+            deletes.append(row_id)
+            continue
+        owner[id(payload)] = row_id
+
+    results = [("save", saved["result"])] if saved else []
+    if inserts:
+        results.append(("insert", batch.write_chunks(
+            lambda rows: sb.table(TABLE).insert(rows).execute(), inserts, idempotent=False)))
+    for group in _group_by_columns(updates):
+        results.append(("upsert", batch.write_chunks(
+            lambda rows: sb.table(TABLE).upsert(rows, on_conflict="id").execute(), group)))
+    if deletes:
+        results.append(("delete", batch.write_chunks(
+            lambda ids: sb.table(TABLE).delete().in_("id", ids).execute(), deletes,
+            chunk_size=batch.DELETE_CHUNK_SIZE)))
+
+    failed = {}
+    for op, res in results:
+        for c in res["chunks"]:
+            if op == "save" and c["ok"]:
+                continue  # aplicados y conflictos ya vienen en la respuesta de la RPC
+            row_ids = [item if op == "delete" else item["id"] if op == "save" else owner[id(item)]
+                       for item in c["items"]]
+            if c["ok"]:
+                sent.extend(row_ids)
+            elif c.get("transient"):
+                out["queued"] += len(row_ids)  # se reintenta en el próximo sync
+            else:
+                msg = (c["error"] or {}).get("message")
+                failed.update({i: msg for i in row_ids})
+    mirror.done(sent)
+    mirror.mark(list(conflicts), "conflict", "la tarea cambió en Supabase mientras se editaba offline",
+                server_rows=conflicts)
+    for msg in set(failed.values()):
+        mirror.mark([i for i, m in failed.items() if m == msg], "failed", msg)
+    if sent:
+        invalidate_caches()
+    return dict(out, sent=len(sent), conflicts=len(conflicts), failed=len(failed))
+
+def report_replay(res: Dict[str, int]) -> None:
+    if res["sent"]:
+        st.success(f"📤 Se enviaron a Supabase {res['sent']} cambio(s) hechos sin conexión.")
+    if res["conflicts"] or res["failed"]:
+        st.warning(f"{res['conflicts']} cambio(s) offline en conflicto y {res['failed']} rechazado(s): "
+                   "revisalos en 'Cambios pendientes'.")
+
+def offline_changes() -> pd.DataFrame:
+    """Cambios offline pendientes para la UI: uno por tarea, con lo local y (en conflictos) lo del server."""
+    mirror = local_mirror()
+    items = mirror.pending() if mirror is not None else []
+    cols = ["row_id", "kind", "status", "task", "local", "server", "error", "queued_at"]
+    if not items:
+        return pd.DataFrame(columns=cols)
+    out = []
+    for it in items:
+        local, server = it["payload"], it["server_row"] or {}
+        out.append({
+            "row_id": it["row_id"], "kind": it["kind"], "status": it["status"],
+            "task": local.get("task") or server.get("task"),
+            "local": ", ".join(f"{k}={v}" for k, v in local.items()),
+            # del server solo las columnas que también se editaron localmente
+            "server": ", ".join(f"{k}={server.get(k)}" for k in local if k in server) if it["server_row"] else None,
+            "error": it["error"], "queued_at": it["queued_at"],
         })
-        return False
+    return pd.DataFrame(out, columns=cols)
+
+def resolve_offline(row_ids: List[int], keep: str) -> int:
+    """
+    keep='local': se reencolan sobre la versión actual del server (pisan lo del server; una tarea
+    borrada en el server no se puede forzar). keep='server': se descartan los cambios locales.
+    """
+    mirror = local_mirror()
+    if mirror is None or not row_ids:
+        return 0
+    chosen = {it["row_id"]: it for it in mirror.pending() if it["row_id"] in set(row_ids)}
+    if keep == "server":
+        mirror.done(list(chosen))
+        invalidate_caches()
+        return len(chosen)
+    force = {i: it["server_row"].get("updated_at") for i, it in chosen.items()
+             if it["status"] == "conflict" and it["server_row"] is not None}
+    retry = [i for i, it in chosen.items() if it["status"] == "failed"]
+    mirror.rebase(force)
+    mirror.mark(retry, "queued")
+    return len(force) + len(retry)
+
+# ----------------- Vista (filtros + memo) -----------------
+GANTT_CACHE_ENTRIES = 32
+
+def data_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Versión barata de un snapshot cargado: el token que pone _concat_tasks, o un hash
+    del contenido si no lo hay. Los frames derivados heredan attrs: usarlo sobre el snapshot, no sobre vistas.
+    """
+    token = df.attrs.get("snapshot")
+    if token:
+        return token
+    return f"{len(df)}:{int(pd.util.hash_pandas_object(df, index=False).sum())}"
+
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _task_index_cached(_df: pd.DataFrame, fingerprint: str) -> TaskFilterIndex:
+    return TaskFilterIndex(_df)
+
+def task_index(df: pd.DataFrame) -> TaskFilterIndex:
+    """Índice de filtros del snapshot (se arma una vez por versión de datos y se reutiliza entre reruns)."""
+    return _task_index_cached(df, data_fingerprint(df))
+
+def filter_tasks(df: pd.DataFrame, filters: Dict[str, Any],
+                 index: Optional[TaskFilterIndex] = None) -> pd.DataFrame:
+    """
+    Filtros de la barra lateral: projects/statuses/priorities/rags (listas), owner (substring), start_after/end_before.
+    Con `index` (task_index del mismo snapshot) se resuelven con bitmaps en lugar de máscaras por columna.
+    """
+    if not any(v is not None and v != "" and v != [] for v in filters.values()):
+        return df
+    if index is not None:
+        return df.iloc[index.query(filters)]
+    if filters.get("projects"):   df = df[df["project_name"].isin(filters["projects"])]
+    if filters.get("statuses"):   df = df[df["status"].isin(filters["statuses"])]
+    if filters.get("priorities"): df = df[df["priority"].isin(filters["priorities"])]
+    if filters.get("rags"):       df = df[df["rag"].isin(filters["rags"])]
+    if filters.get("owner"):      df = df[df["owner"].str.contains(filters["owner"], case=False, na=False, regex=False)]
+    if filters.get("start_after") is not None:
+        df = df[(df["end"].isna()) | (df["end"] >= filters["start_after"])]
+    if filters.get("end_before") is not None:
+        df = df[(df["start"].isna()) | (df["start"] <= filters["end_before"])]
+    return df
+
+def _freeze(filters: Dict[str, Any]) -> tuple:
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple, set)) else v) for k, v in filters.items()))
+
+def _filtered(df: pd.DataFrame, filters_key: tuple) -> pd.DataFrame:
+    """Vista de un snapshot para la clave de _freeze (con el índice de filtros si hay alguno activo)."""
+    filters = dict(filters_key)
+    return filter_tasks(df, filters, index=task_index(df) if query_key(filters) != FULL_TABLE else None)
+
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _gantt_view_cached(_df: pd.DataFrame, fingerprint: str, filters_key: tuple,
+                       color_by: str, group_by_project: bool, detail: str, dependencies: bool):
+    df_view = _filtered(_df, filters_key)
+    # la ruta crítica se calcula sobre el snapshot completo: un filtro no corta dependencias
+    schedule = schedule_tasks(_df) if dependencies else None
+    return df_view, make_gantt(df_view, color_by=color_by, group_by_project=group_by_project,
+                               detail=detail, schedule=schedule)
+
+def gantt_view(df: pd.DataFrame, filters: Dict[str, Any], color_by: str = "progress",
+               group_by_project: bool = True, detail: str = "auto",
+               dependencies: bool = False) -> Tuple[pd.DataFrame, Any]:
+    """(df filtrado, figura) memoizados por versión de datos + filtros + opciones (LRU acotado, compartido)."""
+    return _gantt_view_cached(df, data_fingerprint(df), _freeze(filters), color_by, group_by_project,
+                              detail, dependencies)
+
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _project_options_cached(_df: pd.DataFrame, fingerprint: str) -> List[str]:
+    return sorted(_df["project_name"].dropna().unique().tolist())
+
+def project_options(df: pd.DataFrame) -> List[str]:
+    return _project_options_cached(df, data_fingerprint(df))
+
+# ----------------- Calendario laboral -----------------
+# Días hábiles y feriados para scheduling, carga y valor ganado. En secrets.toml:
+#   [workcal]
+#   weekmask = "1111100"                      # lun..dom, 1 = hábil
+#   holidays = ["2025-12-25", "2026-01-01"]
+#   [workcal.workstreams.Soporte]             # override por workstream (suma feriados al base)
+#   weekmask = "1111110"
+# Sin la sección: lun-vie sin feriados.
+
+@st.cache_resource(show_spinner=False)
+def work_calendar() -> WorkCalendar:
+    try:
+        return WorkCalendar.from_config(st.secrets.get("workcal"))
+    except Exception as e:  # weekmask/feriados inválidos: no frena la app
+        st.warning(f"Calendario laboral inválido en secrets ({e}); se usa lun-vie sin feriados.")
+        return WorkCalendar()
+
+
+# ----------------- Dependencias y ruta crítica -----------------
+# Migración (Supabase SQL), ids de las tareas predecesoras (fin -> inicio):
+#   alter table tasks add column if not exists predecessors bigint[] not null default '{}';
+# Sin la migración PostgREST rechaza cualquier payload que traiga la columna (PGRST204), así que
+# se prueba una vez por proceso y, si falta, se saca de lo que se escribe.
+_predecessors_col = {"available": None}
+
+def _predecessors_available(sb: Client) -> bool:
+    if _predecessors_col["available"] is None:
+        try:
+            sb.table(TABLE).select("predecessors").limit(1).execute()
+            _predecessors_col["available"] = True
+        except APIError as e:  # 42703: la columna no existe
+            if str(getattr(e, "code", "")) not in ("42703", "PGRST204"):
+                return True  # otro error (auth, red...): no se decide; la escritura lo reporta
+            _predecessors_col["available"] = False
+            st.caption("La tabla tasks no tiene la columna predecessors: las dependencias no se guardan.")
+        except httpx.TransportError:
+            return True
+    return bool(_predecessors_col["available"])
+
+def _drop_missing_columns(sb: Client, items: List[Dict[str, Any]]) -> None:
+    """Saca 'predecessors' de los payloads (in-place) si la DB todavía no tiene la columna."""
+    if items and not _predecessors_available(sb):
+        for item in items:
+            item.pop("predecessors", None)
+
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _task_graph_cached(_df: pd.DataFrame, fingerprint: str) -> scheduling.TaskGraph:
+    return scheduling.TaskGraph.from_frame(_df)
+
+def task_graph(df: pd.DataFrame) -> scheduling.TaskGraph:
+    """Grafo de dependencias del snapshot (posiciones de fila), una vez por versión de datos."""
+    return _task_graph_cached(df, data_fingerprint(df))
+
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _schedule_cached(_df: pd.DataFrame, fingerprint: str) -> Dict[str, Any]:
+    return scheduling.critical_path(_df, task_graph(_df), work_calendar())
+
+def schedule_tasks(df: pd.DataFrame) -> Dict[str, Any]:
+    """scheduling.critical_path del snapshot en días hábiles, una vez por versión de datos."""
+    return _schedule_cached(df, data_fingerprint(df))
+
+def _changed_dates(new: pd.Series, old: pd.Series) -> np.ndarray:
+    a, b = new.to_numpy("datetime64[ns]"), old.to_numpy("datetime64[ns]")
+    return (a != b) & ~(np.isnat(a) & np.isnat(b))
+
+def reschedule_edits(base: pd.DataFrame, edited: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Corre hacia adelante las sucesoras de las filas cuyas fechas o predecesoras cambiaron
+    respecto del snapshot `base` (scheduling.propagate_dates sobre el subgrafo aguas abajo).
+    Las filas editadas a mano conservan sus fechas; las corridas conservan su duración en días
+    hábiles y arrancan en día hábil (work_calendar). Retorna {'df': edited con las fechas
+    corridas, 'moved': ids corridos, 'affected': tareas recorridas}; el diff de upsert_tasks
+    manda solo esas filas.
+    """
+    edited = ensure_schema(edited)
+    ids = edited["id"]
+    prev = base[base["id"].notna()].drop_duplicates("id", keep="last").set_index("id").reindex(ids)
+    known = ids.isin(base["id"].dropna()).to_numpy()
+    typed = ~known | _changed_dates(edited["start"], prev["start"]) | _changed_dates(edited["end"], prev["end"])
+    new_preds = edited["predecessors"].fillna("").astype(str).to_numpy()
+    relinked = new_preds != prev["predecessors"].fillna("").astype(str).to_numpy()
+    seeds = np.flatnonzero(typed | relinked)
+    if not len(seeds):
+        return {"df": edited, "moved": [], "affected": 0}
+
+    # sin cambios de estructura se reutiliza el grafo cacheado del snapshot
+    same_rows = len(edited) == len(base) and np.array_equal(ids.to_numpy(dtype=float, na_value=np.nan),
+                                                           base["id"].to_numpy(dtype=float, na_value=np.nan),
+                                                           equal_nan=True)
+    graph = task_graph(base) if same_rows and not relinked.any() else scheduling.TaskGraph.from_frame(edited)
+    res = scheduling.propagate_dates(edited, seeds, graph, pinned=np.flatnonzero(typed),
+                                       calendar=work_calendar())
+    moved = res["moved"]
+    if len(moved):
+        start, end = edited["start"].copy(), edited["end"].copy()
+        start.iloc[moved] = res["start"]
+        end.iloc[moved] = res["end"]
+        edited = edited.assign(start=start, end=end)
+    return {"df": edited, "moved": ids.iloc[moved].dropna().astype(int).tolist(), "affected": res["affected"]}
+
+# ----------------- Carga por persona -----------------
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _workload_cached(_df: pd.DataFrame, fingerprint: str, filters_key: tuple) -> Dict[str, Any]:
+    return workload.load_matrix(_filtered(_df, filters_key), calendar=work_calendar())
+
+def workload_view(df: pd.DataFrame, filters: Dict[str, Any],
+                  capacity: float = workload.WORKLOAD_CAPACITY) -> Dict[str, Any]:
+    """
+    workload.load_matrix del snapshot `df` filtrado (una vez por versión de datos + filtros, como
+    gantt_view) + reporte de sobrecarga para `capacity`.
+    """
+    res = _workload_cached(df, data_fingerprint(df), _freeze(filters))
+    return dict(res, overload=workload.overallocation(res["weekly"], capacity))
+
+# ----------------- Variación vs baseline -----------------
+ANALYTICS_TREND_TTL = 300
+
+@st.cache_resource(max_entries=GANTT_CACHE_ENTRIES, show_spinner=False)
+def _variance_cached(_df: pd.DataFrame, fingerprint: str, filters_key: tuple, by: tuple,
+                     asof: date) -> Dict[str, Any]:
+    df_view = _filtered(_df, filters_key)
+    metrics = analytics.task_metrics(df_view, asof, work_calendar())
+    roll = analytics.rollup(df_view, by, metrics)
+    return {"metrics": metrics, "rollup": roll, "total": analytics.total(roll)}
+
+def variance_view(df: pd.DataFrame, filters: Dict[str, Any],
+                  by: Tuple[str, ...] = ("project_name",)) -> Dict[str, Any]:
+    """
+    {'metrics' por tarea, 'rollup' por `by`, 'total'} del snapshot `df` filtrado, a la fecha de hoy;
+    una vez por versión de datos + filtros.
+    """
+    return _variance_cached(df, data_fingerprint(df), _freeze(filters), tuple(by), date.today())
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _daily_snapshot(day: date, _df: pd.DataFrame) -> Optional[str]:
+    try:
+        return analytics.write_snapshot(_df, day, calendar=work_calendar())
+    except Exception as e:  # disco lleno / sin permisos: la tendencia es opcional
+        st.caption(f"No se pudo guardar el snapshot de analytics: {e}")
+        return None
+
+def snapshot_analytics(df: pd.DataFrame) -> Optional[str]:
+    """Snapshot diario del agregado (solo con la tabla completa); una escritura por día y proceso."""
+    return _daily_snapshot(date.today(), df)
+
+@st.cache_data(ttl=ANALYTICS_TREND_TTL, show_spinner=False)
+def analytics_trend(by: Tuple[str, ...] = (), projects: Tuple[str, ...] = ()) -> pd.DataFrame:
+    """Tendencia diaria; los snapshots son por proyecto × fase × workstream, así que solo se filtra por proyecto."""
+    return analytics.trend(by, projects=projects or None)
+
+# ----------------- Import -----------------
+IMPORT_CHUNK_ROWS = 5000
+IMPORT_MAX_REPORTED_FAILURES = 200
+# nombres de columna de la DB que aceptamos además de los del front
+IMPORT_ALIASES = {"start_date": "start", "end_date": "end"}
+_TRUE_STRINGS = {"true", "1", "1.0", "yes", "si", "sí", "x", "verdadero"}
+
+def _iter_import_chunks(file: Any, kind: str, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """Chunks de `file` junto con la fracción del archivo ya leída."""
+    if kind == "parquet":
+        import pyarrow.parquet as pq  # viene con streamlit
+        pf = pq.ParquetFile(file)
+        total = max(1, pf.metadata.num_rows)
+        done = 0
+        for b in pf.iter_batches(batch_size=chunk_rows):
+            done += b.num_rows
+            yield b.to_pandas(), done / total
+        return
+    size = getattr(file, "size", None)
+    for chunk in pd.read_csv(file, chunksize=chunk_rows):
+        try:
+            frac = file.tell() / size if size else 0.0
+        except Exception:
+            frac = 0.0
+        yield chunk, min(1.0, frac)
+
+def _normalize_import_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Aplica las reglas de ensure_schema; descarta filas sin proyecto o tarea. Retorna (df, descartadas)."""
+    chunk = chunk.rename(columns=IMPORT_ALIASES)
+    if "milestone" in chunk.columns and chunk["milestone"].dtype != bool:
+        # "False"/"no" en texto serían truthy para ensure_schema
+        m = chunk["milestone"]
+        chunk = chunk.assign(milestone=m.notna() & m.astype(str).str.strip().str.lower().isin(_TRUE_STRINGS))
+    df = ensure_schema(chunk)
+    valid = (df["project_name"].fillna("").str.strip() != "") & (df["task"].fillna("").str.strip() != "")
+    return df[valid], int((~valid).sum())
+
+def _report_import_failures(stats: Dict[str, Any], failed: List[Tuple[Dict[str, Any], Any]]) -> None:
+    room = IMPORT_MAX_REPORTED_FAILURES - len(stats["failed"])
+    stats["failed"].extend(failed[:max(0, room)])
+    stats["failed_count"] += len(failed)
+
+def _link_imported(sb: Client, deferred: List[Tuple[Dict[str, Any], List[int]]],
+                   id_map: Dict[int, int], stats: Dict[str, Any]) -> None:
+    """
+    Segunda pasada del import: los predecesores del archivo son ids del archivo; se traducen a
+    los ids nuevos y se escriben. Los que apuntan a filas que no entraron (o no están en el archivo)
+    se descartan: en la DB serían otras tareas.
+    """
+    items = []
+    for item, preds in deferred:
+        mapped = [id_map[p] for p in preds if p in id_map]
+        stats["links_dropped"] += len(preds) - len(mapped)
+        if mapped:
+            items.append(dict(item, predecessors=mapped))
+    res = batch.write_chunks(lambda rows: sb.table(TABLE).upsert(rows).execute(), items, idempotent=True)
+    stats["unlinked"] += len(res["failed"])
+    _report_import_failures(stats, res["failed"])
+
+def import_tasks(file: Any, kind: str = "csv", chunk_rows: int = IMPORT_CHUNK_ROWS,
+                 on_progress: Optional[Callable[[float, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Importa tareas desde CSV o Parquet leyendo de a `chunk_rows` filas: cada chunk se
+    normaliza, se valida y se inserta por lotes antes de leer el siguiente (memoria acotada).
+    Todas las filas entran como tareas nuevas. Los predecesores refieren a ids del archivo:
+    las filas que los tienen se insertan sin ellos y al final se enlazan con los ids nuevos.
+    Retorna {'read', 'inserted', 'skipped', 'failed': [(fila, error)] (muestra), 'failed_count',
+             'links_dropped' (predecesores fuera del archivo), 'unlinked' (filas sin poder enlazar)}.
+    """
+    stats: Dict[str, Any] = {"read": 0, "inserted": 0, "skipped": 0, "failed": [], "failed_count": 0,
+                             "links_dropped": 0, "unlinked": 0}
+    sb = get_sb()
+    if sb is None:
+        st.warning("Sin conexión a Supabase: importación NO persistida (demo).")
+        return stats
+
+    id_map: Dict[int, int] = {}  # id en el archivo -> id nuevo
+    deferred: List[Tuple[Dict[str, Any], List[int]]] = []  # (fila con id nuevo, predecesores del archivo)
+    try:
+        for chunk, frac in _iter_import_chunks(file, kind, chunk_rows):
+            stats["read"] += len(chunk)
+            df, skipped = _normalize_import_chunk(chunk)
+            stats["skipped"] += skipped
+            payload = payload_for_upsert(df)
+            file_ids = {id(item): item.pop("id", None) for item in payload}
+            _drop_missing_columns(sb, payload)
+            preds = {id(item): item.pop("predecessors") for item in payload if item.get("predecessors")}
+            done: List[Tuple[Dict[str, Any], int]] = []
+
+            def send(rows: List[Dict[str, Any]]) -> None:
+                res = sb.table(TABLE).insert(rows).execute()
+                done.extend((item, row["id"]) for item, row in zip(rows, res.data or []))
+
+            res = batch.write_chunks(send, payload, idempotent=False)
+            for item, new_id in done:
+                if file_ids[id(item)] is not None:
+                    id_map[int(file_ids[id(item)])] = new_id
+                if id(item) in preds:
+                    deferred.append((dict(item, id=new_id), preds[id(item)]))
+            stats["inserted"] += res["written"]
+            _report_import_failures(stats, res["failed"])
+            if on_progress is not None:
+                on_progress(frac, stats)
+        if deferred:
+            _link_imported(sb, deferred, id_map, stats)
+    finally:
+        invalidate_caches()
+    return stats
 
 # ----------------- Visual (opcional) -----------------
-def make_gantt(df: pd.DataFrame, color_by: str = "progress", group_by_project: bool = True):
+GANTT_WEBGL_THRESHOLD = 2000    # más barras que esto: segmentos scattergl, sin texto por barra
+GANTT_SUMMARY_THRESHOLD = 5000  # en modo "auto", más tareas que esto: barras resumen proyecto/fase
+GANTT_ROW_PX = 22
+GANTT_MIN_HEIGHT = 520
+GANTT_MAX_HEIGHT = 4000
+GANTT_MAX_Y_LABELS = 300        # con más filas en el eje Y se ocultan las etiquetas (queda el hover)
+GANTT_DETAIL = ["auto", "tareas", "resumen"]
+GANTT_MAX_LINKS = 1500          # más flechas que esto: solo las que unen tareas críticas
+CRITICAL_COLOR = "#D62728"
+_PROGRESS_BINS = [-1, 0, 25, 50, 75, 99, 100]
+_PROGRESS_LABELS = ["0%", "1-25%", "26-50%", "51-75%", "76-99%", "100%"]
+
+def _empty_gantt():
+    return px.line().update_layout(template="plotly_white", paper_bgcolor="#FFFFFF", plot_bgcolor="#FFFFFF")
+
+def _gantt_height(n_rows: int) -> int:
+    return int(np.clip(n_rows * GANTT_ROW_PX + 140, GANTT_MIN_HEIGHT, GANTT_MAX_HEIGHT))
+
+def _finish_gantt(fig, n_rows: int, title: str):
+    fig.update_yaxes(autorange="reversed")
+    fig.update_layout(
+        title=title,
+        bargap=0.2,
+        margin=dict(l=10, r=10, t=60, b=10),
+        paper_bgcolor="#FFFFFF",
+        plot_bgcolor="#FFFFFF",
+        height=_gantt_height(n_rows),
+    )
+    today = pd.Timestamp.today().normalize()
+    fig.add_vline(x=today, line_width=2, line_dash="dash", opacity=0.6)
+    return fig
+
+def summarize_gantt(df: pd.DataFrame) -> pd.DataFrame:
+    """Una barra por proyecto/fase: inicio mínimo, fin máximo y progreso medio ponderado por duración."""
+    d = df.dropna(subset=["start", "end"])
+    dur = (d["end"] - d["start"]).dt.days.clip(lower=1)
+    d = pd.DataFrame({
+        "project_name": d["project_name"].astype(object).fillna("(sin proyecto)"),
+        "phase": d["phase"].astype(object).fillna("(sin fase)"),
+        "start": d["start"], "end": d["end"],
+        "w": dur, "wp": d["progress"] * dur,
+    })
+    out = d.groupby(["project_name", "phase"], sort=False).agg(
+        start=("start", "min"), end=("end", "max"), tasks=("w", "size"), w=("w", "sum"), wp=("wp", "sum"),
+    ).reset_index()
+    out["progress"] = (out["wp"] / out["w"]).round().astype(int)
+    out["label"] = out["project_name"] + " · " + out["phase"]
+    out["tasks_label"] = out["tasks"].astype(str) + " tareas · " + out["progress"].astype(str) + "%"
+    return out.drop(columns=["w", "wp"])
+
+def _gantt_summary(df_plot: pd.DataFrame, color_by: str):
+    summ = summarize_gantt(df_plot)
+    color = color_by if color_by in ("progress", "project_name") else "progress"
+    fig = px.timeline(
+        summ, x_start="start", x_end="end", y="label", color=color,
+        hover_data={"tasks": True, "progress": True, "start": "|%Y-%m-%d", "end": "|%Y-%m-%d"},
+        text="tasks_label", template="plotly_white",
+    )
+    fig.update_traces(textposition="inside", insidetextanchor="middle", cliponaxis=False)
+    return _finish_gantt(fig, len(summ), f"Cronograma resumido por proyecto/fase ({len(df_plot)} tareas)")
+
+def _add_schedule(fig, df_plot: pd.DataFrame, ys: np.ndarray, schedule: Dict[str, Any],
+                  line_width: Optional[float] = None):
+    """
+    Contorno rojo en las tareas críticas y una flecha fin->inicio por dependencia visible.
+    ys: posición en el eje Y de cada fila de df_plot. Sin line_width (gráfico de barras) el
+    resaltado es una barra sin relleno; con line_width, un segmento scattergl más fino encima.
+    """
+    critical = schedule["schedule"]["critical"].reindex(df_plot.index, fill_value=False).to_numpy(dtype=bool)
+    x0 = df_plot["start"].to_numpy("datetime64[ms]").astype("int64").astype(float)
+    x1 = df_plot["end"].to_numpy("datetime64[ms]").astype("int64").astype(float)
+    ys = np.asarray(ys, dtype=object)
+
+    links = schedule["links"]
+    src = df_plot.index.get_indexer(links["from"])
+    dst = df_plot.index.get_indexer(links["to"])
+    keep = (src >= 0) & (dst >= 0)
+    src, dst = src[keep], dst[keep]
+    if len(src) > GANTT_MAX_LINKS:
+        both = critical[src] & critical[dst]
+        src, dst = src[both][:GANTT_MAX_LINKS], dst[both][:GANTT_MAX_LINKS]
+    if len(src):
+        n = len(src)
+        xs = np.full(3 * n, None, dtype=object)
+        yl = np.full(3 * n, None, dtype=object)
+        size = np.zeros(3 * n)
+        xs[0::3], xs[1::3] = x1[src], x0[dst]
+        yl[0::3], yl[1::3] = ys[src], ys[dst]
+        size[1::3] = 9
+        fig.add_trace(go.Scatter(
+            x=xs, y=yl, mode="lines+markers", name="Dependencias", hoverinfo="skip",
+            line=dict(width=1, color="#555555"),
+            marker=dict(symbol="arrow", angleref="previous", size=size, color="#555555"),
+        ))
+
+    idx = np.flatnonzero(critical)
+    if not len(idx):
+        return fig
+    if line_width is None:
+        fig.add_trace(go.Bar(
+            base=df_plot["start"].to_numpy()[idx], x=x1[idx] - x0[idx], y=ys[idx], orientation="h",
+            name="Ruta crítica", hoverinfo="skip",
+            marker=dict(color="rgba(0,0,0,0)", line=dict(color=CRITICAL_COLOR, width=2)),
+        ))
+    else:
+        n = len(idx)
+        xs = np.full(3 * n, np.nan)
+        yc = np.full(3 * n, np.nan)
+        xs[0::3], xs[1::3] = x0[idx], x1[idx]
+        yc[0::3] = yc[1::3] = ys[idx].astype(float)
+        fig.add_trace(go.Scattergl(
+            x=xs, y=yc, mode="lines", name="Ruta crítica", connectgaps=False, hoverinfo="skip",
+            line=dict(width=max(2.0, line_width * 0.35), color=CRITICAL_COLOR),
+        ))
+    return fig
+
+def _gantt_webgl(df_plot: pd.DataFrame, color_by: str, y: str, schedule: Optional[Dict[str, Any]] = None):
+    """Cada tarea es un segmento start→end de una traza scattergl por color (NaN separa segmentos)."""
+    codes, labels = pd.factorize(df_plot[y].astype(object).fillna("—"), sort=False)
+    x0 = df_plot["start"].to_numpy("datetime64[ms]").astype("int64").astype(float)
+    x1 = df_plot["end"].to_numpy("datetime64[ms]").astype("int64").astype(float)
+    hover = (df_plot["task"].astype(object).fillna("").astype(str) + " · "
+             + df_plot["status"].astype(object).fillna("").astype(str) + " · "
+             + df_plot["progress"].astype(str) + "%").to_numpy(dtype=object)
+
+    if color_by == "progress":
+        keys = pd.cut(df_plot["progress"], _PROGRESS_BINS, labels=_PROGRESS_LABELS)
+        palette = px.colors.sample_colorscale("Plasma", np.linspace(0, 0.9, len(_PROGRESS_LABELS)))
+    else:
+        keys = df_plot[color_by].astype(object).fillna("(vacío)")
+        palette = px.colors.qualitative.Plotly
+    key_codes, key_names = pd.factorize(keys, sort=True)
+
+    row_px = (_gantt_height(len(labels)) - 140) / max(len(labels), 1)
+    line_width = float(np.clip(row_px * 0.6, 1, 14))
+    fig = go.Figure()
+    for k, name in enumerate(key_names):
+        idx = np.flatnonzero(key_codes == k)
+        n = len(idx)
+        xs = np.full(3 * n, np.nan)
+        ys = np.full(3 * n, np.nan)
+        text = np.full(3 * n, None, dtype=object)
+        xs[0::3], xs[1::3] = x0[idx], x1[idx]
+        ys[0::3] = ys[1::3] = codes[idx]
+        text[0::3] = text[1::3] = hover[idx]
+        fig.add_trace(go.Scattergl(
+            x=xs, y=ys, mode="lines", name=str(name), connectgaps=False,
+            line=dict(width=line_width, color=palette[k % len(palette)]),
+            text=text, hovertemplate="%{text}<extra></extra>",
+        ))
+    show_labels = len(labels) <= GANTT_MAX_Y_LABELS
+    fig.update_xaxes(type="date")
+    fig.update_yaxes(
+        tickmode="array" if show_labels else "auto",
+        tickvals=list(range(len(labels))) if show_labels else None,
+        ticktext=[str(v) for v in labels] if show_labels else None,
+        showticklabels=show_labels, range=[len(labels) - 0.5, -0.5],
+    )
+    if schedule is not None:
+        _add_schedule(fig, df_plot, codes, schedule, line_width=line_width)
+    fig.update_layout(template="plotly_white", legend_title_text=color_by)
+    return _finish_gantt(fig, len(labels), f"Cronograma de Proyectos (Gantt · {len(df_plot)} tareas)")
+
+def make_gantt(df: pd.DataFrame, color_by: str = "progress", group_by_project: bool = True,
+               detail: str = "auto", schedule: Optional[Dict[str, Any]] = None):
+    """
+    Gantt con nivel de detalle según volumen. detail: "tareas" (una barra por tarea),
+    "resumen" (una barra por proyecto/fase) o "auto" (resumen por encima de GANTT_SUMMARY_THRESHOLD).
+    Por encima de GANTT_WEBGL_THRESHOLD barras se dibuja con WebGL y sin texto por barra.
+    Con `schedule` (scheduling.critical_path de un frame con el mismo índice) se resaltan
+    las tareas críticas y se dibujan las dependencias; el resumen no las muestra.
+    """
     if df.empty:
-        return px.line().update_layout(template="plotly_white", paper_bgcolor="#FFFFFF", plot_bgcolor="#FFFFFF")
-    df_plot = df.dropna(subset=["start", "end"]).copy()
+        return _empty_gantt()
+    df_plot = df.dropna(subset=["start", "end"])
     if df_plot.empty:
-        return px.line().update_layout(template="plotly_white", paper_bgcolor="#FFFFFF", plot_bgcolor="#FFFFFF")
-    df_plot["progress_label"] = df_plot["progress"].astype(int).astype(str) + "%"
-    df_plot["task_label"] = df_plot["task"].astype(str).str.slice(0, 40)
+        return _empty_gantt()
+
+    if detail == "resumen" or (detail == "auto" and len(df_plot) > GANTT_SUMMARY_THRESHOLD):
+        return _gantt_summary(df_plot, color_by)
+
+    df_plot = df_plot.assign(task_label=df_plot["task"].astype(str).str.slice(0, 40))
     y = "project_name" if group_by_project else "task_label"
+    if len(df_plot) > GANTT_WEBGL_THRESHOLD:
+        return _gantt_webgl(df_plot, color_by, y, schedule)
+
+    df_plot["progress_label"] = df_plot["progress"].astype(int).astype(str) + "%"
     fig = px.timeline(
         df_plot,
         x_start="start", x_end="end", y=y, color=color_by,
@@ -316,18 +1876,45 @@ def make_gantt(df: pd.DataFrame, color_by: str = "progress", group_by_project: b
                     "status": True, "priority": True, "rag": True,
                     "progress": True, "start": "|%Y-%m-%d", "end": "|%Y-%m-%d"},
         text="progress_label",
-        title="Cronograma de Proyectos (Gantt)",
         template="plotly_white",
     )
     fig.update_traces(textposition="inside", insidetextanchor="middle", cliponaxis=False)
+    if schedule is not None:
+        _add_schedule(fig, df_plot, df_plot[y].to_numpy(dtype=object), schedule)
+    return _finish_gantt(fig, df_plot[y].nunique(), "Cronograma de Proyectos (Gantt)")
+
+WORKLOAD_MAX_ROWS = 80  # personas en el heatmap (las de mayor pico de carga)
+
+def make_workload_heatmap(weekly: pd.DataFrame, tasks: Optional[pd.DataFrame] = None,
+                          capacity: float = workload.WORKLOAD_CAPACITY, max_rows: int = WORKLOAD_MAX_ROWS):
+    """Heatmap persona × semana; la escala se centra en `capacity` (rojo = sobrecarga)."""
+    if weekly.empty:
+        return _empty_gantt()
+    top = weekly.max(axis=1).sort_values(ascending=False, kind="stable").index[:max_rows]
+    w = weekly.loc[top]
+    custom = tasks.loc[top].to_numpy() if tasks is not None else None
+    z_max = max(float(w.to_numpy().max()), capacity * 2)
+    fig = go.Figure(go.Heatmap(
+        z=w.to_numpy(), x=w.columns, y=[str(p) for p in w.index], customdata=custom,
+        colorscale="RdYlGn_r", zmin=0, zmax=z_max, zmid=capacity,
+        colorbar=dict(title="tareas<br>simultáneas"),
+        hovertemplate="%{y} · semana del %{x|%Y-%m-%d}<br>carga %{z:.1f}"
+                      + ("<br>%{customdata} tarea(s)" if custom is not None else "") + "<extra></extra>",
+    ))
     fig.update_yaxes(autorange="reversed")
     fig.update_layout(
-        bargap=0.2,
-        margin=dict(l=10, r=10, t=60, b=10),
-        paper_bgcolor="#FFFFFF",
-        plot_bgcolor="#FFFFFF",
-        height=520,
+        title=f"Carga semanal por persona (capacidad {capacity:g}; {len(w)} de {len(weekly)} personas)",
+        template="plotly_white", margin=dict(l=10, r=10, t=60, b=10),
+        height=_gantt_height(len(w)),
     )
-    today = pd.Timestamp.today().normalize()
-    fig.add_vline(x=today, line_width=2, line_dash="dash", opacity=0.6)
+    return fig
+
+def make_spi_trend(trend: pd.DataFrame, color: Optional[str] = None):
+    """SPI por día a partir de analytics.trend (una línea por valor de `color`, si se indica)."""
+    if trend.empty:
+        return _empty_gantt()
+    fig = px.line(trend, x="day", y="spi", color=color, markers=True, template="plotly_white",
+                  hover_data={"sv_days": ":.0f", "late": True, "slip_avg": True})
+    fig.add_hline(y=1.0, line_dash="dash", opacity=0.5)
+    fig.update_layout(title="SPI por día (snapshots diarios)", margin=dict(l=10, r=10, t=60, b=10))
     return fig
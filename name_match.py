@@ -0,0 +1,206 @@
+# name_match.py
+"""
+Índice para resolver nombres escritos a mano contra la tabla users.
+Claves sin tildes ni puntuación, variante con tokens ordenados ("Pérez, José" ==
+"Jose Perez") e índice de trigramas para traer candidatos y puntuarlos por
+distancia de edición. Se construye una vez por TTL; cada consulta toca solo los
+candidatos que comparten trigramas, no toda la tabla.
+"""
+from __future__ import annotations
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:  # opcional: Levenshtein en C
+    from rapidfuzz.distance import Levenshtein as _rf_lev  # type: ignore
+except Exception:  # pragma: no cover
+    _rf_lev = None
+
+MATCH_THRESHOLD = 0.85   # similitud mínima (1 - distancia / largo) para aceptar un match difuso
+AMBIGUITY_MARGIN = 0.05  # si el segundo candidato queda a menos de esto, es ambiguo
+MAX_CANDIDATES = 12      # candidatos por trigramas que se puntúan con distancia de edición
+NGRAM = 3
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def fold(s: Any) -> str:
+    """Minúsculas, sin tildes ni puntuación, espacios colapsados ('' si no queda nada)."""
+    if s is None:
+        return ""
+    s = unicodedata.normalize("NFKD", str(s))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM.sub(" ", s).strip()
+
+
+def token_key(folded: str) -> str:
+    return " ".join(sorted(folded.split()))
+
+
+def _ngrams(s: str) -> set:
+    padded = f" {s} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+def _myers(a: str, b: str) -> int:
+    """Distancia de edición bit-paralela (Myers/Hyyrö): una pasada por b con operaciones de enteros."""
+    m = len(a)
+    if not m:
+        return len(b)
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(a):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for ch in b:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def levenshtein(a: str, b: str, max_dist: Optional[int] = None) -> int:
+    """Distancia de edición; si supera max_dist devuelve max_dist + 1."""
+    if max_dist is not None and abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    if _rf_lev is not None:
+        return _rf_lev.distance(a, b, score_cutoff=max_dist)
+    d = _myers(a, b)
+    return d if max_dist is None or d <= max_dist else max_dist + 1
+
+
+def similarity(a: str, b: str, floor: float = 0.0) -> float:
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    max_dist = int(longest * (1 - floor)) if floor else None
+    return 1.0 - levenshtein(a, b, max_dist) / longest
+
+
+class NameIndex:
+    def __init__(self, users: Iterable[Dict[str, Any]], threshold: float = MATCH_THRESHOLD,
+                 margin: float = AMBIGUITY_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self.users: List[Dict[str, Any]] = []
+        self._by_folded: Dict[str, List[int]] = defaultdict(list)
+        self._by_tokens: Dict[str, List[int]] = defaultdict(list)
+        for u in users:
+            folded = fold(u.get("full_name"))
+            if not folded or not u.get("email"):
+                continue
+            uid = len(self.users)
+            self.users.append(u)
+            self._by_folded[folded].append(uid)
+            self._by_tokens[token_key(folded)].append(uid)
+
+        # trigramas sobre las claves con tokens ordenados
+        self._keys = list(self._by_tokens)
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for k, key in enumerate(self._keys):
+            for g in _ngrams(key):
+                postings[g].append(k)
+        self._postings = {g: np.asarray(v, dtype=np.int32) for g, v in postings.items()}
+        self._key_grams = np.asarray([len(_ngrams(key)) for key in self._keys], dtype=np.int32)
+
+    def _email(self, uid: int) -> str:
+        return str(self.users[uid]["email"]).strip().lower()
+
+    def _distinct(self, uids: List[int]) -> List[int]:
+        # el mismo email cargado dos veces es la misma persona
+        seen, out = set(), []
+        for uid in uids:
+            em = self._email(uid)
+            if em not in seen:
+                seen.add(em)
+                out.append(uid)
+        return out
+
+    def _candidate(self, uid: int, score: float) -> Dict[str, Any]:
+        u = self.users[uid]
+        return {"full_name": u.get("full_name"), "email": u.get("email"), "score": round(score, 3)}
+
+    def _result(self, name: Any, uids: List[int], score: float, method: str) -> Dict[str, Any]:
+        uids = self._distinct(uids)
+        if len(uids) > 1:
+            return {"name": name, "email": None, "full_name": None, "score": score, "method": "ambiguous",
+                    "candidates": [self._candidate(u, score) for u in uids]}
+        u = self.users[uids[0]]
+        return {"name": name, "email": u.get("email"), "full_name": u.get("full_name"),
+                "score": score, "method": method, "candidates": []}
+
+    def match(self, name: Any) -> Dict[str, Any]:
+        """
+        Mejor usuario para `name`. method: 'folded' | 'tokens' | 'fuzzy' | 'ambiguous' | None.
+        Si es ambiguo, email es None y 'candidates' lista las opciones.
+        """
+        folded = fold(name)
+        none = {"name": name, "email": None, "full_name": None, "score": 0.0, "method": None, "candidates": []}
+        if not folded:
+            return none
+        if folded in self._by_folded:
+            return self._result(name, self._by_folded[folded], 1.0, "folded")
+        key = token_key(folded)
+        if key in self._by_tokens:
+            return self._result(name, self._by_tokens[key], 1.0, "tokens")
+
+        grams = _ngrams(key)
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return none
+        counts = np.bincount(np.concatenate(hits), minlength=len(self._keys))
+        # cada edición rompe a lo sumo NGRAM trigramas: con menos compartidos no llega al umbral
+        floor = self.threshold - self.margin
+        max_edits = int(len(key) / floor * (1 - floor))
+        viable = np.flatnonzero(counts >= len(grams) - NGRAM * max_edits)
+        if not len(viable):
+            return none
+        if len(viable) > MAX_CANDIDATES:
+            # Dice sobre trigramas: a igual cantidad compartida, la clave con menos trigramas
+            # de sobra (p.ej. sin un token extra) queda antes y no se pierde en el recorte
+            dice = counts[viable] / (len(grams) + self._key_grams[viable])
+            viable = viable[np.argpartition(-dice, MAX_CANDIDATES - 1)[:MAX_CANDIDATES]]
+        top = viable
+
+        scored = sorted(((similarity(key, self._keys[c], floor), int(c)) for c in top),
+                        reverse=True)
+        best_score, best = scored[0]
+        if best_score < self.threshold:
+            return none
+        best_uids = self._distinct(self._by_tokens[self._keys[best]])
+        best_emails = {self._email(u) for u in best_uids}
+        close = [(sc, uid) for sc, c in scored[1:] if best_score - sc < self.margin
+                 for uid in self._distinct(self._by_tokens[self._keys[c]])
+                 if self._email(uid) not in best_emails]
+        if len(best_uids) > 1 or close:
+            return {"name": name, "email": None, "full_name": None, "score": best_score, "method": "ambiguous",
+                    "candidates": [self._candidate(u, best_score) for u in best_uids]
+                                  + [self._candidate(u, sc) for sc, u in close]}
+        u = self.users[best_uids[0]]
+        return {"name": name, "email": u.get("email"), "full_name": u.get("full_name"),
+                "score": best_score, "method": "fuzzy", "candidates": []}
+
+    def match_many(self, names: Iterable[Any]) -> List[Dict[str, Any]]:
+        """match() para muchos nombres; cada clave plegada se resuelve una sola vez."""
+        memo: Dict[str, Dict[str, Any]] = {}
+        out = []
+        for name in names:
+            folded = fold(name)
+            if folded not in memo:
+                memo[folded] = self.match(name)
+            out.append(dict(memo[folded], name=name))
+        return out
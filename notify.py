@@ -1,13 +1,25 @@
 # notify.py
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable
+import hashlib
+import html
+import queue
 import re
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from email.message import EmailMessage
+from string import Template
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 import main  # usamos la conexión y utilidades del módulo original
+import outbox
+from name_match import NameIndex
+from people import explode_people
 
 
 # ------------------ Helpers de normalización ------------------
@@ -21,157 +33,626 @@ def _norm_name(s: Optional[str]) -> Optional[str]:
     s = re.sub(r"\s+", " ", s)
     return s.lower()
 
-def _split_collaborators(csv_or_list: Any) -> List[str]:
-    # reutilizamos el parser del main si existiera, si no, fallback simple
-    try:
-        parts = main._to_list_from_csv(csv_or_list)  # type: ignore[attr-defined]
-        return parts or []
-    except Exception:
-        if csv_or_list is None:
-            return []
-        s = str(csv_or_list).strip()
-        if not s:
-            return []
-        return [p.strip() for p in s.split(",") if p.strip()]
-
 
 # ------------------ Lectura de usuarios (name -> email) ------------------
-@st.cache_data(show_spinner=False, ttl=60)
-def fetch_user_index() -> Dict[str, Dict[str, str]]:
+USERS_TTL = 60
+
+
+@st.cache_data(show_spinner=False, ttl=USERS_TTL)
+def fetch_users() -> List[Dict[str, Any]]:
     """
-    Devuelve un índice {nombre_normalizado: {full_name, email, id}} desde la tabla users.
-    Si no hay conexión o no existe la tabla, devuelve dict vacío.
+    Usuarios activos [{id, full_name, email}] de la tabla users ([] si no hay conexión o tabla).
+    Solo is_active = true: un usuario con is_active nulo no recibe correos (como siempre hizo notify).
     """
     sb = main.get_sb()
     if sb is None:
-        return {}
+        return []
     try:
         res = sb.table("users").select("id, full_name, email").eq("is_active", True).execute()
-        rows = res.data or []
-        idx: Dict[str, Dict[str, str]] = {}
-        for r in rows:
-            n = _norm_name(r.get("full_name"))
-            if not n:
-                continue
-            idx[n] = {
-                "id": r.get("id"),
-                "full_name": r.get("full_name") or "",
-                "email": r.get("email") or "",
-            }
-        return idx
+        return res.data or []
     except Exception:
-        return {}
+        return []
+
+
+def fetch_user_index() -> Dict[str, Dict[str, str]]:
+    """
+    Devuelve un índice {nombre_normalizado: {full_name, email, id}} desde la tabla users.
+    Si no hay conexión o no existe la tabla, devuelve dict vacío.
+    """
+    idx: Dict[str, Dict[str, str]] = {}
+    for r in fetch_users():
+        n = _norm_name(r.get("full_name"))
+        if not n:
+            continue
+        idx[n] = {
+            "id": r.get("id"),
+            "full_name": r.get("full_name") or "",
+            "email": r.get("email") or "",
+        }
+    return idx
+
+
+@st.cache_resource(show_spinner=False, ttl=USERS_TTL)
+def user_name_index() -> NameIndex:
+    """Índice difuso (sin tildes, tokens ordenados, trigramas) sobre los usuarios; uno por TTL."""
+    return NameIndex(fetch_users())
 
 
 # ------------------ Resolución de destinatarios ------------------
+def _norm_names(s: pd.Series) -> pd.Series:
+    """Versión vectorizada de _norm_name: trim, espacios colapsados y minúsculas ('' -> NA)."""
+    out = s.astype("string").str.strip().str.replace(r"\s+", " ", regex=True).str.lower()
+    return out.mask(out == "")
+
+
+def _user_frame() -> pd.DataFrame:
+    idx = fetch_user_index()
+    return pd.DataFrame(
+        [(k, v.get("full_name"), v.get("email") or None) for k, v in idx.items()],
+        columns=["name_key", "full_name", "email"],
+    ).astype({"name_key": "string"})
+
+
+def _join_by_pos(part: pd.DataFrame, col: str) -> pd.Series:
+    """Valores únicos y ordenados de `col` por tarea, unidos con ', ' (índice = pos)."""
+    part = part.drop_duplicates(["pos", col]).sort_values(["pos", col])
+    pos = part["pos"].to_numpy()
+    if not len(pos):
+        return pd.Series(dtype=object)
+    starts = np.flatnonzero(np.r_[True, pos[1:] != pos[:-1]])
+    groups = np.split(part[col].astype(object).to_numpy(), starts[1:])
+    return pd.Series([", ".join(map(str, g)) for g in groups], index=pos[starts], dtype=object)
+
+
+def resolve_people(df_rows: pd.DataFrame, with_mapping: bool = True, fuzzy: bool = True) -> Dict[str, Any]:
+    """
+    Motor único de resolución nombre -> email (notify y el mapeo de la app).
+    Explota owner/colaboradores, normaliza con str ops y resuelve con un solo merge.
+    Retorna {
+      'people': largo [pos, role, seq, name, name_key, email, match, score],
+      'mapping': por tarea [task_id, project_name, task, owner_email, collaborator_emails,
+                 collaborator_unresolved_names],
+      'recipients': emails únicos en orden de aparición,
+      'rows_by_email': {email: [posiciones]},
+      'unresolved': nombres sin email (únicos, en orden de aparición),
+      'matches': nombres resueltos sin match exacto [name, full_name, email, method, score],
+      'ambiguous': [{name, candidates}] con más de un usuario posible (quedan sin resolver),
+    }
+    Con fuzzy=True, los nombres sin match exacto pasan por user_name_index().
+    Con with_mapping=False no se arma la tabla por tarea ('mapping' = None).
+    """
+    people = explode_people(df_rows)
+    people["name_key"] = _norm_names(people["name"])
+    users = _user_frame()
+    people = people.merge(users[["name_key", "email"]], on="name_key", how="left", sort=False)
+    people["email"] = people["email"].astype(object).where(people["email"].notna(), None)
+    people["match"] = np.where(people["email"].notna(), "exact", None)
+    people["score"] = np.where(people["email"].notna(), 1.0, np.nan)
+
+    # lo que no matcheó exacto: sin tildes / tokens ordenados / distancia de edición (una vez por nombre)
+    matches = pd.DataFrame(columns=["name", "full_name", "email", "method", "score"])
+    ambiguous: List[Dict[str, Any]] = []
+    miss = people["email"].isna()
+    if fuzzy and miss.any():
+        names = people.loc[miss, "name"].drop_duplicates()
+        found = pd.DataFrame(user_name_index().match_many(names.tolist()))
+        ambiguous = found.loc[found["method"] == "ambiguous", ["name", "candidates"]].to_dict("records")
+        matches = found.loc[found["email"].notna(), ["name", "full_name", "email", "method", "score"]]
+        if not matches.empty:
+            hit = people.loc[miss, ["name"]].merge(matches, on="name", how="left")
+            people.loc[miss, "email"] = hit["email"].astype(object).where(hit["email"].notna(), None).to_numpy()
+            people.loc[miss, "match"] = hit["method"].to_numpy()
+            people.loc[miss, "score"] = hit["score"].to_numpy()
+
+    hits = people[people["email"].notna()].drop_duplicates(["email", "pos"])
+    codes, recipients_idx = pd.factorize(hits["email"], sort=False)  # orden de aparición
+    recipients = [str(e) for e in recipients_idx]
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(1, len(recipients)))
+    rows_by_email = dict(zip(recipients, (g.tolist() for g in np.split(hits["pos"].to_numpy()[order], bounds))))
+
+    misses = people[people["email"].isna()]
+    unresolved = misses.assign(key=misses["name_key"].fillna(misses["name"])) \
+        .drop_duplicates("key")["name"].astype(str).tolist()
+
+    res = {"people": people, "mapping": None, "recipients": recipients,
+           "rows_by_email": rows_by_email, "unresolved": unresolved,
+           "matches": matches.reset_index(drop=True), "ambiguous": ambiguous}
+    if not with_mapping:
+        return res
+
+    # tabla por tarea
+    n = len(df_rows)
+    owners = people[people["role"] == "owner"].drop_duplicates("pos").set_index("pos")["email"]
+    collab = people[people["role"] == "collaborator"]
+    col_ok = _join_by_pos(collab[collab["email"].notna()], "email")
+    col_bad = _join_by_pos(collab[collab["email"].isna()], "name")
+
+    def _col(name: str) -> Any:
+        return df_rows[name].to_numpy() if name in df_rows else [None] * n
+
+    mapping = pd.DataFrame({
+        "task_id": _col("id"),
+        "project_name": _col("project_name"),
+        "task": _col("task"),
+        "owner_email": owners.reindex(range(n)).to_numpy(),
+        "collaborator_emails": col_ok.reindex(range(n)).to_numpy(),
+        "collaborator_unresolved_names": col_bad.reindex(range(n)).to_numpy(),
+    })
+    res["mapping"] = mapping.astype(object).where(mapping.notna(), None)
+    return res
+
+
+def recipient_rows(df_rows: pd.DataFrame) -> Tuple[Dict[str, List[int]], List[str]]:
+    """
+    A partir de filas de tasks (owner y collaborators en texto),
+    retorna ({email: [posiciones de fila]}, nombres_no_resueltos).
+    Los emails quedan en orden de primera aparición (owner antes que colaboradores).
+    """
+    res = resolve_people(df_rows, with_mapping=False)
+    return res["rows_by_email"], res["unresolved"]
+
+
 def resolve_recipients(df_rows: pd.DataFrame) -> Tuple[List[str], List[str]]:
     """
     A partir de filas de tasks (owner y collaborators en texto),
     retorna (emails_unicos, nombres_no_resueltos).
     """
-    user_idx = fetch_user_index()
-    emails: List[str] = []
-    unresolved: List[str] = []
-
-    for _, r in df_rows.iterrows():
-        # Owner
-        owner_name = r.get("owner")
-        nm = _norm_name(owner_name) if owner_name else None
-        if nm and nm in user_idx:
-            mail = user_idx[nm]["email"]
-            if mail and mail not in emails:
-                emails.append(mail)
-        elif owner_name:
-            unresolved.append(str(owner_name))
-
-        # Colaboradores
-        for col_name in _split_collaborators(r.get("collaborators")):
-            nm2 = _norm_name(col_name)
-            if nm2 and nm2 in user_idx:
-                mail2 = user_idx[nm2]["email"]
-                if mail2 and mail2 not in emails:
-                    emails.append(mail2)
-            else:
-                unresolved.append(str(col_name))
-
-    # limpiar duplicados de "unresolved" manteniendo orden
-    seen = set()
-    unresolved_unique = []
-    for n in unresolved:
-        key = _norm_name(n) or n
-        if key in seen:
-            continue
-        seen.add(key)
-        unresolved_unique.append(n)
+    rows_by_email, unresolved = recipient_rows(df_rows)
+    return list(rows_by_email), unresolved
 
-    return emails, unresolved_unique
 
+# ------------------ Mapeo materializado de destinatarios ------------------
+# Opcional en la DB: vistas materializadas + RPC para refrescarlas después de escribir.
+# Si no existen, la app usa recipient_summary(), que guarda el mismo resultado en
+# memoria por versión de tareas + versión de usuarios.
+#
+#   create materialized view tasks_recipients_expanded as
+#   select t.id as task_id, t.project_name, t.task, p.role, p.name, u.email,
+#          (u.email is not null) as resolved
+#   from tasks t
+#   cross join lateral (
+#       select 'owner' as role, trim(t.owner) as name where coalesce(trim(t.owner), '') <> ''
+#       union all
+#       select 'collaborator', trim(c) from unnest(t.collaborators) c where coalesce(trim(c), '') <> ''
+#   ) p
+#   left join users u
+#     on lower(regexp_replace(trim(u.full_name), '\s+', ' ', 'g')) = lower(regexp_replace(p.name, '\s+', ' ', 'g'))
+#    and u.is_active;
+#
+#   create materialized view tasks_recipients_summary as
+#   select task_id, project_name, task,
+#          max(email) filter (where role = 'owner') as owner_email,
+#          string_agg(distinct email, ', ' order by email) filter (where role = 'collaborator' and resolved) as collaborator_emails,
+#          string_agg(distinct name, ', ' order by name) filter (where role = 'collaborator' and not resolved) as collaborator_unresolved_names
+#   from tasks_recipients_expanded
+#   group by task_id, project_name, task;
+#   create unique index on tasks_recipients_summary (task_id);
+#
+#   create or replace function refresh_tasks_recipients() returns void
+#   language sql security definer as $$
+#       refresh materialized view tasks_recipients_expanded;
+#       refresh materialized view concurrently tasks_recipients_summary;
+#   $$;
+RECIPIENT_VIEWS_TTL = 300
+RECIPIENT_CACHE_ENTRIES = 8
+_refresh_rpc_missing = False
 
-# ------------------ Construcción del email ------------------
-def build_digest_html(df_rows: pd.DataFrame) -> str:
+
+def _safe_view(sb: Any, table_name: str) -> Optional[pd.DataFrame]:
+    try:
+        res = sb.table(table_name).select("*").order("project_name").order("task_id").execute()
+        return pd.DataFrame(res.data or [])
+    except Exception:
+        return None
+
+
+@st.cache_data(show_spinner=False, ttl=RECIPIENT_VIEWS_TTL)
+def fetch_recipient_views() -> Dict[str, Optional[pd.DataFrame]]:
     """
-    Construye un HTML con los campos claves de las filas seleccionadas.
+    Lee tasks_recipients_summary / tasks_recipients_expanded si existen (None si no).
+    Se cachea también la ausencia: sin vistas no se vuelve a preguntar en cada rerun.
     """
-    cols = [
-        "id", "project_name", "task", "details", "owner", "collaborators",
-        "start", "end", "status", "priority", "progress", "rag", "external_link"
-    ]
-    present_cols = [c for c in cols if c in df_rows.columns]
-
-    # tabla html
-    rows_html = []
-    for _, r in df_rows.iterrows():
-        tds = []
-        for c in present_cols:
-            v = r.get(c)
-            if pd.isna(v):
-                v = ""
-            if c in ("start", "end") and str(v):
-                try:
-                    v = pd.to_datetime(v).date().isoformat()
-                except Exception:
-                    v = str(v)
-            tds.append(f"<td style='padding:6px;border:1px solid #ddd'>{v}</td>")
-        rows_html.append("<tr>" + "".join(tds) + "</tr>")
+    sb = main.get_sb()
+    if sb is None:
+        return {"summary": None, "expanded": None}
+    summary = _safe_view(sb, "tasks_recipients_summary")
+    expanded = _safe_view(sb, "tasks_recipients_expanded") if summary is not None else None
+    return {"summary": summary, "expanded": expanded}
+
+
+def refresh_recipient_views() -> bool:
+    """
+    Después de escribir tasks o users: refresca las vistas materializadas (si existe el RPC)
+    y descarta la lectura cacheada. El resumen local no necesita nada: cambia la versión de datos.
+    """
+    global _refresh_rpc_missing
+    refreshed = False
+    sb = main.get_sb()
+    if sb is not None and not _refresh_rpc_missing:
+        try:
+            sb.rpc("refresh_tasks_recipients").execute()
+            refreshed = True
+        except Exception:
+            _refresh_rpc_missing = True  # sin RPC: no insistimos en cada guardado
+    fetch_recipient_views.clear()
+    return refreshed
+
+
+def users_fingerprint() -> str:
+    """Versión de la lista de usuarios (cambia cuando fetch_users trae algo distinto)."""
+    h = hashlib.sha256()
+    for r in sorted(fetch_users(), key=lambda r: str(r.get("id"))):
+        h.update(f"{r.get('id')}\x1f{r.get('full_name')}\x1f{r.get('email')}\x1e".encode("utf-8"))
+    return h.hexdigest()
+
+
+@st.cache_resource(max_entries=RECIPIENT_CACHE_ENTRIES, show_spinner=False)
+def _recipient_summary_cached(_df: pd.DataFrame, fingerprint: str, users_fp: str) -> Dict[str, pd.DataFrame]:
+    res = resolve_people(_df)
+    people = res["people"]
+    df = _df.reset_index(drop=True)
+    pos = people["pos"].to_numpy()
+
+    def _at(name: str) -> Any:
+        return df[name].to_numpy()[pos] if name in df else None
+
+    expanded = pd.DataFrame({
+        "task_id": _at("id"),
+        "project_name": _at("project_name"),
+        "task": _at("task"),
+        "role": people["role"].to_numpy(),
+        "name": people["name"].to_numpy(),
+        "email": people["email"].astype(object).where(people["email"].notna(), None).to_numpy(),
+        "resolved": people["email"].notna().to_numpy(),
+        "match": people["match"].astype(object).where(people["match"].notna(), None).to_numpy(),
+        "score": people["score"].to_numpy(),
+    })
+    return {"summary": res["mapping"], "expanded": expanded}
+
 
-    thead = "".join([f"<th style='text-align:left;padding:6px;border-bottom:2px solid #333'>{c}</th>" for c in present_cols])
-    tbody = "\n".join(rows_html)
-    html = f"""
+def recipient_summary(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Equivalente local de las vistas: {'summary': por tarea, 'expanded': por persona}.
+    Se calcula una vez por versión de tareas (main.data_fingerprint) y de usuarios; los reruns lo reutilizan.
+    """
+    return _recipient_summary_cached(df, f"{main.data_fingerprint(df)}:{len(df)}", users_fingerprint())
+
+
+# ------------------ Construcción del email ------------------
+# Plantillas compiladas una vez: cada fila se renderiza (escapada) una sola vez por
+# lote y cada digest personal es solo un join de las filas de esa persona.
+DIGEST_COLS = [
+    "id", "project_name", "task", "details", "owner", "collaborators",
+    "start", "end", "status", "priority", "progress", "rag", "external_link"
+]
+_TD = "<td style='padding:6px;border:1px solid #ddd'>"
+_TH = "<th style='text-align:left;padding:6px;border-bottom:2px solid #333'>"
+
+DIGEST_HTML = Template("""
     <div style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial">
-      <h2>📌 Resumen de tareas seleccionadas</h2>
+      <h2>📌 $title</h2>
       <table cellspacing="0" cellpadding="0" style="border-collapse:collapse;width:100%;font-size:14px">
-        <thead><tr>{thead}</tr></thead>
-        <tbody>{tbody}</tbody>
+        <thead><tr>$thead</tr></thead>
+        <tbody>$tbody</tbody>
       </table>
       <p style="color:#666;margin-top:12px">Enviado automáticamente desde Gantt Worms.</p>
     </div>
+    """)
+
+DIGEST_TEXT = Template("""$title
+
+$lines
+
+Enviado automáticamente desde Gantt Worms.
+""")
+
+
+def _cell_text(df_rows: pd.DataFrame, c: str) -> List[str]:
+    s = df_rows[c]
+    if c in ("start", "end"):
+        return pd.to_datetime(s, errors="coerce").dt.strftime("%Y-%m-%d").fillna("").tolist()
+    return ["" if v is None or (isinstance(v, float) and v != v) or v is pd.NA else str(v)
+            for v in s.astype(object).tolist()]
+
+
+def render_rows(df_rows: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Renderiza cada fila una vez: {'thead': str, 'html': [<tr>...], 'text': [línea]}.
+    Las posiciones coinciden con las de df_rows.
+    """
+    n = len(df_rows)
+    present_cols = [c for c in DIGEST_COLS if c in df_rows.columns]
+    cells = {c: _cell_text(df_rows, c) for c in present_cols}
+
+    sep = "</td>" + _TD
+    escaped = [list(map(html.escape, cells[c])) for c in present_cols]
+    rows_html = [f"<tr>{_TD}{sep.join(row)}</td></tr>" for row in zip(*escaped)] if present_cols else ["<tr></tr>"] * n
+
+    empty = [""] * n
+    rows_text = []
+    for proj, task, owner, start, end, status, progress in zip(
+            *(cells.get(c, empty) for c in ("project_name", "task", "owner", "start", "end", "status", "progress"))):
+        dates = f"{start} → {end}" if start or end else ""
+        pct = f" {progress}%" if progress else ""
+        rows_text.append(f"- [{proj}] {task} | {owner} | {dates} | {status}{pct}".rstrip())
+
+    thead = "".join(f"{_TH}{html.escape(c)}</th>" for c in present_cols)
+    return {"thead": thead, "html": rows_html, "text": rows_text, "projects": cells.get("project_name", empty)}
+
+
+def _render_digest(rendered: Dict[str, Any], positions: Any, title: str,
+                   with_text: bool = True) -> Dict[str, Optional[str]]:
+    rows_html = rendered["html"]
+    body = DIGEST_HTML.substitute(title=html.escape(title), thead=rendered["thead"],
+                                  tbody="\n".join(rows_html[p] for p in positions))
+    text = None
+    if with_text:
+        rows_text = rendered["text"]
+        text = DIGEST_TEXT.substitute(title=title, lines="\n".join(rows_text[p] for p in positions))
+    return {"html": body, "text": text}
+
+
+def build_digest_html(df_rows: pd.DataFrame) -> str:
+    """
+    Construye un HTML con los campos claves de las filas seleccionadas.
+    """
+    rendered = render_rows(df_rows)
+    return _render_digest(rendered, range(len(df_rows)), "Resumen de tareas seleccionadas",
+                          with_text=False)["html"]
+
+
+def _subject(projects: List[str], positions: List[int]) -> str:
+    first_proj = next((projects[p] for p in positions if projects[p]), None)
+    title_hint = f" · {first_proj}" if first_proj else ""
+    return f"[Gantt] Resumen de {len(positions)} tarea(s){title_hint}"
+
+
+def build_personal_digests(df_rows: pd.DataFrame, with_text: bool = True) -> Dict[str, Any]:
+    """
+    Un digest por destinatario con solo las tareas donde es owner o colaborador.
+    Retorna {'digests': {email: {'subject', 'html', 'text', 'count'}}, 'unresolved': [nombres],
+             'matches': resueltos sin match exacto, 'ambiguous': [{name, candidates}]}.
     """
-    return html
+    df_rows = df_rows.reset_index(drop=True)
+    resolved = resolve_people(df_rows, with_mapping=False)
+    rows_by_email = resolved["rows_by_email"]
+    rendered = render_rows(df_rows)
+    digests: Dict[str, Dict[str, Any]] = {}
+    for email, positions in rows_by_email.items():
+        title = f"Tus tareas ({len(positions)})"
+        d = _render_digest(rendered, positions, title, with_text=with_text)
+        digests[email] = {"subject": _subject(rendered["projects"], positions), "html": d["html"],
+                          "text": d["text"], "count": len(positions)}
+    return {"digests": digests, "unresolved": resolved["unresolved"],
+            "matches": resolved["matches"], "ambiguous": resolved["ambiguous"]}
 
 
 # ------------------ Envío (SMTP) ------------------
+# Un lote de correos reutiliza pocas conexiones autenticadas (pool) en vez de abrir
+# TCP + STARTTLS + login por destinatario. Los envíos van en paralelo (acotado), con
+# un límite de mensajes por segundo y reconexión si el server corta la sesión.
+SMTP_POOL_SIZE = 3
+SMTP_RATE_PER_SEC = 5.0
+SMTP_MAX_RETRIES = 2
+SMTP_TIMEOUT = 30
+
+
+
+def _session_lost(exc: BaseException) -> bool:
+    """True si la conexión ya no sirve (hay que reabrirla y reintentar el mensaje)."""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code == 421  # el server cierra la sesión (p.ej. demasiados mensajes)
+    if isinstance(exc, smtplib.SMTPException):
+        return False  # destinatario rechazado, auth inválida...: reintentar no ayuda
+    return isinstance(exc, OSError)  # red: reset, timeout
+
+
+class SendUncertain(Exception):
+    """El envío se cortó sin respuesta del server (p.ej. timeout tras DATA): el mensaje pudo haber salido."""
+
+
 def email_enabled() -> bool:
     return bool(st.secrets.get("EMAIL_HOST") and st.secrets.get("EMAIL_USER") and st.secrets.get("EMAIL_PASSWORD"))
 
+def _secret_bool(key: str, default: bool) -> bool:
+    v = st.secrets.get(key)
+    if v is None:
+        return default
+    return str(v).strip().lower() in ("1", "true", "yes", "si", "sí")
+
+def smtp_settings() -> Dict[str, Any]:
+    """Config SMTP desde secrets (EMAIL_*)."""
+    port = int(st.secrets.get("EMAIL_PORT", 587))
+    user = st.secrets.get("EMAIL_USER")
+    return {
+        "host": st.secrets.get("EMAIL_HOST"),
+        "port": port,
+        "user": user,
+        "password": st.secrets.get("EMAIL_PASSWORD"),
+        "sender": st.secrets.get("EMAIL_FROM", user),
+        "ssl": _secret_bool("EMAIL_SSL", port == 465),
+        "starttls": _secret_bool("EMAIL_STARTTLS", port != 465),
+        "pool_size": int(st.secrets.get("EMAIL_POOL_SIZE", SMTP_POOL_SIZE)),
+        "rate_per_sec": float(st.secrets.get("EMAIL_RATE_PER_SEC", SMTP_RATE_PER_SEC)),
+    }
+
+def build_message(sender: str, to_email: str, subject: str, html_body: str,
+                  text_body: Optional[str] = None) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = to_email
+    msg.set_content(text_body or "Este aviso requiere un cliente de correo HTML.")
+    msg.add_alternative(html_body, subtype="html")
+    return msg
+
+
+class RateLimiter:
+    """Reparte turnos espaciados 1/rate segundos entre todos los hilos."""
+
+    def __init__(self, rate_per_sec: float):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec and rate_per_sec > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SmtpPool:
+    """
+    Pool de conexiones SMTP autenticadas para un lote de envíos.
+    Las conexiones se abren a demanda (hasta pool_size) y se cierran al salir del `with`.
+    """
+
+    def __init__(self, settings: Dict[str, Any], pool_size: Optional[int] = None,
+                 rate_per_sec: Optional[float] = None, retries: int = SMTP_MAX_RETRIES,
+                 timeout: float = SMTP_TIMEOUT):
+        self.settings = settings
+        self.size = max(1, int(pool_size or settings.get("pool_size") or SMTP_POOL_SIZE))
+        rate = settings.get("rate_per_sec", SMTP_RATE_PER_SEC) if rate_per_sec is None else rate_per_sec
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._open: List[smtplib.SMTP] = []
+        self.connects = 0  # cuántas sesiones se abrieron (útil para diagnosticar)
+
+    # -- conexiones --
+    def _connect(self) -> smtplib.SMTP:
+        cfg = self.settings
+        if cfg.get("ssl"):
+            server: smtplib.SMTP = smtplib.SMTP_SSL(cfg["host"], cfg["port"], timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(cfg["host"], cfg["port"], timeout=self.timeout)
+            if cfg.get("starttls"):
+                server.starttls()
+        if cfg.get("user") and cfg.get("password"):
+            server.login(cfg["user"], cfg["password"])
+        with self._lock:
+            self._open.append(server)
+            self.connects += 1
+        return server
+
+    def _discard(self, server: Optional[smtplib.SMTP]) -> None:
+        if server is None:
+            return
+        with self._lock:
+            if server in self._open:
+                self._open.remove(server)
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def _acquire(self) -> Tuple[smtplib.SMTP, bool]:
+        """(conexión, reusada): una reusada estuvo ociosa en el pool."""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            try:
+                return self._connect(), False
+            except Exception:
+                self._slots.release()
+                raise
+
+    def _release(self, server: smtplib.SMTP) -> None:
+        self._idle.put(server)
+        self._slots.release()
+
+    # -- envío --
+    def send(self, msg: EmailMessage) -> None:
+        """
+        Envía un mensaje; reconecta y reintenta si la sesión se cayó antes de enviar o si el
+        server lo rechazó con 421. Si la conexión se corta durante el envío sin respuesta del
+        server no se reintenta (pudo haber salido): levanta SendUncertain. Propaga el último error.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            server, sending = None, False
+            try:
+                server, reused = self._acquire()
+                if reused:
+                    server.noop()  # una sesión ociosa pudo haberse cerrado: mejor saberlo antes del MAIL
+                self.limiter.wait()
+                sending = True
+                server.send_message(msg)
+            except Exception as e:
+                if server is not None and not _session_lost(e):
+                    self._release(server)  # la sesión sigue sana
+                    raise
+                if server is not None:
+                    self._discard(server)
+                    self._slots.release()
+                # una respuesta del server (4xx/5xx) prueba que no lo aceptó; un corte no prueba nada
+                if sending and not isinstance(e, smtplib.SMTPResponseException):
+                    raise SendUncertain(str(e) or type(e).__name__) from e
+                if not _session_lost(e) or attempt > self.retries:
+                    raise
+                continue
+            self._release(server)
+            return
+
+    def send_many(self, messages: List[Tuple[str, EmailMessage]]) -> Dict[str, Any]:
+        """
+        Envía [(email, mensaje)] en paralelo sobre el pool.
+        Retorna {'sent': int, 'failed': [(email, error)]}.
+        """
+        if not messages:
+            return {"sent": 0, "failed": []}
+
+        def _one(item: Tuple[str, EmailMessage]) -> Optional[Tuple[str, str]]:
+            to_email, msg = item
+            try:
+                self.send(msg)
+                return None
+            except Exception as e:
+                return (to_email, str(e))
+
+        with ThreadPoolExecutor(max_workers=min(self.size, len(messages))) as pool:
+            outcomes = list(pool.map(_one, messages))
+        failed = [o for o in outcomes if o is not None]
+        return {"sent": len(messages) - len(failed), "failed": failed}
+
+    def close(self) -> None:
+        with self._lock:
+            servers, self._open = self._open, []
+        for server in servers:
+            try:
+                server.quit()
+            except Exception:
+                try:
+                    server.close()
+                except Exception:
+                    pass
+
+    def __enter__(self) -> "SmtpPool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
 def send_email(to_email: str, subject: str, html_body: str) -> bool:
     try:
-        host = st.secrets["EMAIL_HOST"]
-        port = int(st.secrets.get("EMAIL_PORT", 587))
-        user = st.secrets["EMAIL_USER"]
-        pwd = st.secrets["EMAIL_PASSWORD"]
-        sender = st.secrets.get("EMAIL_FROM", user)
-
-        msg = EmailMessage()
-        msg["Subject"] = subject
-        msg["From"] = sender
-        msg["To"] = to_email
-        msg.set_content("Este aviso requiere un cliente de correo HTML.")
-        msg.add_alternative(html_body, subtype="html")
-
-        with smtplib.SMTP(host, port) as server:
-            server.starttls()
-            server.login(user, pwd)
-            server.send_message(msg)
+        cfg = smtp_settings()
+        msg = build_message(cfg["sender"], to_email, subject, html_body)
+        with SmtpPool(cfg, pool_size=1) as pool:
+            pool.send(msg)
         return True
     except Exception as e:
         st.warning(f"No se pudo enviar email a {to_email}. Detalle: {e}")
@@ -179,25 +660,19 @@ def send_email(to_email: str, subject: str, html_body: str) -> bool:
 
 
 # ------------------ Orquestación ------------------
-def send_digest_for_rows(df_rows: pd.DataFrame) -> Dict[str, Any]:
+def send_digest_for_rows(df_rows: pd.DataFrame, built: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
-    Resuelve destinatarios y envía un único digest a cada uno (mismo contenido).
+    Resuelve destinatarios y envía a cada uno un digest con sus propias tareas.
+    `built`: lo que ya devolvió build_personal_digests (p.ej. para la vista previa), así no se renderiza dos veces.
     Retorna un resumen: {'sent': int, 'failed': [(email, error?)], 'unresolved': [nombres]}
     """
-    # asegurar formato (por si viene desde un editor)
-    df_norm = main.ensure_schema(df_rows)
-
-    # destinatarios
-    recipients, unresolved = resolve_recipients(df_norm)
+    if built is None:
+        # asegurar formato (por si viene desde un editor)
+        built = build_personal_digests(main.ensure_schema(df_rows))
+    digests = built["digests"]
+    recipients = list(digests)
 
-    # cuerpo y subject
-    html = build_digest_html(df_norm)
-    qty = len(df_norm)
-    first_proj = df_norm["project_name"].dropna().astype(str).head(1).tolist()
-    title_hint = f" · {first_proj[0]}" if first_proj else ""
-    subject = f"[Gantt] Resumen de {qty} tarea(s){title_hint}"
-
-    results = {"sent": 0, "failed": [], "unresolved": unresolved, "recipients": recipients}
+    results = {"sent": 0, "failed": [], "unresolved": built["unresolved"], "recipients": recipients}
 
     if not recipients:
         return results
@@ -206,19 +681,80 @@ def send_digest_for_rows(df_rows: pd.DataFrame) -> Dict[str, Any]:
         # si no hay SMTP configurado, no intentamos enviar
         return results
 
-    # enviar uno por uno
-    ok_count = 0
-    failed: List[Tuple[str, str]] = []
-    for em in recipients:
-        try:
-            ok = send_email(em, subject, html)
-            if ok:
-                ok_count += 1
-            else:
-                failed.append((em, "smtp send returned False"))
-        except Exception as e:
-            failed.append((em, str(e)))
-
-    results["sent"] = ok_count
-    results["failed"] = failed
+    # un lote: conexiones reutilizadas, envío en paralelo y con rate limit
+    cfg = smtp_settings()
+    messages = [(em, build_message(cfg["sender"], em, d["subject"], d["html"], d["text"]))
+                for em, d in digests.items()]
+    with SmtpPool(cfg) as pool:
+        sent = pool.send_many(messages)
+
+    results["sent"] = sent["sent"]
+    results["failed"] = sent["failed"]
+    return results
+
+
+# ------------------ Outbox (envío en segundo plano) ------------------
+def _retryable(exc: BaseException) -> bool:
+    """Solo fallas que prueban que el mensaje no se aceptó: conexión/login o rechazo 4xx."""
+    if _session_lost(exc):
+        return True
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500  # 4xx: rechazo temporal (greylisting, cuota)
+    return False
+
+def send_outbox_jobs(cfg: Dict[str, Any], jobs: List[Dict[str, Any]], report: Callable[..., None]) -> None:
+    """Envía jobs de la outbox sobre un pool SMTP e informa el resultado de cada uno."""
+    with SmtpPool(cfg) as pool:
+        def _one(job: Dict[str, Any]) -> None:
+            msg = build_message(cfg["sender"], job["to_email"], job["subject"], job["html"], job.get("text_body"))
+            try:
+                pool.send(msg)
+            except SendUncertain as e:
+                report(job, (str(e), None))  # queda 'uncertain': reencolar es decisión manual
+                return
+            except Exception as e:
+                report(job, (str(e), _retryable(e)))
+                return
+            report(job, None)
+
+        with ThreadPoolExecutor(max_workers=min(pool.size, len(jobs))) as ex:
+            list(ex.map(_one, jobs))
+
+@st.cache_resource(show_spinner=False)
+def outbox_worker() -> outbox.OutboxWorker:
+    """Worker único por proceso; toma la config SMTP al arrancar."""
+    cfg = smtp_settings()
+    return outbox.start_worker(lambda jobs, report: send_outbox_jobs(cfg, jobs, report))
+
+def enqueue_digest_for_rows(df_rows: pd.DataFrame, built: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Como send_digest_for_rows pero encola un job (digest personal) por destinatario y vuelve enseguida.
+    Un mismo digest al mismo destinatario se encola una sola vez por día.
+    Retorna {'batch_id', 'queued', 'duplicates', 'unresolved', 'recipients'}.
+    """
+    if built is None:
+        built = build_personal_digests(main.ensure_schema(df_rows))
+    digests = built["digests"]
+    results = {"batch_id": None, "queued": 0, "duplicates": [],
+               "unresolved": built["unresolved"], "recipients": list(digests)}
+    if not digests:
+        return results
+
+    day = date.today().isoformat()
+    jobs = []
+    for em, d in digests.items():
+        body_hash = hashlib.sha256(d["html"].encode("utf-8")).hexdigest()
+        jobs.append({
+            "to_email": em,
+            "subject": d["subject"],
+            "html": d["html"],
+            "text_body": d["text"],
+            "dedupe_key": hashlib.sha256(f"{day}|{em.lower()}|{d['subject']}|{body_hash}".encode("utf-8")).hexdigest(),
+        })
+
+    worker = outbox_worker()
+    results.update(worker.box.enqueue(jobs))
+    worker.wake()
     return results
@@ -0,0 +1,285 @@
+# outbox.py
+"""
+Outbox persistente de notificaciones (SQLite local) + worker en segundo plano.
+La app encola y vuelve enseguida; el worker drena la cola con reintentos.
+
+Entrega "a lo sumo una vez": un job se marca 'sending' (y se confirma en disco)
+antes de hablar con el SMTP y 'sent' apenas el server lo acepta. Si el proceso
+muere en el medio, al arrancar ese job pasa a 'uncertain' en vez de reenviarse;
+se puede reencolar a mano desde la UI. La dedupe_key evita encolar dos veces el
+mismo correo (doble click, rerun de Streamlit).
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", ".outbox.sqlite3")
+OUTBOX_BATCH = 20          # jobs que el worker toma por vuelta
+OUTBOX_POLL_SEC = 2.0      # espera cuando no hay nada pendiente
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_BASE = 30.0  # segundos; se duplica en cada intento
+OUTBOX_BACKOFF_MAX = 1800.0
+
+STATUSES = ["queued", "sending", "sent", "failed", "uncertain"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox_jobs (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id        TEXT NOT NULL,
+    dedupe_key      TEXT NOT NULL UNIQUE,
+    to_email        TEXT NOT NULL,
+    subject         TEXT NOT NULL,
+    html            TEXT NOT NULL,
+    text_body       TEXT,
+    status          TEXT NOT NULL DEFAULT 'queued',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at      TEXT NOT NULL,
+    updated_at      TEXT NOT NULL,
+    sent_at         TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_jobs_due ON outbox_jobs (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS outbox_jobs_batch ON outbox_jobs (batch_id);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class Outbox:
+    """Cola de correos en SQLite. Thread-safe (una conexión protegida por lock)."""
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")  # 'sending' tiene que estar en disco antes de enviar
+            self._conn.executescript(_SCHEMA)
+
+    def _exec(self, sql: str, params: Any = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    # ---------- productor ----------
+    def enqueue(self, jobs: List[Dict[str, Any]], batch_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Encola [{'to_email', 'subject', 'html', 'text_body'?, 'dedupe_key'}].
+        Los dedupe_key ya presentes se ignoran. Retorna {'batch_id', 'queued', 'duplicates': [to_email]}.
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        now = _now()
+        queued, duplicates = 0, []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for j in jobs:
+                    cur = self._conn.execute(
+                        "INSERT OR IGNORE INTO outbox_jobs "
+                        "(batch_id, dedupe_key, to_email, subject, html, text_body, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (batch_id, j["dedupe_key"], j["to_email"], j["subject"], j["html"],
+                         j.get("text_body"), now, now),
+                    )
+                    if cur.rowcount:
+                        queued += 1
+                    else:
+                        duplicates.append(j["to_email"])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"batch_id": batch_id, "queued": queued, "duplicates": duplicates}
+
+    def requeue(self, ids: List[int]) -> int:
+        """Vuelve a encolar jobs 'failed' o 'uncertain' (decisión manual)."""
+        if not ids:
+            return 0
+        marks = ",".join("?" * len(ids))
+        cur = self._exec(
+            f"UPDATE outbox_jobs SET status='queued', attempts=0, next_attempt_at=0, updated_at=? "
+            f"WHERE id IN ({marks}) AND status IN ('failed', 'uncertain')",
+            [_now(), *ids],
+        )
+        return cur.rowcount
+
+    # ---------- consumidor ----------
+    def recover(self) -> int:
+        """Al arrancar: lo que quedó en 'sending' pudo haberse enviado, no se reintenta solo."""
+        cur = self._exec(
+            "UPDATE outbox_jobs SET status='uncertain', updated_at=?, "
+            "last_error=COALESCE(last_error, 'interrumpido durante el envío') WHERE status='sending'",
+            (_now(),),
+        )
+        return cur.rowcount
+
+    def claim(self, limit: int = OUTBOX_BATCH) -> List[Dict[str, Any]]:
+        """Toma jobs vencidos y los pasa a 'sending' en una sola transacción."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT * FROM outbox_jobs WHERE status='queued' AND next_attempt_at <= ? "
+                    "ORDER BY id LIMIT ?",
+                    (time.time(), int(limit)),
+                ).fetchall()
+                if rows:
+                    marks = ",".join("?" * len(rows))
+                    self._conn.execute(
+                        f"UPDATE outbox_jobs SET status='sending', attempts=attempts+1, updated_at=? "
+                        f"WHERE id IN ({marks})",
+                        [_now(), *[r["id"] for r in rows]],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [dict(r, attempts=r["attempts"] + 1) for r in rows]
+
+    def mark_sent(self, job_id: int) -> None:
+        now = _now()
+        self._exec("UPDATE outbox_jobs SET status='sent', last_error=NULL, sent_at=?, updated_at=? WHERE id=?",
+                   (now, now, job_id))
+
+    def mark_failed(self, job: Dict[str, Any], error: str, retry: bool,
+                    max_attempts: int = OUTBOX_MAX_ATTEMPTS) -> None:
+        if retry and job["attempts"] < max_attempts:
+            delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (job["attempts"] - 1))
+            self._exec("UPDATE outbox_jobs SET status='queued', last_error=?, next_attempt_at=?, updated_at=? "
+                       "WHERE id=?", (error, time.time() + delay, _now(), job["id"]))
+        else:
+            self._exec("UPDATE outbox_jobs SET status='failed', last_error=?, updated_at=? WHERE id=?",
+                       (error, _now(), job["id"]))
+
+    def mark_uncertain(self, job_id: int, error: str) -> None:
+        self._exec("UPDATE outbox_jobs SET status='uncertain', last_error=?, updated_at=? WHERE id=?",
+                   (error, _now(), job_id))
+
+    # ---------- consultas para la UI ----------
+    def status_counts(self, batch_id: Optional[str] = None) -> Dict[str, int]:
+        sql = "SELECT status, COUNT(*) AS n FROM outbox_jobs"
+        params: List[Any] = []
+        if batch_id:
+            sql += " WHERE batch_id = ?"
+            params.append(batch_id)
+        rows = self._exec(sql + " GROUP BY status", params).fetchall()
+        counts = {s: 0 for s in STATUSES}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+    def jobs(self, batch_id: Optional[str] = None, statuses: Optional[List[str]] = None,
+             limit: int = 200) -> List[Dict[str, Any]]:
+        sql = ("SELECT id, batch_id, to_email, subject, status, attempts, last_error, created_at, sent_at "
+               "FROM outbox_jobs WHERE 1=1")
+        params: List[Any] = []
+        if batch_id:
+            sql += " AND batch_id = ?"
+            params.append(batch_id)
+        if statuses:
+            sql += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(int(limit))
+        return [dict(r) for r in self._exec(sql, params).fetchall()]
+
+
+# ----------------- Worker -----------------
+# send_batch(jobs, report): envía y llama report(job, None) si salió o
+# report(job, (error, reintentable)) si no, apenas conoce el resultado de cada job.
+# reintentable=None: no se sabe si salió (corte durante el envío) -> 'uncertain'.
+Report = Callable[[Dict[str, Any], Any], None]
+SendBatch = Callable[[List[Dict[str, Any]], Report], None]
+
+
+class OutboxWorker(threading.Thread):
+    """Hilo daemon que drena la outbox. Uno por archivo de outbox y por proceso."""
+
+    def __init__(self, box: Outbox, send_batch: SendBatch, poll: float = OUTBOX_POLL_SEC,
+                 batch: int = OUTBOX_BATCH):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.box = box
+        self.send_batch = send_batch
+        self.poll = poll
+        self.batch = batch
+        self._wake = threading.Event()
+        self._halt = threading.Event()
+        self.last_error: Optional[str] = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._halt.set()
+        self._wake.set()
+
+    def _report(self, job: Dict[str, Any], result: Any) -> None:
+        if result is None:
+            self.box.mark_sent(job["id"])
+        else:
+            error, retry = result
+            if retry is None:
+                self.box.mark_uncertain(job["id"], error)
+            else:
+                self.box.mark_failed(job, error, retry)
+
+    def drain_once(self) -> int:
+        jobs = self.box.claim(self.batch)
+        if not jobs:
+            return 0
+        done = set()
+        lock = threading.Lock()
+
+        def report(job: Dict[str, Any], result: Any) -> None:
+            self._report(job, result)
+            with lock:
+                done.add(job["id"])
+
+        try:
+            self.send_batch(jobs, report)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+        # sin resultado no sabemos si salió: mejor 'uncertain' que duplicar
+        for job in jobs:
+            if job["id"] not in done:
+                self.box.mark_uncertain(job["id"], self.last_error or "sin resultado del envío")
+        return len(jobs)
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            try:
+                n = self.drain_once()
+            except Exception as e:  # p.ej. SQLite bloqueado: esperamos y seguimos
+                self.last_error = str(e)
+                n = 0
+            if not n:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+
+
+_WORKERS: Dict[str, OutboxWorker] = {}
+_WORKERS_LOCK = threading.Lock()
+
+
+def start_worker(send_batch: SendBatch, path: str = OUTBOX_PATH) -> OutboxWorker:
+    """Devuelve el worker vivo para `path` o arranca uno (recuperando jobs interrumpidos)."""
+    key = os.path.abspath(path)
+    with _WORKERS_LOCK:
+        worker = _WORKERS.get(key)
+        if worker is not None and worker.is_alive():
+            return worker
+        box = Outbox(path)
+        box.recover()  # ningún hilo vivo tiene jobs en vuelo: lo que quedó en 'sending' es incierto
+        worker = OutboxWorker(box, send_batch)
+        worker.start()
+        _WORKERS[key] = worker
+        return worker
@@ -0,0 +1,41 @@
+# people.py
+"""
+Personas asignadas a cada tarea (owner + collaborators) en formato largo.
+Lo usan la resolución de destinatarios (notify) y la carga por persona (workload).
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def explode_people(df_rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Formato largo: una fila por (tarea, persona) con pos, role ('owner'|'collaborator'),
+    seq (orden dentro de la tarea: owner primero) y name tal como está en la tarea.
+    """
+    n = len(df_rows)
+    pos = np.arange(n)
+    parts = []
+    if "owner" in df_rows:
+        parts.append(pd.DataFrame({"pos": pos, "role": "owner", "seq": 0,
+                                   "name": df_rows["owner"].astype("string").to_numpy()}))
+    if "collaborators" in df_rows:
+        collab = df_rows["collaborators"]
+        if collab.dtype == object and pd.api.types.infer_dtype(collab, skipna=True) not in ("string", "empty"):
+            # listas (vienen así desde la DB) -> CSV, como el resto
+            collab = collab.map(lambda v: ", ".join(map(str, v)) if isinstance(v, list) else v)
+        collab = collab.astype("string").fillna("")
+        # un solo join/split en C en vez de listas por fila; cada nombre hereda su fila vía repeat
+        counts = collab.str.count(",").to_numpy(dtype=np.int64) + 1
+        flat = ",".join(collab.tolist()).split(",")
+        row = np.repeat(pos, counts)
+        seq = np.arange(len(flat)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        names = pd.Series(flat, dtype="string").str.strip()
+        parts.append(pd.DataFrame({"pos": row, "role": "collaborator", "seq": seq, "name": names.to_numpy()}))
+    if not parts:
+        return pd.DataFrame({"pos": pd.Series(dtype=int), "role": pd.Series(dtype=object),
+                             "seq": pd.Series(dtype=int), "name": pd.Series(dtype="string")})
+    people = pd.concat(parts, ignore_index=True)
+    people = people[people["name"].notna() & (people["name"] != "")]
+    return people.sort_values(["pos", "seq"], kind="stable").reset_index(drop=True)
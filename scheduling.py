@@ -0,0 +1,429 @@
+# scheduling.py
+"""
+Grafo de dependencias (predecessors) y ruta crítica sobre arrays NumPy.
+
+- Aristas predecesora -> tarea en formato CSR.
+- Orden topológico con Kahn por niveles: cada nivel es un paso vectorizado, así que
+  el costo total es O(V + E) con tantas vueltas de Python como niveles tenga el grafo.
+- CPM: early/late start y finish, holgura (slack) y ruta crítica. Dependencias
+  fin->inicio sin lag sobre la misma escala de días que dibuja el Gantt
+  (una sucesora puede empezar el día en que termina su predecesora).
+- Con un workcal.WorkCalendar las duraciones y la holgura son días hábiles: DayMath
+  reemplaza las sumas/restas de días por np.busday_offset agrupado por calendario.
+- Los nodos que quedan fuera del orden están en un ciclo o dependen de uno: se reportan
+  y quedan sin fechas calculadas.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NAT_DAY = np.iinfo(np.int64).min  # marcador interno de "sin fecha"
+SMALL_FRONTIER = 8       # hasta este tamaño, Kahn avanza con ints de Python
+LEVEL_COST = 100         # un paso vectorizado cuesta ~ lo que 100 nodos/aristas en Python
+
+
+# ----------------- Parseo -----------------
+def parse_predecessors(s: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    CSV de ids por fila ("12, 15") -> (posición de la fila, id predecesor) por arista.
+    Un solo join/split para toda la columna; valores no numéricos se ignoran.
+    """
+    if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+        s = s.map(lambda v: ",".join(map(str, v)) if isinstance(v, (list, tuple, np.ndarray)) else v)
+    if not len(s):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    s = s.astype("string").fillna("")
+    counts = s.str.count(",").to_numpy(dtype=np.int64) + 1
+    flat = pd.Series(",".join(s.tolist()).split(","), dtype="string").str.strip()
+    ids = pd.to_numeric(flat, errors="coerce").to_numpy(dtype=float)
+    rows = np.repeat(np.arange(len(s)), counts)
+    ok = ~np.isnan(ids)
+    return rows[ok], ids[ok].astype(np.int64)
+
+
+# ----------------- Grafo -----------------
+def _gather(indptr: np.ndarray, values: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatena las listas CSR de `nodes` (con repetidos). Retorna (valores, cantidad por nodo)."""
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64), counts
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return values[offsets + np.arange(total)], counts
+
+
+def _csr(keys: np.ndarray, values: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(keys, kind="stable")
+    return np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=n)))), values[order]
+
+
+class TaskGraph:
+    """DAG de tareas por posición (0..n-1) con adyacencia CSR hacia sucesoras y predecesoras."""
+
+    def __init__(self, ids: np.ndarray, src: np.ndarray, dst: np.ndarray,
+                 missing: Optional[List[Tuple[Optional[int], int]]] = None):
+        self.ids = ids
+        self.n = len(ids)
+        self.src = src
+        self.dst = dst
+        self.missing = missing or []  # [(id tarea, id predecesor inexistente)]
+        self.indptr, self.succ = _csr(src, dst, self.n)
+        self.pptr, self.pred = _csr(dst, src, self.n)
+        self.levels = self._levels()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "TaskGraph":
+        """Grafo desde las columnas id/predecessors; los predecesores inexistentes quedan en .missing."""
+        ids = pd.to_numeric(df["id"], errors="coerce").to_numpy(dtype=float)
+        rows, pred_ids = parse_predecessors(df["predecessors"]) if "predecessors" in df else (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        # id -> posición con búsqueda binaria (sin dict de Python)
+        valid = np.flatnonzero(~np.isnan(ids))
+        by_id = valid[np.argsort(ids[valid], kind="stable")]
+        sorted_ids = ids[by_id]
+        at = np.searchsorted(sorted_ids, pred_ids)
+        found = (at < len(sorted_ids)) & (sorted_ids[np.minimum(at, len(sorted_ids) - 1)] == pred_ids) \
+            if len(sorted_ids) else np.zeros(len(pred_ids), dtype=bool)
+        missing = [(None if np.isnan(t) else int(t), int(p))
+                   for t, p in zip(ids[rows[~found]].tolist(), pred_ids[~found].tolist())]
+        src = by_id[at[found]] if len(sorted_ids) else np.empty(0, dtype=np.int64)
+        dst = rows[found]
+        # aristas repetidas no cambian nada
+        if len(src):
+            key = np.unique(src.astype(np.int64) * len(ids) + dst)
+            src, dst = key // len(ids), key % len(ids)
+        return cls(ids, src.astype(np.int64), dst.astype(np.int64), missing)
+
+    def successors_of(self, nodes: np.ndarray) -> np.ndarray:
+        """Sucesoras (con repetidos) de un conjunto de nodos, sin loop de Python."""
+        return _gather(self.indptr, self.succ, nodes)[0]
+
+    def predecessors_of(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(predecesoras concatenadas, cantidad por nodo) en el orden de `nodes`."""
+        return _gather(self.pptr, self.pred, nodes)
+
+    def _walk(self, frontier: np.ndarray, visit: Callable[[np.ndarray], None],
+              step: Callable[[int], List[int]], step_many: Callable[[np.ndarray], np.ndarray]) -> None:
+        # recorrido por frentes: vectorizado si el frente es ancho, con ints de Python si es chico
+        while len(frontier):
+            visit(frontier)
+            if len(frontier) <= SMALL_FRONTIER:
+                frontier = np.asarray([w for v in frontier.tolist() for w in step(v)], dtype=np.int64)
+                if len(frontier) > 1:
+                    frontier = np.unique(frontier)
+            else:
+                frontier = step_many(frontier)
+
+    def _levels(self) -> np.ndarray:
+        """Kahn por niveles: level[i] = longitud del camino más largo que llega a i (-1 si hay ciclo)."""
+        indeg = np.bincount(self.dst, minlength=self.n)
+        level = np.full(self.n, -1, dtype=np.int64)
+        depth = [0]
+
+        def visit(frontier: np.ndarray) -> None:
+            level[frontier] = depth[0]
+            depth[0] += 1
+
+        def step(v: int) -> List[int]:
+            out = []
+            for w in self.succ[self.indptr[v]:self.indptr[v + 1]].tolist():
+                indeg[w] -= 1
+                if not indeg[w]:
+                    out.append(w)
+            return out
+
+        def step_many(frontier: np.ndarray) -> np.ndarray:
+            nxt = self.successors_of(frontier)
+            np.subtract.at(indeg, nxt, 1)
+            return np.unique(nxt[indeg[nxt] == 0])
+
+        self._walk(np.flatnonzero(indeg == 0), visit, step, step_many)
+        return level
+
+    def downstream(self, seeds: np.ndarray) -> np.ndarray:
+        """Posiciones alcanzables desde `seeds` siguiendo sucesoras (incluye las seeds), ordenadas."""
+        seen = np.zeros(self.n, dtype=bool)
+
+        def visit(frontier: np.ndarray) -> None:
+            seen[frontier] = True
+
+        def step(v: int) -> List[int]:
+            return [w for w in self.succ[self.indptr[v]:self.indptr[v + 1]].tolist() if not seen[w]]
+
+        def step_many(frontier: np.ndarray) -> np.ndarray:
+            nxt = np.unique(self.successors_of(frontier))
+            return nxt[~seen[nxt]]
+
+        self._walk(np.unique(np.asarray(seeds, dtype=np.int64)), visit, step, step_many)
+        return np.flatnonzero(seen)
+
+    @property
+    def order(self) -> np.ndarray:
+        """Orden topológico (posiciones), sin los nodos afectados por ciclos."""
+        ok = np.flatnonzero(self.levels >= 0)
+        return ok[np.argsort(self.levels[ok], kind="stable")]
+
+    def cycle_nodes(self) -> np.ndarray:
+        """
+        Nodos que están en un ciclo (o entre dos): de los que Kahn no pudo ordenar, se podan
+        en reversa los que no tienen sucesoras pendientes; lo que queda forma los ciclos.
+        """
+        left = self.levels < 0
+        if not left.any():
+            return np.empty(0, dtype=np.int64)
+        keep = left[self.src] & left[self.dst]
+        src, dst = self.src[keep], self.dst[keep]
+        outdeg = np.bincount(src, minlength=self.n)
+        alive = left.copy()
+        pptr, pred = _csr(dst, src, self.n)  # predecesoras dentro de lo no ordenado
+        frontier = np.flatnonzero(alive & (outdeg == 0))
+        while len(frontier):
+            alive[frontier] = False
+            prev = _gather(pptr, pred, frontier)[0]
+            if not len(prev):
+                break
+            uniq, dec = np.unique(prev, return_counts=True)
+            outdeg[uniq] -= dec
+            frontier = uniq[alive[uniq] & (outdeg[uniq] == 0)]
+        return np.flatnonzero(alive)
+
+
+# ----------------- CPM -----------------
+def _days(s: pd.Series) -> np.ndarray:
+    v = s.to_numpy("datetime64[D]")
+    out = v.astype(np.int64)
+    out[np.isnat(v)] = NAT_DAY
+    return out
+
+
+class DayMath:
+    """
+    Aritmética de fechas (días enteros desde epoch) de las pasadas: días corridos, o días hábiles
+    de workcal.WorkCalendar con el calendario de cada tarea (columna workstream).
+    fwd(at, d, n): d llevado a día hábil y corrido n días; bwd(at, d, n): n días hábiles antes de d.
+    """
+
+    def __init__(self, df: pd.DataFrame, calendar: Optional[Any] = None):
+        self.calendar = calendar
+        self.codes = (calendar.codes(df["workstream"] if "workstream" in df else None, len(df))
+                      if calendar is not None else None)
+
+    def duration(self, at: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        if self.calendar is None:
+            return np.maximum(end - start, 0)
+        return np.maximum(self.calendar.count_days(start, end, self.codes[at]), 0)
+
+    def fwd(self, at: np.ndarray, d: np.ndarray, n: np.ndarray) -> np.ndarray:
+        if self.calendar is None:
+            return d + n
+        return self.calendar.offset_days(d, n, self.codes[at], "forward")
+
+    def bwd(self, at: np.ndarray, d: np.ndarray, n: np.ndarray) -> np.ndarray:
+        if self.calendar is None:
+            return d - n
+        return self.calendar.offset_days(d, -np.asarray(n), self.codes[at], "backward")
+
+    def between(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """b - a en días (hábiles con calendario)."""
+        if self.calendar is None:
+            return b - a
+        return self.calendar.count_days(a, b, self.codes)
+
+    def fwd1(self, v: int, d: int, n: int) -> int:
+        if self.calendar is None:
+            return d + n
+        cal = self.calendar.calendars[self.codes[v]]
+        return int(np.busday_offset(np.datetime64(d, "D"), n, roll="forward", busdaycal=cal).astype(np.int64))
+
+    def bwd1(self, v: int, d: int, n: int) -> int:
+        if self.calendar is None:
+            return d - n
+        cal = self.calendar.calendars[self.codes[v]]
+        return int(np.busday_offset(np.datetime64(d, "D"), -n, roll="backward", busdaycal=cal).astype(np.int64))
+
+
+def _passes_by_level(level, nodes, n_levels, src, dst, ok, anchor, dur, origin, math: DayMath):
+    """Pasadas hacia adelante/atrás con un paso vectorizado por nivel (grafos anchos)."""
+    # aristas agrupadas por nivel de la sucesora (adelante) y de la predecesora (atrás)
+    node_cut = np.searchsorted(level[nodes], np.arange(n_levels + 1))
+    fwd = np.argsort(level[dst], kind="stable")
+    fwd_cut = np.searchsorted(level[dst][fwd], np.arange(n_levels + 1))
+    bwd = np.argsort(level[src], kind="stable")
+    bwd_cut = np.searchsorted(level[src][bwd], np.arange(n_levels + 1))
+    everyone = np.arange(len(level))
+
+    es = anchor.copy()
+    ef = math.fwd(everyone, es, dur)
+    for lv in range(1, n_levels):
+        e = fwd[fwd_cut[lv]:fwd_cut[lv + 1]]
+        np.maximum.at(es, dst[e], ef[src[e]])
+        at = nodes[node_cut[lv]:node_cut[lv + 1]]
+        es[at] = math.fwd(at, es[at], 0)
+        ef[at] = math.fwd(at, es[at], dur[at])
+
+    finish = ef[ok].max() if ok.any() else origin
+    lf = np.full(len(level), finish, dtype=np.int64)
+    ls = math.bwd(everyone, lf, dur)
+    for lv in range(n_levels - 1, -1, -1):
+        at = nodes[node_cut[lv]:node_cut[lv + 1]]
+        e = bwd[bwd_cut[lv]:bwd_cut[lv + 1]]
+        if len(e):
+            np.minimum.at(lf, src[e], ls[dst[e]])
+        ls[at] = math.bwd(at, lf[at], dur[at])
+    return es, ef, ls, lf
+
+
+def _passes_sequential(nodes, src, dst, anchor, dur, origin, math: DayMath):
+    """Mismas pasadas recorriendo el orden topológico con listas (grafos profundos y angostos)."""
+    succ = dst[np.argsort(src, kind="stable")].tolist()
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=len(anchor))))).tolist()
+    order, d = nodes.tolist(), dur.tolist()
+    fwd1, bwd1 = math.fwd1, math.bwd1
+    es = anchor.tolist()
+    ef = [0] * len(es)
+    for v in order:
+        es[v] = fwd1(v, es[v], 0)
+        f = ef[v] = fwd1(v, es[v], d[v])
+        for w in succ[indptr[v]:indptr[v + 1]]:
+            if f > es[w]:
+                es[w] = f
+    finish = max((ef[v] for v in order), default=origin)
+    lf = [finish] * len(es)
+    ls = math.bwd(np.arange(len(es)), np.asarray(lf, dtype=np.int64), dur).tolist()
+    for v in reversed(order):
+        s = lf[v]
+        for w in succ[indptr[v]:indptr[v + 1]]:
+            if ls[w] < s:
+                s = ls[w]
+        lf[v], ls[v] = s, bwd1(v, s, d[v])
+    return tuple(np.asarray(x, dtype=np.int64) for x in (es, ef, ls, lf))
+
+
+def critical_path(df: pd.DataFrame, graph: Optional[TaskGraph] = None,
+                  calendar: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Early/late start-finish, holgura y ruta crítica de todas las tareas.
+    Con `calendar` (workcal.WorkCalendar) duraciones, corrimientos y holgura van en días hábiles
+    del calendario de cada tarea; sin él, en días corridos.
+    Retorna {
+      'schedule': DataFrame alineado con df [es, ef, ls, lf, slack_days, critical, level],
+      'cycles': ids en ciclos, 'blocked': ids que dependen de un ciclo,
+      'missing': [(id tarea, id predecesor inexistente)], 'edges': cantidad de aristas,
+      'links': DataFrame [from, to] con las aristas como labels del índice de df,
+    }
+    Tareas sin inicio usan el inicio más temprano del portfolio; sin fin, duración 0.
+    """
+    if graph is None:
+        graph = TaskGraph.from_frame(df)
+    math = DayMath(df, calendar)
+    start, end = _days(df["start"]), _days(df["end"])
+    has_start, has_end = start != NAT_DAY, end != NAT_DAY
+    origin = start[has_start].min() if has_start.any() else 0
+    anchor = math.fwd(np.arange(len(df)), np.where(has_start, start, origin), 0)
+    both = has_start & has_end
+    dur = np.zeros(len(df), dtype=np.int64)
+    at = np.flatnonzero(both)
+    dur[at] = math.duration(at, start[at], end[at])
+
+    level = graph.levels
+    ok = level >= 0
+    src, dst = graph.src, graph.dst
+    e_ok = ok[src] & ok[dst]
+    src, dst = src[e_ok], dst[e_ok]
+
+    nodes = np.flatnonzero(ok)
+    nodes = nodes[np.argsort(level[nodes], kind="stable")]  # orden topológico
+    n_levels = int(level.max()) + 1 if ok.any() else 0
+    if n_levels * LEVEL_COST > len(nodes) + len(src):
+        es, ef, ls, lf = _passes_sequential(nodes, src, dst, anchor, dur, origin, math)
+    else:
+        es, ef, ls, lf = _passes_by_level(level, nodes, n_levels, src, dst, ok, anchor, dur, origin, math)
+
+    slack = math.between(es, ls)
+
+    def _dates(v: np.ndarray) -> pd.Series:
+        # resolución de segundos: un cronograma largo no desborda el rango de datetime64[ns]
+        out = pd.Series(v.astype("datetime64[D]").astype("datetime64[s]"), index=df.index)
+        return out.where(ok)
+
+    schedule = pd.DataFrame({
+        "es": _dates(es), "ef": _dates(ef), "ls": _dates(ls), "lf": _dates(lf),
+        "slack_days": pd.Series(slack, index=df.index, dtype="Int64").where(ok),
+        "critical": pd.Series(ok & (slack <= 0), index=df.index),
+        "level": pd.Series(level, index=df.index),
+    })
+    cyc = graph.cycle_nodes()
+    blocked = np.setdiff1d(np.flatnonzero(~ok), cyc)
+    ids = graph.ids
+
+    def _id_list(pos: np.ndarray) -> List[int]:
+        v = ids[pos]
+        return v[~np.isnan(v)].astype(np.int64).tolist()
+
+    links = pd.DataFrame({"from": df.index[graph.src], "to": df.index[graph.dst]})
+    return {"schedule": schedule, "cycles": _id_list(cyc), "blocked": _id_list(blocked),
+            "missing": graph.missing, "edges": int(len(graph.src)), "links": links}
+
+
+# ----------------- Reprogramación incremental -----------------
+def propagate_dates(df: pd.DataFrame, seeds: np.ndarray, graph: TaskGraph,
+                    pinned: Optional[np.ndarray] = None, calendar: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Corre hacia adelante las sucesoras (directas e indirectas) de `seeds` (posiciones) para que
+    ninguna empiece antes de que termine alguna de sus predecesoras, conservando su duración.
+    Solo se recorre el subgrafo aguas abajo de las seeds. Las posiciones `pinned` (fechas
+    editadas a mano) no se mueven pero sí empujan. Nunca adelanta una tarea.
+    Con `calendar` la duración se conserva en días hábiles y una tarea corrida arranca en día hábil.
+    Retorna {'moved': posiciones corridas, 'start'/'end': fechas nuevas de esas posiciones,
+             'affected': tamaño del subgrafo recorrido}.
+    """
+    start, end = _days(df["start"]), _days(df["end"])
+    fixed = np.zeros(graph.n, dtype=bool)
+    if pinned is not None:
+        fixed[np.asarray(pinned, dtype=np.int64)] = True
+    reach = graph.downstream(seeds)
+    level = graph.levels
+    # sin fechas no hay nada que correr; en un ciclo no hay orden para propagar
+    movable = reach[(level[reach] >= 0) & ~fixed[reach] & (start[reach] != NAT_DAY) & (end[reach] != NAT_DAY)]
+    movable = movable[np.argsort(level[movable], kind="stable")]
+    preds, counts = graph.predecessors_of(movable)
+    eptr = np.concatenate(([0], np.cumsum(counts)))
+    math = DayMath(df, calendar)
+    dur = np.zeros(graph.n, dtype=np.int64)
+    dur[movable] = math.duration(movable, start[movable], end[movable])
+
+    new_start, new_end = start.copy(), end.copy()  # NAT_DAY como fin nunca empuja
+    cuts = np.flatnonzero(np.diff(level[movable])) + 1
+    bounds = np.concatenate(([0], cuts, [len(movable)])) if len(movable) else np.zeros(1, dtype=np.int64)
+    if (len(bounds) - 1) * LEVEL_COST > len(movable) + len(preds):
+        pl, ep = preds.tolist(), eptr.tolist()
+        for k, v in enumerate(movable.tolist()):
+            s = int(new_start[v])
+            for p in pl[ep[k]:ep[k + 1]]:
+                f = int(new_end[p])
+                if f > s:
+                    s = f
+            if s != start[v]:
+                s = math.fwd1(v, s, 0)
+                new_start[v], new_end[v] = s, math.fwd1(v, s, int(dur[v]))
+    else:
+        owner = np.repeat(movable, counts)
+        for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            e = slice(eptr[a], eptr[b])
+            np.maximum.at(new_start, owner[e], new_end[preds[e]])
+            at = movable[a:b]
+            at = at[new_start[at] != start[at]]  # las que no se corren conservan sus fechas
+            new_start[at] = math.fwd(at, new_start[at], 0)
+            new_end[at] = math.fwd(at, new_start[at], dur[at])
+
+    moved = movable[new_start[movable] != start[movable]]
+    moved.sort()
+
+    def _dates(v: np.ndarray) -> np.ndarray:
+        return v.astype("datetime64[D]").astype("datetime64[s]")
+
+    return {"moved": moved, "start": _dates(new_start[moved]), "end": _dates(new_end[moved]),
+            "affected": int(len(reach))}
@@ -3,6 +3,8 @@ import os
 from supabase import create_client, Client
 import streamlit as st
 
+import batch
+
 
 
 
@@ -17,14 +19,17 @@ TABLE = "tasks"
 def fetch_all():
     return supabase.table(TABLE).select("*").execute().data
 
+# Escrituras por lotes (ver batch.write_chunks): devuelven el resumen por chunk
 def insert_rows(rows: list[dict]):
     if rows:
-        return supabase.table(TABLE).insert(rows).execute()
+        return batch.write_chunks(lambda chunk: supabase.table(TABLE).insert(chunk).execute(),
+                                  rows, idempotent=False)
 
 def upsert_rows(rows: list[dict]):
     if rows:
-        return supabase.table(TABLE).upsert(rows).execute()
+        return batch.write_chunks(lambda chunk: supabase.table(TABLE).upsert(chunk).execute(), rows)
 
 def delete_by_ids(ids: list[int]):
     if ids:
-        return supabase.table(TABLE).delete().in_("id", ids).execute()
+        return batch.write_chunks(lambda chunk: supabase.table(TABLE).delete().in_("id", chunk).execute(),
+                                  ids, chunk_size=batch.DELETE_CHUNK_SIZE)
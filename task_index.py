@@ -0,0 +1,100 @@
+# task_index.py
+"""
+Índice en memoria de un snapshot de tareas para los filtros de la barra lateral.
+Se construye una vez por snapshot y cada combinación de filtros se resuelve con
+intersecciones de bitmaps (bits empaquetados) y búsquedas binarias sobre fechas ordenadas.
+Mismos resultados que main.filter_tasks.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# filtro de la barra lateral -> columna con bitmap por valor
+BITMAP_FILTERS = {
+    "projects": "project_name",
+    "statuses": "status",
+    "priorities": "priority",
+    "rags": "rag",
+}
+
+
+class TaskFilterIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        self._nbytes = (self.n + 7) // 8
+        self._all = np.packbits(np.ones(self.n, dtype=bool))
+
+        # bitmaps por valor (los nulos no tienen bitmap: isin nunca los matchea)
+        self._bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        for col in BITMAP_FILTERS.values():
+            codes, uniques = pd.factorize(df[col].astype(object), sort=False)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            per_value = {}
+            for k, value in enumerate(uniques):
+                per_value[value] = self._pack(order[bounds[k]:bounds[k + 1]])
+            self._bitmaps[col] = per_value
+
+        # owner: códigos contra los valores únicos en mayúsculas (como str.contains(case=False))
+        owner_codes, owner_uniques = pd.factorize(df["owner"].astype(object), sort=False)
+        self._owner_codes = owner_codes
+        self._owner_upper = [str(v).upper() for v in owner_uniques]
+
+        # fechas ordenadas + rango de cada fila en ese orden: un límite de fecha se vuelve
+        # una búsqueda binaria y una comparación de enteros. Los NaT pasan siempre el filtro.
+        self._end_sorted, self._end_rank = self._ranked_dates(df["end"])
+        self._start_sorted, self._start_rank = self._ranked_dates(df["start"])
+
+    def _pack(self, positions: np.ndarray) -> np.ndarray:
+        bits = np.zeros(self.n, dtype=bool)
+        bits[positions] = True
+        return np.packbits(bits)
+
+    @staticmethod
+    def _ranked_dates(s: pd.Series):
+        values = s.to_numpy("datetime64[ns]")
+        order = np.argsort(values, kind="stable")  # NaT queda al final
+        n_valid = int((~np.isnat(values)).sum())
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[order] = np.arange(len(values))
+        return values[order[:n_valid]], rank
+
+    def _any_of(self, col: str, values: Iterable[Any]) -> np.ndarray:
+        maps = self._bitmaps[col]
+        hits = [maps[v] for v in values if v in maps]
+        if not hits:
+            return np.zeros(self._nbytes, dtype=np.uint8)
+        return np.bitwise_or.reduce(hits)
+
+    def _owner_contains(self, pattern: str) -> np.ndarray:
+        pat = pattern.upper()
+        matched = np.fromiter((pat in v for v in self._owner_upper), dtype=bool, count=len(self._owner_upper))
+        # código -1 (owner nulo) nunca matchea
+        lookup = np.append(matched, False)
+        return np.packbits(lookup[self._owner_codes])
+
+    def _date_bound(self, sorted_vals: np.ndarray, rank: np.ndarray, bound: Any, keep_greater: bool) -> np.ndarray:
+        b = np.datetime64(pd.Timestamp(bound).to_datetime64(), "ns")
+        n_valid = len(sorted_vals)
+        if keep_greater:  # valor >= bound, o NaT (rank >= n_valid)
+            return np.packbits(rank >= np.searchsorted(sorted_vals, b, side="left"))
+        # valor <= bound, o NaT
+        cut = np.searchsorted(sorted_vals, b, side="right")
+        return np.packbits((rank < cut) | (rank >= n_valid))
+
+    def query(self, filters: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Posiciones (iloc) de las filas que cumplen los filtros, en el orden del snapshot."""
+        f = filters or {}
+        bits = self._all
+        for key, col in BITMAP_FILTERS.items():
+            if f.get(key):
+                bits = bits & self._any_of(col, f[key])
+        if f.get("owner"):
+            bits = bits & self._owner_contains(str(f["owner"]))
+        if f.get("start_after") is not None:
+            bits = bits & self._date_bound(self._end_sorted, self._end_rank, f["start_after"], keep_greater=True)
+        if f.get("end_before") is not None:
+            bits = bits & self._date_bound(self._start_sorted, self._start_rank, f["end_before"], keep_greater=False)
+        return np.flatnonzero(np.unpackbits(bits, count=self.n))
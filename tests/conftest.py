@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# los módulos del repo son planos (sin paquete): se importan desde la raíz
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def connect(monkeypatch, tmp_path):
+    """
+    connect(client, mirror=True): main usa `client` como conexión a Supabase y un mirror local
+    en tmp_path (o ninguno). Las pruebas de una vez por proceso (RPC, columnas) arrancan sin decidir.
+    """
+    import main
+    from local_mirror import LocalMirror
+
+    def _connect(client, mirror=True):
+        box = LocalMirror(str(tmp_path / "mirror")) if mirror else None
+        monkeypatch.setattr(main, "get_sb", lambda: client)
+        monkeypatch.setattr(main, "local_mirror", lambda: box)
+        monkeypatch.setitem(main._save_rpc, "available", None)
+        monkeypatch.setitem(main._predecessors_col, "available", None)
+        monkeypatch.setitem(main._connection, "lost_at", None)
+        return box
+    return _connect
@@ -0,0 +1,144 @@
+"""Cliente falso con la parte de la API de supabase-py/postgrest que usa main (select/escrituras/filtros)."""
+from __future__ import annotations
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from postgrest.exceptions import APIError
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeClient", table: str):
+        self.client = client
+        self.table = table
+        self.columns = "*"
+        self.count: Optional[str] = None
+        self.filters: List[Any] = []
+        self.order_by: Optional[tuple] = None
+        self.n: Optional[int] = None
+        self.op = "select"
+        self.rows: List[Dict[str, Any]] = []
+
+    def insert(self, rows: List[Dict[str, Any]]) -> "FakeQuery":
+        self.op, self.rows = "insert", list(rows)
+        return self
+
+    def upsert(self, rows: List[Dict[str, Any]], on_conflict: str = "id") -> "FakeQuery":
+        self.op, self.rows = "upsert", list(rows)
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self.op = "delete"
+        return self
+
+    def select(self, *columns: str, count: Optional[str] = None) -> "FakeQuery":
+        self.columns = ",".join(columns)
+        self.count = count
+        return self
+
+    def _f(self, col: str, test) -> "FakeQuery":
+        self.filters.append(lambda r: r.get(col) is not None and test(r[col]))
+        return self
+
+    def eq(self, col, v): return self._f(col, lambda x: x == v)
+    def gt(self, col, v): return self._f(col, lambda x: x > v)
+    def gte(self, col, v): return self._f(col, lambda x: x >= v)
+    def lt(self, col, v): return self._f(col, lambda x: x < v)
+    def lte(self, col, v): return self._f(col, lambda x: x <= v)
+    def in_(self, col, vs): return self._f(col, lambda x: x in set(vs))
+
+    def order(self, col: str, desc: bool = False) -> "FakeQuery":
+        self.order_by = (col, desc)
+        return self
+
+    def limit(self, n: int) -> "FakeQuery":
+        self.n = n
+        return self
+
+    def execute(self) -> SimpleNamespace:
+        with self.client.lock:
+            self.client.requests.append(self)
+        if self.op != "select":
+            return self._write()
+        missing = self.client.missing_columns & {c.strip() for c in self.columns.split(",")}
+        if missing:
+            raise APIError({"code": "42703", "message": f"column tasks.{missing.pop()} does not exist"})
+        rows = [r for r in self.client.tables[self.table] if all(f(r) for f in self.filters)]
+        if self.order_by:
+            col, desc = self.order_by
+            rows.sort(key=lambda r: r[col], reverse=desc)
+        total = len(rows)
+        # como PostgREST: max-rows recorta aunque el limit pedido sea mayor
+        caps = [x for x in (self.n, self.client.max_rows) if x]
+        rows = rows[:min(caps)] if caps else rows
+        if self.columns not in ("*", ""):
+            keep = [c.strip() for c in self.columns.split(",")]
+            rows = [{k: r.get(k) for k in keep} for r in rows]
+        return SimpleNamespace(data=[dict(r) for r in rows], count=total if self.count else None)
+
+    def _write(self) -> SimpleNamespace:
+        table = self.client.tables[self.table]
+        for r in self.rows:
+            unknown = self.client.missing_columns & set(r)
+            if unknown:
+                raise APIError({"code": "PGRST204", "message": f"Could not find the '{unknown.pop()}' column"})
+        with self.client.lock:
+            if self.op == "delete":
+                gone = [r for r in table if all(f(r) for f in self.filters)]
+                table[:] = [r for r in table if r not in gone]
+                return SimpleNamespace(data=gone, count=None)
+            out = []
+            for r in self.rows:
+                r = dict(r)
+                if "id" not in r:
+                    r["id"] = max([0, *(x["id"] for x in table)]) + 1
+                current = next((x for x in table if x["id"] == r["id"]), None)
+                if current is None:
+                    table.append(r)
+                else:
+                    current.update(r)
+                out.append(r)
+            return SimpleNamespace(data=out, count=None)
+
+
+class FakeClient:
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], max_rows: Optional[int] = None,
+                 missing_columns: Iterable[str] = (), rpc: Optional[Callable[..., Any]] = None):
+        self.tables = tables
+        self.max_rows = max_rows
+        self.missing_columns = set(missing_columns)
+        self.rpc_impl = rpc  # rpc(client, params) -> data; None: la función no existe
+        self.requests: List[FakeQuery] = []
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> Any:
+        def execute() -> SimpleNamespace:
+            with self.lock:
+                self.requests.append(SimpleNamespace(op="rpc", name=name, params=params, rows=[]))
+            if self.rpc_impl is None:
+                raise APIError({"code": "PGRST202", "message": f"Could not find the function public.{name}"})
+            return SimpleNamespace(data=self.rpc_impl(self, params))
+        return SimpleNamespace(execute=execute)
+
+
+def save_if_unchanged_rpc(client: FakeClient, params: Dict[str, Any]) -> Dict[str, Any]:
+    """tasks_save_if_unchanged: aplica cada cambio solo si updated_at sigue siendo el esperado."""
+    table = client.tables["tasks"]
+    applied, touched = [], set()
+    with client.lock:
+        for c in params["changes"]:
+            touched.add(c["id"])
+            row = next((r for r in table if r["id"] == c["id"]), None)
+            if row is None or row.get("updated_at") != c["expected"]:
+                continue
+            if c["op"] == "delete":
+                table.remove(row)
+            else:
+                row.update(c["patch"])
+                row["updated_at"] = "2099-01-01T00:00:00+00:00"  # el trigger la mueve
+            applied.append(c["id"])
+        conflicts = [dict(r) for r in table if r["id"] in touched and r["id"] not in applied]
+    return {"applied": applied, "conflicts": conflicts}
@@ -0,0 +1,91 @@
+import threading
+
+import httpx
+import pytest
+
+import batch
+from batch import APIError
+
+
+def _no_sleep(_):
+    pass
+
+
+class Sender:
+    """send(chunk) falso: falla según `fail(chunk, intento)` y registra cada llamada."""
+
+    def __init__(self, fail=lambda chunk, attempt: None):
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, chunk):
+        with self.lock:
+            self.calls.append(list(chunk))
+            attempt = sum(1 for c in self.calls if c == list(chunk))
+        exc = self.fail(chunk, attempt)
+        if exc is not None:
+            raise exc
+
+
+def test_chunks_and_counts():
+    send = Sender()
+    res = batch.write_chunks(send, list(range(10)), chunk_size=3, sleep=_no_sleep)
+    assert res["ok"] and res["written"] == 10 and res["failed"] == []
+    assert sorted(map(tuple, send.calls)) == [(0, 1, 2), (3, 4, 5), (6, 7, 8), (9,)]
+
+
+def test_empty():
+    assert batch.write_chunks(Sender(), []) == {"ok": True, "written": 0, "chunks": [], "failed": []}
+
+
+def test_transient_error_is_retried_with_backoff():
+    send = Sender(lambda chunk, attempt: APIError({"code": "40001", "message": "serialization"})
+                  if attempt < 3 else None)
+    delays = []
+    res = batch.write_chunks(send, [1, 2], chunk_size=5, sleep=delays.append)
+    assert res["ok"] and res["chunks"][0]["attempts"] == 3
+    assert len(delays) == 2 and delays[1] >= delays[0]  # backoff exponencial (con jitter)
+
+
+def test_transient_error_gives_up_after_retries_without_bisecting():
+    send = Sender(lambda chunk, attempt: httpx.ReadTimeout("timeout"))
+    res = batch.write_chunks(send, [1, 2, 3, 4], chunk_size=4, retries=2, sleep=_no_sleep)
+    assert not res["ok"] and res["written"] == 0
+    assert len(res["chunks"]) == 1 and res["chunks"][0]["transient"] and res["chunks"][0]["attempts"] == 3
+    assert [item for item, _ in res["failed"]] == [1, 2, 3, 4]
+
+
+def test_permanent_error_bisects_to_bad_rows():
+    bad = {3, 6}
+    send = Sender(lambda chunk, attempt: APIError({"code": "23502", "message": "null value"})
+                  if bad & set(chunk) else None)
+    res = batch.write_chunks(send, list(range(8)), chunk_size=8, sleep=_no_sleep)
+    assert not res["ok"] and res["written"] == 6
+    assert sorted(item for item, _ in res["failed"]) == [3, 6]
+    assert all(err["code"] == "23502" for _, err in res["failed"])
+    assert all(c["attempts"] == 1 for c in res["chunks"])  # sin reintentos en errores permanentes
+
+
+def test_isolate_false_reports_whole_chunk():
+    send = Sender(lambda chunk, attempt: APIError({"code": "23505", "message": "dup"}) if 1 in chunk else None)
+    res = batch.write_chunks(send, [0, 1, 2], chunk_size=3, isolate=False, sleep=_no_sleep)
+    assert [item for item, _ in res["failed"]] == [0, 1, 2] and len(send.calls) == 1
+
+
+@pytest.mark.parametrize("exc,retried", [
+    (httpx.ConnectError("down"), True),      # no llegó al server: seguro reintentar
+    (httpx.ConnectTimeout("slow"), True),
+    (httpx.ReadTimeout("lost"), False),      # pudo haberse aplicado
+    (httpx.RemoteProtocolError("eof"), False),
+])
+def test_non_idempotent_only_retries_when_request_never_arrived(exc, retried):
+    send = Sender(lambda chunk, attempt: exc if attempt == 1 else None)
+    res = batch.write_chunks(send, [1], idempotent=False, sleep=_no_sleep)
+    assert res["ok"] is retried
+    assert len(send.calls) == (2 if retried else 1)
+
+
+def test_idempotent_retries_any_transport_error():
+    send = Sender(lambda chunk, attempt: httpx.ReadTimeout("lost") if attempt == 1 else None)
+    assert batch.write_chunks(send, [1], sleep=_no_sleep)["ok"]
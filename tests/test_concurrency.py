@@ -0,0 +1,82 @@
+import httpx
+import pandas as pd
+from postgrest.exceptions import APIError
+
+import main
+from fake_supabase import FakeClient, save_if_unchanged_rpc
+
+V0 = "2026-03-01T10:00:00+00:00"
+
+
+def _server():
+    return [{"id": i, "project_name": "A", "task": f"t{i}", "progress": 0, "updated_at": V0} for i in (1, 2, 3)]
+
+
+def _loaded():
+    base = main.df_from_supabase(_server())
+    versions = pd.Series([V0] * 3, index=pd.Index([1, 2, 3], name="id"), dtype=object)
+    return base, versions
+
+
+def _edit(base, **progress):
+    after = base.copy()
+    for task_id, value in progress.items():
+        after.loc[after["id"] == int(task_id[1:]), "progress"] = value
+    return after
+
+
+def _progress(sb):
+    return {r["id"]: r["progress"] for r in sb.tables[main.TABLE]}
+
+
+def test_conflicting_rows_are_held_not_overwritten(connect):
+    sb = FakeClient({main.TABLE: _server()}, rpc=save_if_unchanged_rpc)
+    mirror = connect(sb)
+    base, versions = _loaded()
+    sb.tables[main.TABLE][1].update(progress=99, updated_at="2026-03-02T09:00:00+00:00")  # otra sesión
+
+    assert main.upsert_tasks(_edit(base, t1=10, t2=20), base=base, versions=versions)
+    assert _progress(sb) == {1: 10, 2: 99, 3: 0}
+    (held,) = mirror.pending(["conflict"])
+    assert held["row_id"] == 2 and held["payload"] == {"progress": 20}
+    assert held["server_row"]["progress"] == 99
+    # una sola RPC para todos los cambios (más la prueba de que existe), sin escrituras por fila
+    assert [q.op for q in sb.requests if q.op != "select"] == ["rpc", "rpc"]
+
+    assert main.resolve_offline([2], keep="local") == 1
+    assert main.replay_offline()["sent"] == 1
+    assert _progress(sb)[2] == 20 and mirror.counts() == {"queued": 0, "conflict": 0, "failed": 0}
+
+
+def test_without_rpc_falls_back_to_plain_upsert(connect):
+    sb = FakeClient({main.TABLE: _server()})
+    connect(sb)
+    base, versions = _loaded()
+    assert main.upsert_tasks(_edit(base, t3=30), base=base, versions=versions)
+    assert _progress(sb)[3] == 30
+
+
+def test_rpc_permission_error_is_reported_per_row(connect):
+    def denied(client, params):
+        raise APIError({"code": "42501", "message": "permission denied for function"})
+    sb = FakeClient({main.TABLE: _server()}, rpc=denied)
+    mirror = connect(sb)
+    base, versions = _loaded()
+    assert main.upsert_tasks(_edit(base, t1=10), base=base, versions=versions) is False
+    assert main.delete_tasks([3], versions=versions) is False
+    assert _progress(sb) == {1: 0, 2: 0, 3: 0}
+    assert mirror.counts()["queued"] == 0
+
+
+def test_transient_rpc_failure_is_queued_not_reported(connect, monkeypatch):
+    def down(client, params):
+        raise httpx.ConnectError("connection refused")
+    sb = FakeClient({main.TABLE: _server()}, rpc=down)
+    mirror = connect(sb)
+    reported = []
+    monkeypatch.setattr(main, "_report_write_results",
+                        lambda results, action: reported.extend(f for _, r in results for f in r["failed"]) or not reported)
+    base, versions = _loaded()
+    assert main.upsert_tasks(_edit(base, t1=10, t2=20), base=base, versions=versions)
+    assert reported == []
+    assert sorted(i["row_id"] for i in mirror.pending(["queued"])) == [1, 2]
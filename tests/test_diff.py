@@ -0,0 +1,60 @@
+import pandas as pd
+
+import main
+
+
+def _snapshot():
+    return main.ensure_schema(pd.DataFrame({
+        "id": [1, 2, 3],
+        "project_name": ["A", "A", "B"],
+        "task": ["t1", "t2", "t3"],
+        "owner": ["ana", "beto", None],
+        "start": pd.to_datetime(["2026-01-05", "2026-01-06", "2026-01-07"]),
+        "end": pd.to_datetime(["2026-01-09", "2026-01-10", "2026-01-11"]),
+        "progress": [0, 10, 20],
+        "status": ["No iniciado", "En progreso", "En progreso"],
+    }))
+
+
+def test_no_changes_is_empty():
+    before = _snapshot()
+    assert main.diff_tasks(before, before.copy()) == {"insert": [], "update": [], "delete": []}
+
+
+def test_update_sends_only_changed_columns_plus_required():
+    before = _snapshot()
+    after = before.copy()
+    after.loc[after["id"] == 2, "progress"] = 50
+    diff = main.diff_tasks(before, after)
+    assert diff["insert"] == [] and diff["delete"] == []
+    assert diff["update"] == [{"progress": 50, "project_name": "A", "task": "t2", "id": 2}]
+
+
+def test_insert_and_delete():
+    before = _snapshot()
+    after = before[before["id"] != 3]
+    new = pd.DataFrame({"project_name": ["C"], "task": ["nueva"], "progress": [5]})
+    after = main.ensure_schema(pd.concat([after, new], ignore_index=True))
+    diff = main.diff_tasks(before, after)
+    assert diff["delete"] == [3]
+    assert diff["update"] == []
+    assert len(diff["insert"]) == 1
+    item = diff["insert"][0]
+    assert "id" not in item
+    assert (item["project_name"], item["task"], item["progress"]) == ("C", "nueva", 5)
+
+
+def test_whitespace_only_edit_is_not_an_update():
+    before = _snapshot()
+    after = before.copy()
+    after.loc[after["id"] == 1, "task"] = " t1 "  # el payload lo normaliza
+    assert main.diff_tasks(before, after)["update"] == []
+
+
+def test_unknown_id_is_sent_whole():
+    before = _snapshot()
+    extra = main.ensure_schema(pd.DataFrame({"id": [9], "project_name": ["Z"], "task": ["z"]}))
+    after = main.ensure_schema(pd.concat([before, extra], ignore_index=True))
+    diff = main.diff_tasks(before, after)
+    assert [u["id"] for u in diff["update"]] == [9]
+    assert diff["update"][0]["task"] == "z" and "status" in diff["update"][0]
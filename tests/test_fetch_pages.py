@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import main
+from fake_supabase import FakeClient
+
+
+def _rows(ids):
+    return [{"id": int(i), "project_name": "A" if i % 3 else "B", "task": f"t{i}",
+             "start_date": "2026-01-05", "end_date": "2026-01-09", "progress": 0,
+             "collaborators": ["ana"], "tags": None} for i in ids]
+
+
+# ids con huecos, para que los segmentos no tengan el mismo tamaño
+IDS = np.unique(np.random.default_rng(7).integers(1, 5000, 1200))
+
+
+@pytest.mark.parametrize("page_size,workers,max_rows", [(100, 4, None), (100, 4, 37), (5000, 4, None), (64, 1, None)])
+def test_keyset_pages_return_every_row_once(page_size, workers, max_rows):
+    sb = FakeClient({main.TABLE: _rows(IDS)}, max_rows=max_rows)
+    pages, total = main._fetch_pages(sb, "*", page_size=page_size, max_workers=workers)
+    got = [r["id"] for page in pages for r in page]
+    assert total == len(IDS)
+    assert got == IDS.tolist()  # en orden de id, sin repetidos ni huecos
+    # cada request de datos usa keyset (gt/lte sobre id), nunca offset
+    data_requests = [q for q in sb.requests if q.count is None and q.columns == "*"]
+    assert data_requests and all(len(q.filters) == 2 and q.order_by == ("id", False) for q in data_requests)
+
+
+def test_where_is_applied_to_every_page():
+    sb = FakeClient({main.TABLE: _rows(IDS)})
+    pages, total = main._fetch_pages(sb, "*", where=lambda q: q.eq("project_name", "B"), page_size=50)
+    got = [r["id"] for page in pages for r in page]
+    expected = [i for i in IDS.tolist() if i % 3 == 0]
+    assert got == expected and total == len(expected)
+
+
+def test_empty_table():
+    sb = FakeClient({main.TABLE: []})
+    assert main._fetch_pages(sb, "*") == ([], 0)
+
+
+def test_convert_runs_per_page_and_frame_is_complete():
+    sb = FakeClient({main.TABLE: _rows(IDS)}, max_rows=300)
+    df = main.fetch_tasks_paged(sb, page_size=300, max_workers=3)
+    assert sorted(df["id"].tolist()) == IDS.tolist()
+    assert df["collaborators"].iloc[0] == "ana"
+    assert "snapshot" in df.attrs
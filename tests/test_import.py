@@ -0,0 +1,43 @@
+import io
+
+import main
+from fake_supabase import FakeClient
+
+
+def _existing():
+    return [{"id": 1, "project_name": "Old", "task": "x", "predecessors": []},
+            {"id": 2, "project_name": "Old", "task": "y", "predecessors": [1]}]
+
+
+def _import(connect, csv, chunk_rows=main.IMPORT_CHUNK_ROWS):
+    sb = FakeClient({main.TABLE: _existing()})
+    connect(sb, mirror=False)
+    stats = main.import_tasks(io.StringIO(csv), kind="csv", chunk_rows=chunk_rows)
+    return {r["task"]: r for r in sb.tables[main.TABLE]}, stats
+
+
+def test_predecessors_point_at_the_imported_rows(connect):
+    rows, stats = _import(connect, 'id,project_name,task,predecessors\n'
+                                   '1,New,a,\n'
+                                   '2,New,b,1\n'
+                                   '3,New,c,"1,2"\n', chunk_rows=2)  # la referencia cruza chunks
+    assert stats["inserted"] == 3 and stats["links_dropped"] == 0
+    assert rows["b"]["predecessors"] == [rows["a"]["id"]]
+    assert rows["c"]["predecessors"] == [rows["a"]["id"], rows["b"]["id"]]
+    assert rows["y"]["predecessors"] == [1]  # lo que ya estaba no se toca
+
+
+def test_references_outside_the_file_are_dropped(connect):
+    rows, stats = _import(connect, 'id,project_name,task,predecessors\n'
+                                   '2,New,b,1\n'
+                                   '3,New,c,"1,2"\n')
+    assert not rows["b"].get("predecessors")  # el 1 del archivo no es la tarea 1 de la DB
+    assert rows["c"]["predecessors"] == [rows["b"]["id"]]
+    assert stats["links_dropped"] == 2
+
+
+def test_single_predecessor_column_read_as_float(connect):
+    csv = 'id,project_name,task,predecessors\n1,New,a,\n2,New,b,1\n3,New,c,2\n'
+    rows, _ = _import(connect, csv)
+    assert rows["b"]["predecessors"] == [rows["a"]["id"]]
+    assert rows["c"]["predecessors"] == [rows["b"]["id"]]
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+import name_match
+from name_match import MAX_CANDIDATES, NameIndex, levenshtein
+
+
+def _reference(a, b):
+    """Levenshtein con la tabla DP completa."""
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def _word(rng, n):
+    return "".join(rng.choice("abcñé ") for _ in range(n))
+
+
+def test_levenshtein_matches_reference_dp():
+    rng = random.Random(7)
+    for _ in range(500):
+        a, b = _word(rng, rng.randint(0, 80)), _word(rng, rng.randint(0, 80))  # > 64: enteros grandes
+        d = _reference(a, b)
+        assert name_match._myers(a, b) == d
+        assert levenshtein(a, b) == d
+        cap = rng.randint(0, 10)
+        assert levenshtein(a, b, max_dist=cap) == min(d, cap + 1)
+
+
+USERS = [
+    {"full_name": "José Pérez", "email": "jose@example.com"},
+    {"full_name": "María Núñez", "email": "maria@example.com"},
+    {"full_name": "Roberto Sanchez", "email": "roberto@example.com"},
+]
+
+
+@pytest.mark.parametrize("name, email, method, score", [
+    ("JOSE  PEREZ", "jose@example.com", "folded", 1.0),
+    ("Pérez, José", "jose@example.com", "tokens", 1.0),
+    ("nunez maria", "maria@example.com", "tokens", 1.0),
+    ("Jose Peres", "jose@example.com", "fuzzy", 0.9),
+    ("Jose Gomez", None, None, 0.0),
+    ("", None, None, 0.0),
+])
+def test_match_methods(name, email, method, score):
+    got = NameIndex(USERS).match(name)
+    assert (got["email"], got["method"]) == (email, method)
+    assert got["score"] == pytest.approx(score)
+
+
+def test_ambiguity_margin():
+    users = [{"full_name": "Roberto Sanchez", "email": "a@example.com"},
+             {"full_name": "Roberta Sanchex", "email": "b@example.com"}]
+    # 'robert sanchez': 14/15 contra Roberto, 13/15 contra Roberta (a 0.067 del mejor)
+    assert NameIndex(users).match("Robert Sanchez")["email"] == "a@example.com"
+    got = NameIndex(users, margin=0.1).match("Robert Sanchez")
+    assert got["method"] == "ambiguous" and got["email"] is None
+    assert [c["email"] for c in got["candidates"]] == ["a@example.com", "b@example.com"]
+
+
+def test_same_score_is_ambiguous_but_same_email_is_not():
+    users = [{"full_name": "Roberto Sanchez", "email": "a@example.com"},
+             {"full_name": "Roberta Sanchez", "email": "b@example.com"},
+             {"full_name": "José Pérez", "email": "jose@example.com"},
+             {"full_name": "Jose Perez", "email": "JOSE@example.com"}]
+    idx = NameIndex(users)
+    assert idx.match("Robert Sanchez")["method"] == "ambiguous"
+    assert idx.match("Jose Peres")["email"] == "jose@example.com"
+
+
+def test_candidate_cut_keeps_the_best_key(monkeypatch):
+    # muchas claves con todos los trigramas de la buena más un token extra: empatan en conteo
+    users = [{"full_name": f"Maria Fernandez Zz{chr(97 + i % 26)}{i}", "email": f"m{i}@example.com"}
+             for i in range(3 * MAX_CANDIDATES)]
+    users.append({"full_name": "Maria Fernandez", "email": "maria@example.com"})
+    idx = NameIndex(users)
+    scored = []
+    real = name_match.similarity
+    monkeypatch.setattr(name_match, "similarity", lambda a, b, floor=0.0: scored.append(b) or real(a, b, floor))
+
+    got = idx.match("Maria Fernandes")
+    assert got["email"] == "maria@example.com" and got["method"] == "fuzzy"
+    assert len(scored) == MAX_CANDIDATES
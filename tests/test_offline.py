@@ -0,0 +1,54 @@
+import pytest
+
+import main
+from fake_supabase import FakeClient
+
+
+def _server():
+    return [{"id": 1, "project_name": "A", "task": "t1", "progress": 0, "updated_at": "2026-03-01T10:00:00+00:00"},
+            {"id": 2, "project_name": "A", "task": "t2", "progress": 0, "updated_at": "2026-03-01T10:00:00+00:00"}]
+
+
+def _edit(base, task_id, progress):
+    after = base.copy()
+    after.loc[after["id"] == task_id, "progress"] = progress
+    return after
+
+
+def test_held_conflict_does_not_send_later_saves_offline(connect, monkeypatch):
+    sb = FakeClient({main.TABLE: _server()})
+    mirror = connect(sb)
+    mirror.queue({"update": [{"id": 1, "progress": 10}]})
+    mirror.mark([1], "conflict", "cambió en el server", server_rows={1: _server()[0]})
+    base = main.df_from_supabase(_server())
+    monkeypatch.setattr(main, "queue_offline", lambda *a, **k: pytest.fail("pasó por la cola offline"))
+
+    assert main.upsert_tasks(_edit(base, 2, 70), base=base)
+    assert {r["id"]: r["progress"] for r in sb.tables[main.TABLE]}[2] == 70  # fue directo a Supabase
+    assert mirror.counts() == {"queued": 0, "conflict": 1, "failed": 0}
+
+
+def test_queued_changes_keep_later_saves_in_order(connect):
+    sb = FakeClient({main.TABLE: _server()})
+    mirror = connect(sb)
+    main._lost_connection()  # recién se cortó: no se intenta reenviar
+    mirror.queue({"update": [{"id": 1, "progress": 10}]})
+    base = main.df_from_supabase(_server())
+
+    assert main.upsert_tasks(_edit(base, 2, 70), base=base)
+    assert {r["id"]: r["progress"] for r in sb.tables[main.TABLE]}[2] == 0
+    assert mirror.counts()["queued"] == 2
+
+
+def test_temp_id_rows_are_edited_in_the_mirror(connect):
+    sb = FakeClient({main.TABLE: _server()})
+    mirror = connect(sb)
+    mirror.queue({"insert": [{"project_name": "A", "task": "nueva", "progress": 0}]})
+    mirror.mark([-1], "failed", "rechazada")
+    base = main.with_pending(main.df_from_supabase(_server()))
+    assert -1 in base["id"].tolist()
+
+    assert main.upsert_tasks(_edit(base, -1, 30), base=base)
+    assert all(r["id"] > 0 for r in sb.tables[main.TABLE])  # nada con id temporal llegó al server
+    (item,) = mirror.pending()
+    assert (item["kind"], item["status"], item["payload"]["progress"]) == ("insert", "queued", 30)
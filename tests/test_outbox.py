@@ -0,0 +1,43 @@
+import outbox
+
+
+def _job(key, to="u@example.com"):
+    return {"to_email": to, "subject": "s", "html": "<p>x</p>", "dedupe_key": key}
+
+
+def test_restart_moves_sending_to_uncertain(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    box = outbox.Outbox(path)
+    box.enqueue([_job("a"), _job("b")])
+    (claimed,) = box.claim(limit=1)  # el proceso muere con este job en vuelo
+    sent = []
+    worker = outbox.start_worker(lambda jobs, report: sent.extend(jobs), path=path)
+    try:
+        worker.drain_once()
+    finally:
+        worker.stop()
+        worker.join(5)
+    by_id = {j["id"]: j for j in worker.box.jobs()}
+    assert by_id[claimed["id"]]["status"] == "uncertain"
+    assert [j["dedupe_key"] for j in sent] == ["b"]  # el interrumpido no se reenvía solo
+
+
+def test_duplicate_dedupe_key_is_skipped(tmp_path):
+    box = outbox.Outbox(str(tmp_path / "outbox.sqlite3"))
+    first = box.enqueue([_job("a", "x@example.com"), _job("b", "y@example.com")])
+    again = box.enqueue([_job("a", "x@example.com"), _job("c", "z@example.com")])
+    assert (first["queued"], again["queued"], again["duplicates"]) == (2, 1, ["x@example.com"])
+    assert box.status_counts()["queued"] == 3
+
+
+def test_report_without_outcome_marks_uncertain(tmp_path):
+    box = outbox.Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.enqueue([_job("a"), _job("b"), _job("c")])
+
+    def send_batch(jobs, report):
+        report(jobs[0], None)
+        report(jobs[1], ("timeout tras DATA", None))
+        report(jobs[2], ("451 greylisted", True))
+
+    outbox.OutboxWorker(box, send_batch).drain_once()
+    assert [j["status"] for j in sorted(box.jobs(), key=lambda j: j["id"])] == ["sent", "uncertain", "queued"]
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+import main
+
+
+MIXED = [" a, b ", "x,,y", 5, 5.0, ["p", " ", "q "], None, float("nan"), pd.NA, "", "none", "NaN", " , "]
+
+
+@pytest.mark.parametrize("values", [
+    MIXED,
+    [["p"], None],          # solo listas (import parquet/json)
+    [5, 6, None],           # solo números
+    ["a", "b, c"],
+    [],
+])
+def test_col_csv_lists_matches_per_cell_helper(values):
+    s = pd.Series(values, dtype=object, index=range(10, 10 + len(values)))
+    assert main._col_csv_lists(s) == [main._to_list_from_csv(v) for v in values]
+
+
+def test_col_id_lists_accepts_float_ids():
+    s = pd.Series([1.0, 2, "3.0, 4", None, float("nan"), "x", 1.5, ["5", 6.0], True], dtype=object)
+    assert main._col_id_lists(s) == [[1], [2], [3, 4], [], [], [], [], [5, 6], []]
+
+
+def test_payload_accepts_list_columns():
+    df = pd.DataFrame({"id": [1, 2], "project_name": ["P", "P"], "task": ["t1", "t2"],
+                       "collaborators": [["ana", "beto"], None], "tags": [None, ["x"]]})
+    out = main.payload_for_upsert(df)
+    assert [r["collaborators"] for r in out] == [["ana", "beto"], None]
+    assert [r["tags"] for r in out] == [None, ["x"]]
+    assert [r["id"] for r in out] == [1, 2]
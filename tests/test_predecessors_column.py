@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+import main
+from fake_supabase import FakeClient
+
+
+def _server_rows():
+    return [{"id": 1, "project_name": "A", "task": "t1", "progress": 0},
+            {"id": 2, "project_name": "A", "task": "t2", "progress": 0}]
+
+
+def _edit(base):
+    after = base.copy()
+    after.loc[after["id"] == 2, "progress"] = 40
+    new = pd.DataFrame({"project_name": ["A"], "task": ["t3"], "predecessors": ["1"]})
+    return main.ensure_schema(pd.concat([after, new], ignore_index=True))
+
+
+@pytest.mark.parametrize("migrated", [True, False])
+def test_save_works_with_and_without_predecessors_column(connect, migrated):
+    sb = FakeClient({main.TABLE: _server_rows()}, missing_columns=() if migrated else ["predecessors"])
+    connect(sb, mirror=False)
+    base = main.df_from_supabase(_server_rows())
+    assert main.upsert_tasks(_edit(base), base=base)
+    rows = {r["id"]: r for r in sb.tables[main.TABLE]}
+    assert rows[2]["progress"] == 40 and rows[3]["task"] == "t3"
+    inserted = [r for q in sb.requests if q.op == "insert" for r in q.rows]
+    assert [("predecessors" in r) for r in inserted] == [migrated]
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from workcal import WorkCalendar
+
+
+@pytest.fixture(autouse=True)
+def weekdays(monkeypatch):
+    monkeypatch.setattr(main, "work_calendar", lambda: WorkCalendar())
+
+
+def _base():
+    # [start, end) en días hábiles: A lun-mar, B mié-jue, C vie-lun
+    return main.df_from_supabase([
+        {"id": 1, "project_name": "P", "task": "A", "start_date": "2026-03-02", "end_date": "2026-03-04"},
+        {"id": 2, "project_name": "P", "task": "B", "start_date": "2026-03-04", "end_date": "2026-03-06",
+         "predecessors": [1]},
+        {"id": 3, "project_name": "P", "task": "C", "start_date": "2026-03-06", "end_date": "2026-03-10",
+         "predecessors": [2]},
+    ])
+
+
+def _set(df, task_id, **dates):
+    out = df.copy()
+    for col, value in dates.items():
+        out.loc[out["id"] == task_id, col] = pd.Timestamp(value)
+    return out
+
+
+def _dates(df):
+    return {int(r.id): (r.start.date().isoformat(), r.end.date().isoformat())
+            for r in df.dropna(subset=["id"]).itertuples()}
+
+
+def _workdays(df):
+    return dict(zip(df["id"].dropna().astype(int),
+                    np.busday_count(df["start"].to_numpy("datetime64[D]"), df["end"].to_numpy("datetime64[D]"))))
+
+
+def test_date_change_pushes_successors_keeping_working_days():
+    base = _base()
+    res = main.reschedule_edits(base, _set(base, 1, end="2026-03-06"))  # A termina el viernes
+    assert res["moved"] == [2, 3]
+    assert _dates(res["df"]) == {1: ("2026-03-02", "2026-03-06"),
+                                 2: ("2026-03-06", "2026-03-10"),   # vie + lun
+                                 3: ("2026-03-10", "2026-03-12")}
+    assert _workdays(res["df"])[2] == _workdays(base)[2] == 2
+    assert _workdays(res["df"])[3] == _workdays(base)[3] == 2
+
+
+def test_hand_edited_row_stays_and_still_pushes():
+    base = _base()
+    edited = _set(_set(base, 1, end="2026-03-06"), 2, start="2026-03-11", end="2026-03-13")
+    res = main.reschedule_edits(base, edited)
+    assert res["moved"] == [3]
+    assert _dates(res["df"])[2] == ("2026-03-11", "2026-03-13")  # lo que escribió el usuario
+    assert _dates(res["df"])[3] == ("2026-03-13", "2026-03-17")
+
+
+def test_new_row_without_id():
+    base = _base()
+    new = main.ensure_schema(pd.DataFrame([{"project_name": "P", "task": "D", "start": pd.Timestamp("2026-03-02"),
+                                            "end": pd.Timestamp("2026-03-03"), "predecessors": "3"}]))
+    edited = pd.concat([_set(base, 1, end="2026-03-05"), new], ignore_index=True)
+    res = main.reschedule_edits(base, edited)
+    assert res["moved"] == [2, 3]
+    assert _dates(res["df"])[2] == ("2026-03-05", "2026-03-09") and _dates(res["df"])[3] == ("2026-03-09", "2026-03-11")
+    assert len(res["df"]) == 4 and res["df"]["id"].isna().sum() == 1
+    d = res["df"].iloc[3]
+    assert (d["start"], d["end"]) == (pd.Timestamp("2026-03-02"), pd.Timestamp("2026-03-03"))  # se tipeó así
+
+
+def test_nothing_changed():
+    base = _base()
+    res = main.reschedule_edits(base, base.copy())
+    assert res["moved"] == [] and res["affected"] == 0
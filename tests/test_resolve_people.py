@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+import main
+import notify
+from fake_supabase import FakeClient
+
+USERS = [
+    {"id": 1, "full_name": "Ana Gómez", "email": "ana@example.com", "is_active": True},
+    {"id": 2, "full_name": "Beto Ruiz", "email": "beto@example.com", "is_active": None},  # nulo: no activo
+    {"id": 3, "full_name": "Carla Díaz", "email": "carla@example.com", "is_active": False},
+    {"id": 4, "full_name": "José  Pérez", "email": "jose@example.com", "is_active": True},
+    {"id": 5, "full_name": "Dani Sosa", "email": "", "is_active": True},
+]
+
+TASKS = pd.DataFrame({
+    "id": [10, 11, 12, 13, 14, 15],
+    "project_name": ["P", "P", "Q", "Q", "Q", "R"],
+    "task": ["t0", "t1", "t2", "t3", "t4", "t5"],
+    "owner": ["ana gómez", " JOSÉ PÉREZ ", "Beto Ruiz", None, "Nadie Conocido", "Dani Sosa"],
+    "collaborators": ["José Pérez, Carla Díaz", "Ana  Gómez,ana gómez", None, "Beto Ruiz, José Pérez",
+                      ["Ana Gómez", "Zoe"], ""],
+})
+
+
+def _baseline_resolve(df_rows, user_idx):
+    """Resolutor de notify antes del motor vectorizado (iterrows + dict), tal cual."""
+    emails, unresolved = [], []
+    for _, r in df_rows.iterrows():
+        owner_name = r.get("owner")
+        nm = notify._norm_name(owner_name) if owner_name else None
+        if nm and nm in user_idx:
+            mail = user_idx[nm]["email"]
+            if mail and mail not in emails:
+                emails.append(mail)
+        elif owner_name:
+            unresolved.append(str(owner_name))
+        for col_name in main._to_list_from_csv(r.get("collaborators")) or []:
+            nm2 = notify._norm_name(col_name)
+            if nm2 and nm2 in user_idx:
+                mail2 = user_idx[nm2]["email"]
+                if mail2 and mail2 not in emails:
+                    emails.append(mail2)
+            else:
+                unresolved.append(str(col_name))
+    return emails, unresolved
+
+
+@pytest.fixture
+def users(connect):
+    connect(FakeClient({"users": [dict(u) for u in USERS]}), mirror=False)
+    notify.fetch_users.clear()
+    notify.user_name_index.clear()
+    yield {notify._norm_name(u["full_name"]): u for u in USERS if u["is_active"] is True}
+    notify.fetch_users.clear()
+    notify.user_name_index.clear()
+
+
+def test_recipients_and_rows_match_baseline(users):
+    res = notify.resolve_people(TASKS, fuzzy=False)
+    emails, _ = _baseline_resolve(TASKS, users)
+    assert res["recipients"] == emails
+    # una fila le llega a quien el resolutor viejo resolvía a partir de esa sola fila
+    rows_by_email = {}
+    for pos in range(len(TASKS)):
+        for em in _baseline_resolve(TASKS.iloc[[pos]], users)[0]:
+            rows_by_email.setdefault(em, []).append(pos)
+    assert res["rows_by_email"] == rows_by_email
+
+
+def test_null_is_active_user_gets_no_mail(users):
+    res = notify.resolve_people(TASKS, fuzzy=False)
+    assert "beto@example.com" not in res["recipients"]
+    assert "Beto Ruiz" in res["unresolved"]
+    assert "carla@example.com" not in res["recipients"]
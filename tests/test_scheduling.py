@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import scheduling
+from workcal import WorkCalendar
+
+
+def _random_plan(n, edges, seed, deep=False):
+    """Tareas con fechas y predecesoras al azar (solo hacia ids menores: es un DAG)."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2026-03-02") + pd.to_timedelta(rng.integers(0, 60, n), unit="D")
+    dur = rng.integers(0, 15, n)
+    preds = [[] for _ in range(n)]
+    for _ in range(edges):
+        b = int(rng.integers(1, n))
+        a = b - 1 if deep else int(rng.integers(0, b))
+        preds[b].append(a + 1)
+    df = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "start": start,
+        "end": start + pd.to_timedelta(dur, unit="D"),
+        "predecessors": [", ".join(map(str, p)) for p in preds],
+        "workstream": rng.choice(["ops", "dev", None], n),
+    })
+    df.loc[rng.random(n) < 0.05, "start"] = pd.NaT  # algunas sin inicio
+    return df
+
+
+def _reference(df, calendar=None):
+    """CPM tarea por tarea, en Python, con la misma convención que scheduling."""
+    n = len(df)
+    pos = {int(i): k for k, i in enumerate(df["id"])}
+    preds = [[pos[int(p)] for p in str(s).split(",") if p.strip()] for s in df["predecessors"]]
+    succ = [[] for _ in range(n)]
+    for v, ps in enumerate(preds):
+        for p in set(ps):
+            succ[p].append(v)
+    cals = calendar.codes(df["workstream"], n) if calendar is not None else None
+
+    def fwd(v, d, k):
+        if calendar is None:
+            return d + k
+        return np.busday_offset(d, k, roll="forward", busdaycal=calendar.calendars[cals[v]])
+
+    def bwd(v, d, k):
+        if calendar is None:
+            return d - k
+        return np.busday_offset(d, -k, roll="backward", busdaycal=calendar.calendars[cals[v]])
+
+    def between(v, a, b):
+        if calendar is None:
+            return int((b - a).astype(int))
+        return int(np.busday_count(a, b, busdaycal=calendar.calendars[cals[v]]))
+
+    start = df["start"].to_numpy("datetime64[D]")
+    end = df["end"].to_numpy("datetime64[D]")
+    origin = start[~np.isnat(start)].min()
+    dur = [max(between(v, start[v], end[v]), 0) if not (np.isnat(start[v]) or np.isnat(end[v])) else 0
+           for v in range(n)]
+    es, ef = [None] * n, [None] * n
+    for v in range(n):  # ids ordenados: las predecesoras siempre vienen antes
+        s = fwd(v, origin if np.isnat(start[v]) else start[v], 0)
+        for p in preds[v]:
+            s = max(s, ef[p])
+        es[v] = fwd(v, s, 0)
+        ef[v] = fwd(v, es[v], dur[v])
+    finish = max(ef)
+    ls, lf = [None] * n, [None] * n
+    for v in reversed(range(n)):
+        f = min([finish] + [ls[w] for w in succ[v]])
+        lf[v], ls[v] = f, bwd(v, f, dur[v])
+    slack = [between(v, es[v], ls[v]) for v in range(n)]
+    return es, ef, ls, lf, slack
+
+
+@pytest.mark.parametrize("n,edges,deep", [(300, 600, False), (300, 299, True), (40, 0, False)])
+@pytest.mark.parametrize("with_calendar", [False, True])
+@pytest.mark.parametrize("level_cost", [0, 10 ** 9])  # fuerza pasadas por nivel / secuenciales
+def test_matches_task_by_task_reference(monkeypatch, n, edges, deep, with_calendar, level_cost):
+    monkeypatch.setattr(scheduling, "LEVEL_COST", level_cost)
+    df = _random_plan(n, edges, seed=n + edges, deep=deep)
+    cal = WorkCalendar(holidays=["2026-03-24", "2026-04-02"],
+                       overrides={"ops": {"weekmask": "1111110"}}) if with_calendar else None
+    res = scheduling.critical_path(df, calendar=cal)
+    sched = res["schedule"]
+    es, ef, ls, lf, slack = _reference(df, cal)
+    for col, ref in (("es", es), ("ef", ef), ("ls", ls), ("lf", lf)):
+        assert sched[col].to_numpy("datetime64[D]").tolist() == np.asarray(ref, dtype="datetime64[D]").tolist(), col
+    assert sched["slack_days"].astype(int).tolist() == slack
+    assert sched["critical"].tolist() == [s <= 0 for s in slack]
+    assert res["cycles"] == [] and res["blocked"] == []
+
+
+def test_chain_with_parallel_branch():
+    df = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "start": pd.to_datetime(["2026-01-01", "2026-01-01", "2026-01-01", "2026-01-01"]),
+        "end": pd.to_datetime(["2026-01-04", "2026-01-06", "2026-01-02", "2026-01-03"]),
+        "predecessors": ["", "1", "1", "2, 3"],
+    })
+    sched = scheduling.critical_path(df)["schedule"]
+    # 1 (3 días) -> 2 (5 días) -> 4 (2 días); 3 (1 día) tiene 4 días de holgura
+    assert sched["es"].dt.strftime("%m-%d").tolist() == ["01-01", "01-04", "01-04", "01-09"]
+    assert sched["ef"].dt.strftime("%m-%d").tolist() == ["01-04", "01-09", "01-05", "01-11"]
+    assert sched["slack_days"].tolist() == [0, 0, 4, 0]
+    assert sched["critical"].tolist() == [True, True, False, True]
+
+
+def test_cycles_blocked_and_missing_predecessors():
+    df = pd.DataFrame({
+        "id": [1, 2, 3, 4, 5],
+        "start": pd.to_datetime(["2026-01-05"] * 5),
+        "end": pd.to_datetime(["2026-01-07"] * 5),
+        "predecessors": ["3", "1", "2", "3", "99"],  # 1 -> 2 -> 3 -> 1, 4 depende del ciclo
+    })
+    res = scheduling.critical_path(df)
+    assert res["cycles"] == [1, 2, 3]
+    assert res["blocked"] == [4]
+    assert res["missing"] == [(5, 99)]
+    sched = res["schedule"]
+    assert sched["es"].isna().tolist() == [True, True, True, True, False]
+    assert not sched["critical"].iloc[:4].any()
+
+
+def test_list_predecessors_and_duplicate_edges():
+    df = pd.DataFrame({
+        "id": [10, 20],
+        "start": pd.to_datetime(["2026-01-05", "2026-01-05"]),
+        "end": pd.to_datetime(["2026-01-08", "2026-01-06"]),
+        "predecessors": [[], [10, 10]],
+    })
+    res = scheduling.critical_path(df)
+    assert res["edges"] == 1
+    assert res["schedule"]["es"].iloc[1] == pd.Timestamp("2026-01-08")
@@ -0,0 +1,130 @@
+import socket
+import threading
+import time
+
+import pytest
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+import notify
+import outbox
+from notify import SmtpPool, build_message
+
+
+class Handler:
+    """
+    Server SMTP local: guarda los mensajes, rechaza `rejected`, corta la sesión (421) `drop` veces
+    y `hang_up` veces acepta el mensaje pero cierra la conexión sin responder al DATA.
+    """
+
+    def __init__(self, rejected=(), drop=0, hang_up=0):
+        self.rejected = set(rejected)
+        self.drop = drop
+        self.hang_up = hang_up
+        self.received = []
+        self.lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.rejected:
+            return "550 no such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            if self.drop:
+                self.drop -= 1
+                return "421 too many messages, closing"
+            self.received.extend(envelope.rcpt_tos)
+            if self.hang_up:
+                self.hang_up -= 1
+                server.transport.close()
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp():
+    def start(**kw):
+        handler = Handler(**kw)
+        with socket.socket() as s:  # puerto libre
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        ctl = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=port)
+        ctl.start()
+        started.append(ctl)
+        settings = {"host": "127.0.0.1", "port": port,
+                    "sender": "pm@example.com", "ssl": False, "starttls": False}
+        return handler, settings
+    started = []
+    yield start
+    for ctl in started:
+        ctl.stop()
+
+
+def _messages(n):
+    return [(f"u{i}@example.com", build_message("pm@example.com", f"u{i}@example.com", "s", "<p>x</p>"))
+            for i in range(n)]
+
+
+def test_batch_reuses_pooled_connections(smtp):
+    handler, settings = smtp()
+    with SmtpPool(settings, pool_size=3, rate_per_sec=0) as pool:
+        res = pool.send_many(_messages(20))
+    assert res == {"sent": 20, "failed": []}
+    assert sorted(handler.received) == sorted(f"u{i}@example.com" for i in range(20))
+    assert 1 <= pool.connects <= 3
+
+
+def test_rejected_recipient_is_reported_and_session_kept(smtp):
+    handler, settings = smtp(rejected={"u1@example.com"})
+    with SmtpPool(settings, pool_size=1, rate_per_sec=0) as pool:
+        res = pool.send_many(_messages(3))
+    assert res["sent"] == 2 and [to for to, _ in res["failed"]] == ["u1@example.com"]
+    assert pool.connects == 1  # un 550 no invalida la conexión
+
+
+def test_reconnects_when_server_drops_session(smtp):
+    handler, settings = smtp(drop=1)
+    with SmtpPool(settings, pool_size=1, rate_per_sec=0) as pool:
+        res = pool.send_many(_messages(2))
+    assert res == {"sent": 2, "failed": []}
+    assert pool.connects == 2
+
+
+def test_idle_session_closed_is_reopened_before_sending(smtp):
+    handler, settings = smtp()
+    with SmtpPool(settings, pool_size=1, rate_per_sec=0) as pool:
+        pool.send_many(_messages(1))
+        pool._idle.queue[0].sock.shutdown(socket.SHUT_RDWR)  # la sesión ociosa murió mientras esperaba
+        res = pool.send_many(_messages(2)[1:])
+    assert res == {"sent": 1, "failed": []}
+    assert pool.connects == 2 and len(handler.received) == 2
+
+
+def test_cut_after_data_is_uncertain_not_resent(smtp):
+    handler, settings = smtp(hang_up=1)
+    with SmtpPool(settings, pool_size=1, rate_per_sec=0) as pool:
+        with pytest.raises(notify.SendUncertain):
+            pool.send(_messages(1)[0][1])
+    assert handler.received == ["u0@example.com"]
+
+
+def test_outbox_job_cut_after_data_is_sent_once(smtp, tmp_path):
+    handler, settings = smtp(hang_up=1)
+    box = outbox.Outbox(str(tmp_path / "outbox.sqlite3"))
+    box.enqueue([{"to_email": "u0@example.com", "subject": "s", "html": "<p>x</p>", "dedupe_key": "k0"}])
+    worker = outbox.OutboxWorker(box, lambda jobs, report: notify.send_outbox_jobs(settings, jobs, report))
+
+    assert worker.drain_once() == 1
+    assert worker.drain_once() == 0  # no quedó nada para reintentar solo
+    assert handler.received == ["u0@example.com"]
+    (job,) = box.jobs()
+    assert job["status"] == "uncertain" and job["attempts"] == 1
+
+
+def test_rate_limiter_spaces_sends():
+    limiter = notify.RateLimiter(50)
+    t0 = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - t0 >= 5 / 50 * 0.9
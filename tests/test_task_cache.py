@@ -0,0 +1,54 @@
+import threading
+
+import main
+from fake_supabase import FakeClient
+
+
+def _rows():
+    return [{"id": 1, "project_name": "A", "task": "t1", "progress": 0, "updated_at": "2026-03-01T10:00:00+00:00"},
+            {"id": 2, "project_name": "A", "task": "t2", "progress": 0, "updated_at": "2026-03-01T10:00:00+00:00"}]
+
+
+def test_loading_locks_are_released():
+    cache = main.TaskCache(max_entries=2)
+    for i in range(10):
+        cache.get(("view", i), lambda: (main.df_from_supabase(_rows()), {}))
+    assert cache._loading == {}
+
+
+def test_concurrent_gets_load_once():
+    cache = main.TaskCache()
+    calls, gate = [], threading.Event()
+
+    def loader():
+        calls.append(1)
+        gate.wait(1)
+        return main.df_from_supabase(_rows()), {}
+
+    threads = [threading.Thread(target=cache.get, args=(("view", "x"), loader)) for _ in range(5)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and cache._loading == {}
+
+
+def test_write_keeps_full_table_and_catches_up_incrementally(connect, monkeypatch):
+    sb = FakeClient({main.TABLE: _rows()})
+    connect(sb, mirror=False)
+    cache = main.TaskCache()
+    monkeypatch.setattr(main, "task_cache", lambda: cache)
+    main.sync_tasks()
+    cache.put(("view", "filtro"), main.df_from_supabase(_rows()), {})
+
+    sb.tables[main.TABLE][1].update(progress=80, updated_at="2026-03-02T10:00:00+00:00")
+    main.invalidate_caches()
+    assert ("view", "filtro") not in cache._entries and main.FULL_TABLE in cache._entries
+
+    sb.requests.clear()
+    df, state = main.sync_tasks()  # sesión nueva: sin estado propio
+    assert df.set_index("id").loc[2, "progress"] == 80
+    selects = [q for q in sb.requests if q.op == "select" and q.columns == "*"]
+    assert selects and all(q.filters for q in selects)  # solo lo que cambió desde el watermark
+    assert not cache._entries[main.FULL_TABLE][2].get("stale")
@@ -0,0 +1,61 @@
+import random
+
+import pandas as pd
+import pytest
+
+import main
+from task_index import TaskFilterIndex
+
+OWNERS = ["José Pérez", "JOSÉ PÉREZ", "María Núñez", "ana", "Ángela", "", None]
+DATES = [None, "2026-03-02", "2026-03-09", "2026-03-16", "2026-03-23"]
+
+
+def _snapshot(rng, n=300):
+    rows = []
+    for i in range(n):
+        start = rng.choice(DATES)
+        rows.append({
+            "id": i + 1,
+            "project_name": rng.choice(["A", "B", "Ñandú", None]),
+            "task": f"t{i}",
+            "owner": rng.choice(OWNERS),
+            "status": rng.choice(main.ENUM_STATUS + [None]),
+            "priority": rng.choice(main.ENUM_PRIORITY + [None]),
+            "rag": rng.choice(main.ENUM_RAG + [None]),
+            "start_date": start,
+            "end_date": None if start is None or rng.random() < 0.2 else rng.choice([start] + [d for d in DATES if d and d > start]),
+        })
+    return main.df_from_supabase(rows)
+
+
+def _filters(rng):
+    f = {}
+    if rng.random() < 0.5: f["projects"] = rng.sample(["A", "B", "Ñandú", "Z"], rng.randint(1, 2))
+    if rng.random() < 0.5: f["statuses"] = rng.sample(main.ENUM_STATUS, rng.randint(1, 2))
+    if rng.random() < 0.3: f["priorities"] = rng.sample(main.ENUM_PRIORITY, rng.randint(1, 2))
+    if rng.random() < 0.3: f["rags"] = rng.sample(main.ENUM_RAG, rng.randint(1, 2))
+    if rng.random() < 0.5: f["owner"] = rng.choice(["josé", "PÉR", "é", "núñez", "ángela", "ana", "xyz"])
+    if rng.random() < 0.5: f["start_after"] = pd.Timestamp(rng.choice(DATES[1:]))
+    if rng.random() < 0.5: f["end_before"] = pd.Timestamp(rng.choice(DATES[1:]))
+    return f
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bitmap_query_matches_mask_filter(seed):
+    rng = random.Random(seed)
+    df = _snapshot(rng)
+    assert df["start"].isna().any() and df["end"].isna().any()
+    index = TaskFilterIndex(df)
+    for _ in range(200):
+        f = _filters(rng)
+        if not f:
+            continue
+        expected = main.filter_tasks(df, f)
+        got = main.filter_tasks(df, f, index=index)
+        assert got["id"].tolist() == expected["id"].tolist(), f
+
+
+def test_accented_owner_is_case_insensitive():
+    df = _snapshot(random.Random(0))
+    got = main.filter_tasks(df, {"owner": "josé pérez"}, index=TaskFilterIndex(df))
+    assert set(got["owner"]) == {"José Pérez", "JOSÉ PÉREZ"}
@@ -0,0 +1,58 @@
+import pandas as pd
+
+import main
+
+
+def _snapshot():
+    df = main.ensure_schema(pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "project_name": ["A", "A", "B", "B"],
+        "task": ["a1", "a2", "b1", "b2"],
+        "owner": ["ana", "ana", "beto", "beto"],
+        "collaborators": ["", "", "ana", ""],
+        "start": pd.to_datetime(["2026-03-02", "2026-03-02", "2026-03-02", "2026-03-09"]),
+        "end": pd.to_datetime(["2026-03-06", "2026-03-13", "2026-03-06", "2026-03-20"]),
+        "status": ["En progreso"] * 4,
+    }))
+    df.attrs["snapshot"] = "snap-1"
+    return df
+
+
+def test_workload_view_keys_on_filters():
+    df = _snapshot()
+    only_a = main.workload_view(df, {"projects": ["A"]}, capacity=1.0)
+    only_b = main.workload_view(df, {"projects": ["B"]}, capacity=1.0)
+    assert only_a["weekly"].index.tolist() == ["ana"]
+    assert sorted(only_b["weekly"].index) == ["ana", "beto"]
+    assert only_a["overload"]["person"].tolist() == ["ana"]
+    assert only_b["overload"].empty
+    # sin filtros: la tabla completa (otra entrada de cache)
+    assert main.workload_view(df, {})["tasks"].loc["ana"].max() == 3
+
+
+def test_variance_view_keys_on_filters():
+    df = _snapshot().assign(
+        baseline_start=pd.to_datetime(["2026-03-02"] * 4),
+        baseline_end=pd.to_datetime(["2026-03-06", "2026-03-06", "2026-03-06", "2026-03-06"]),
+        progress=[100, 100, 0, 0],
+    )
+    only_a = main.variance_view(df, {"projects": ["A"]})
+    only_b = main.variance_view(df, {"projects": ["B"]})
+    assert only_a["rollup"]["project_name"].tolist() == ["A"]
+    assert only_b["rollup"]["project_name"].tolist() == ["B"]
+    assert only_a["total"]["ev_days"] > 0 and only_b["total"]["ev_days"] == 0
+    assert only_a["total"]["spi"] != only_b["total"]["spi"]
+    assert main.variance_view(df, {})["total"]["tasks"] == 4
+
+
+def test_trend_filters_by_project(tmp_path):
+    import analytics
+    df = _snapshot().assign(baseline_start=pd.to_datetime(["2026-03-02"] * 4),
+                            baseline_end=pd.to_datetime(["2026-03-06"] * 4))
+    for day in ("2026-03-03", "2026-03-04"):
+        analytics.write_snapshot(df, pd.Timestamp(day).date(), base=str(tmp_path))
+    everything = analytics.trend(base=str(tmp_path))
+    only_b = analytics.trend(base=str(tmp_path), projects=["B"])
+    assert everything["tasks"].tolist() == [4, 4]
+    assert only_b["tasks"].tolist() == [2, 2]
+    assert analytics.trend(base=str(tmp_path), projects=["Z"]).empty
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+import workload
+from workcal import WorkCalendar
+
+
+def _tasks(rows):
+    return pd.DataFrame([{"id": i + 1, "owner": o, "collaborators": c, "start": pd.Timestamp(s),
+                          "end": pd.Timestamp(e)} for i, (o, c, s, e) in enumerate(rows)])
+
+
+def test_same_half_open_span_as_schedule():
+    # lun -> vie dura 4 días hábiles: carga lun..jue; lun -> lun siguiente no toca la 2da semana
+    df = _tasks([("ana", "", "2026-03-02", "2026-03-06"),
+                 ("beto", "", "2026-03-02", "2026-03-09"),
+                 ("caro", "", "2026-03-04", "2026-03-04")])  # 0 días: no carga
+    res = workload.load_matrix(df)
+    weekly = res["weekly"]
+    assert weekly.loc["ana"].tolist() == [0.8, 0.0]
+    assert weekly.loc["beto"].tolist() == [1.0, 0.0]
+    assert weekly.loc["caro"].sum() == 0
+    assert res["tasks"].loc["beto"].tolist() == [1, 0]
+
+
+def test_load_days_equal_workday_durations():
+    rng = np.random.default_rng(3)
+    n = 200
+    start = pd.Timestamp("2026-01-05") + pd.to_timedelta(rng.integers(0, 90, n), unit="D")
+    end = start + pd.to_timedelta(rng.integers(0, 30, n), unit="D")
+    people = rng.choice(["ana", "beto", "caro", "dani"], n)
+    df = pd.DataFrame({"id": range(1, n + 1), "owner": people, "collaborators": "", "start": start, "end": end})
+    cal = WorkCalendar(holidays=["2026-02-16", "2026-02-17", "2026-04-03"])
+
+    res = workload.load_matrix(df, calendar=cal)
+    weeks = res["weekly"].columns
+    days = (weeks.values.astype("datetime64[D]")[:, None] + np.arange(7)).ravel()
+    workdays_per_week = cal.is_workday(days).reshape(len(weeks), 7).sum(axis=1)
+    load_days = (res["weekly"] * workdays_per_week).sum(axis=1)
+
+    expected = cal.workdays_between(df["start"], df["end"]).groupby(df["owner"]).sum()
+    assert np.allclose(load_days.sort_index().to_numpy(), expected.sort_index().to_numpy(dtype=float))
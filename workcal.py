@@ -0,0 +1,134 @@
+# workcal.py
+"""
+Calendario laboral sobre np.busdaycalendar: días hábiles (weekmask) y feriados,
+con overrides por clave (p.ej. workstream). Todas las operaciones son por columna:
+las filas se agrupan por calendario y cada grupo es una llamada a np.busday_*,
+así el loop de Python es sobre calendarios (pocos), nunca sobre tareas.
+
+Convención de duración (la misma que el Gantt y scheduling): start -> end es un
+intervalo semiabierto, así que una tarea lun -> vie dura 4 días hábiles y su
+sucesora puede empezar el viernes.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WEEKMASK = "1111100"  # lun-vie
+
+
+def _holidays(values: Optional[Iterable[Any]]) -> np.ndarray:
+    if not values:
+        return np.empty(0, dtype="datetime64[D]")
+    return np.asarray(pd.to_datetime(list(values), errors="coerce").dropna().values.astype("datetime64[D]"))
+
+
+def _as_days(values: Any) -> np.ndarray:
+    """Series/array de fechas -> datetime64[D] (NaT se conserva)."""
+    if isinstance(values, pd.Series):
+        return values.to_numpy("datetime64[D]")
+    v = np.asarray(values)
+    return v.astype("datetime64[D]") if v.dtype.kind == "M" else v.astype(np.int64).astype("datetime64[D]")
+
+
+class WorkCalendar:
+    """
+    Calendario base + overrides por clave. overrides: {clave: {'weekmask': str, 'holidays': [fechas]}};
+    los feriados de un override se suman a los del calendario base.
+    """
+
+    def __init__(self, weekmask: str = DEFAULT_WEEKMASK, holidays: Optional[Iterable[Any]] = None,
+                 overrides: Optional[Mapping[str, Mapping[str, Any]]] = None):
+        base_holidays = _holidays(holidays)
+        self.weekmask = weekmask
+        self.calendars = [np.busdaycalendar(weekmask=weekmask, holidays=base_holidays)]
+        self._code: Dict[str, int] = {}
+        for key, cfg in (overrides or {}).items():
+            extra = _holidays(cfg.get("holidays"))
+            self._code[str(key)] = len(self.calendars)
+            self.calendars.append(np.busdaycalendar(
+                weekmask=cfg.get("weekmask", weekmask),
+                holidays=np.concatenate([base_holidays, extra]),
+            ))
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Mapping[str, Any]]) -> "WorkCalendar":
+        """Desde un dict tipo secrets: {'weekmask', 'holidays', 'workstreams': {nombre: {...}}}."""
+        cfg = cfg or {}
+        return cls(cfg.get("weekmask", DEFAULT_WEEKMASK), cfg.get("holidays"),
+                   {k: dict(v) for k, v in dict(cfg.get("workstreams") or {}).items()})
+
+    @property
+    def uniform(self) -> bool:
+        return len(self.calendars) == 1
+
+    def codes(self, keys: Optional[Any], n: int) -> np.ndarray:
+        """Índice de calendario por fila (0 = base) a partir de la columna clave (workstream)."""
+        if keys is None or self.uniform:
+            return np.zeros(n, dtype=np.int64)
+        k_codes, uniques = pd.factorize(pd.Series(keys).astype(object), sort=False)
+        lookup = np.asarray([self._code.get(str(u), 0) for u in uniques] + [0], dtype=np.int64)
+        return lookup[k_codes]  # código -1 (clave nula) -> lookup[-1] = base
+
+    def _groups(self, codes: np.ndarray, valid: np.ndarray):
+        if self.uniform:
+            yield self.calendars[0], np.flatnonzero(valid)
+            return
+        for c in np.unique(codes[valid]):
+            yield self.calendars[int(c)], np.flatnonzero(valid & (codes == c))
+
+    # ---------- operaciones sobre días enteros (días desde epoch) ----------
+    def count_days(self, start: np.ndarray, end: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Días hábiles en [start, end) por fila (negativo si end < start)."""
+        out = np.zeros(len(start), dtype=np.int64)
+        for cal, at in self._groups(codes, np.ones(len(start), dtype=bool)):
+            out[at] = np.busday_count(start[at].astype("datetime64[D]"), end[at].astype("datetime64[D]"),
+                                      busdaycal=cal)
+        return out
+
+    def offset_days(self, days: np.ndarray, n: Any, codes: np.ndarray, roll: str = "forward") -> np.ndarray:
+        """`days` llevado al día hábil según roll y corrido `n` días hábiles, por fila."""
+        n = np.broadcast_to(np.asarray(n, dtype=np.int64), days.shape)
+        out = np.empty(len(days), dtype=np.int64)
+        for cal, at in self._groups(codes, np.ones(len(days), dtype=bool)):
+            out[at] = np.busday_offset(days[at].astype("datetime64[D]"), n[at], roll=roll,
+                                       busdaycal=cal).astype(np.int64)
+        return out
+
+    # ---------- API por columna (fechas; NaT se respeta) ----------
+    def workdays_between(self, start: Any, end: Any, keys: Optional[Any] = None) -> pd.Series:
+        """Duración en días hábiles de cada fila (Int64, <NA> si falta alguna fecha)."""
+        s, e = _as_days(start), _as_days(end)
+        valid = ~(np.isnat(s) | np.isnat(e))
+        codes = self.codes(keys, len(s))
+        out = np.zeros(len(s), dtype=np.int64)
+        for cal, at in self._groups(codes, valid):
+            out[at] = np.busday_count(s[at], e[at], busdaycal=cal)
+        index = start.index if isinstance(start, pd.Series) else None
+        return pd.Series(out, index=index, dtype="Int64").where(valid)
+
+    def add_workdays(self, dates: Any, n: Any, keys: Optional[Any] = None, roll: str = "forward") -> pd.Series:
+        """Fecha + n días hábiles por fila (n escalar o por fila); la fecha primero se lleva a hábil según roll."""
+        d = _as_days(dates)
+        n = np.broadcast_to(np.asarray(n.fillna(0) if isinstance(n, pd.Series) else n, dtype=np.int64), d.shape)
+        valid = ~np.isnat(d)
+        codes = self.codes(keys, len(d))
+        out = np.full(len(d), np.datetime64("NaT"), dtype="datetime64[D]")
+        for cal, at in self._groups(codes, valid):
+            out[at] = np.busday_offset(d[at], n[at], roll=roll, busdaycal=cal)
+        index = dates.index if isinstance(dates, pd.Series) else None
+        return pd.Series(out.astype("datetime64[s]"), index=index)
+
+    def clamp(self, dates: Any, keys: Optional[Any] = None, direction: str = "forward") -> pd.Series:
+        """Lleva cada fecha al día hábil siguiente ('forward') o anterior ('backward') si no lo es."""
+        return self.add_workdays(dates, 0, keys, roll=direction)
+
+    def is_workday(self, dates: Any, keys: Optional[Any] = None) -> np.ndarray:
+        d = _as_days(dates)
+        valid = ~np.isnat(d)
+        codes = self.codes(keys, len(d))
+        out = np.zeros(len(d), dtype=bool)
+        for cal, at in self._groups(codes, valid):
+            out[at] = np.is_busday(d[at], busdaycal=cal)
+        return out
@@ -0,0 +1,130 @@
+# workload.py
+"""
+Carga por persona (owner + collaborators) a lo largo del tiempo.
+Cada asignación (tarea, persona) suma 1 en los días de [start, end), el mismo intervalo
+semiabierto que workcal y scheduling: una tarea lun -> vie carga lun..jue (sus 4 días de
+duración) y una de 0 días (start == end) no carga. Con arrays de diferencias: +1 en start
+y -1 en end sobre una grilla persona × día, y un cumsum por fila. Nada recorre días ni tareas en Python.
+La carga semanal es el promedio de tareas simultáneas en los días hábiles (lun-vie, o
+los del calendario base de workcal.WorkCalendar si se pasa uno: feriados no cuentan).
+"""
+from __future__ import annotations
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from name_match import fold
+from people import explode_people
+
+WORKLOAD_CAPACITY = 3.0  # tareas simultáneas por persona antes de considerar sobrecarga
+WORKDAYS = 5             # lun-vie: los primeros días de cada semana de la grilla
+
+
+def _people_keys(names: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (código por fila, etiqueta por código): las variantes del mismo nombre (tildes, mayúsculas)
+    comparten código y la etiqueta es la variante más usada.
+    """
+    raw = names.astype(str).to_numpy(dtype=object)
+    uniq, inverse = np.unique(raw.astype(str), return_inverse=True)
+    keys = np.asarray([fold(u) for u in uniq], dtype=object)  # una vez por nombre distinto
+    code, key_names = pd.factorize(keys[inverse], sort=True)
+    freq = pd.DataFrame({"code": code, "label": raw}).value_counts(sort=True).reset_index()
+    labels = freq.drop_duplicates("code").set_index("code")["label"]
+    return code, labels.reindex(range(len(key_names))).to_numpy(dtype=object)
+
+
+def load_matrix(df: pd.DataFrame, start: Optional[Any] = None, end: Optional[Any] = None,
+                calendar: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Grilla persona × semana con la carga promedio (tareas simultáneas por día hábil).
+    start/end recortan el horizonte (por defecto, de la primera a la última fecha de las tareas).
+    Retorna {'weekly': DataFrame (índice persona, columnas lunes de cada semana),
+             'tasks': DataFrame (persona × semana, cantidad de tareas distintas activas),
+             'skipped': asignaciones sin fechas}.
+    """
+    empty = {"weekly": pd.DataFrame(), "tasks": pd.DataFrame(), "skipped": 0}
+    if df.empty:
+        return empty
+    people = explode_people(df)
+    if people.empty:
+        return empty
+
+    code, labels = _people_keys(people["name"])
+    pos = people["pos"].to_numpy()
+    # la misma persona dos veces en una tarea (owner y colaborador) cuenta una vez
+    pair = np.unique(pos.astype(np.int64) * len(labels) + code)
+    pos, code = pair // len(labels), pair % len(labels)
+
+    s = df["start"].to_numpy("datetime64[D]")[pos]
+    e = df["end"].to_numpy("datetime64[D]")[pos]
+    dated = ~(np.isnat(s) | np.isnat(e)) & (e >= s)  # end < start: fechas inválidas
+    skipped = int((~dated).sum())
+    code, s, e = code[dated], s[dated], e[dated]
+    if not len(code):
+        return dict(empty, skipped=skipped)
+
+    lo = np.datetime64(pd.Timestamp(start).date(), "D") if start is not None else s.min()
+    hi = np.datetime64(pd.Timestamp(end).date(), "D") if end is not None else e.max()
+    # la grilla arranca el lunes de la primera semana y cubre semanas completas
+    day0 = lo - ((lo.astype(np.int64) + 3) % 7)  # 1970-01-01 fue jueves
+    n_days = int(((hi - day0).astype(np.int64) // 7 + 1) * 7)
+    first = np.clip((s - day0).astype(np.int64), 0, n_days)
+    last = np.clip((e - day0).astype(np.int64), 0, n_days)  # end es exclusivo
+    inside = first < last
+    code, first, last = code[inside], first[inside], last[inside]
+
+    n_people = len(labels)
+    width = n_days + 1
+    # arrays de diferencias aplanados: una sola bincount para todas las personas
+    diff = (np.bincount(code * width + first, minlength=n_people * width)
+            - np.bincount(code * width + last, minlength=n_people * width))
+    daily = np.cumsum(diff.reshape(n_people, width), axis=1)[:, :n_days]
+
+    n_weeks = n_days // 7
+    if calendar is None:
+        weekly = daily.reshape(n_people, n_weeks, 7)[:, :, :WORKDAYS].mean(axis=2)
+    else:
+        work = calendar.is_workday(day0 + np.arange(n_days)).reshape(n_weeks, 7)
+        weekly = (daily.reshape(n_people, n_weeks, 7) * work).sum(axis=2) / np.maximum(work.sum(axis=1), 1)
+
+    # tareas distintas por semana: el intervalo [first, last) toca las semanas first//7 .. (last-1)//7
+    w0, w1 = first // 7, (last - 1) // 7 + 1
+    wdiff = (np.bincount(code * (n_weeks + 1) + w0, minlength=n_people * (n_weeks + 1))
+             - np.bincount(code * (n_weeks + 1) + w1, minlength=n_people * (n_weeks + 1)))
+    tasks = np.cumsum(wdiff.reshape(n_people, n_weeks + 1), axis=1)[:, :n_weeks]
+
+    weeks = pd.DatetimeIndex(day0 + np.arange(n_weeks) * 7, name="week")
+    persons = pd.Index(labels, name="person")
+    return {
+        "weekly": pd.DataFrame(weekly, index=persons, columns=weeks),
+        "tasks": pd.DataFrame(tasks, index=persons, columns=weeks),
+        "skipped": skipped,
+    }
+
+
+def overallocation(weekly: pd.DataFrame, capacity: float = WORKLOAD_CAPACITY) -> pd.DataFrame:
+    """
+    Una fila por persona con alguna semana por encima de `capacity`: semanas excedidas,
+    pico de carga y su semana, primera semana excedida y exceso acumulado (tarea-semanas).
+    """
+    cols = ["person", "weeks_over", "peak_load", "peak_week", "first_week_over", "excess"]
+    if weekly.empty:
+        return pd.DataFrame(columns=cols)
+    m = weekly.to_numpy()
+    over = m > capacity
+    hit = over.any(axis=1)
+    if not hit.any():
+        return pd.DataFrame(columns=cols)
+    m, over = m[hit], over[hit]
+    weeks = weekly.columns
+    out = pd.DataFrame({
+        "person": weekly.index[hit],
+        "weeks_over": over.sum(axis=1),
+        "peak_load": m.max(axis=1).round(2),
+        "peak_week": weeks[m.argmax(axis=1)],
+        "first_week_over": weeks[over.argmax(axis=1)],
+        "excess": np.where(over, m - capacity, 0).sum(axis=1).round(2),
+    })
+    return out.sort_values(["excess", "peak_load"], ascending=False, kind="stable").reset_index(drop=True)